@@ -0,0 +1,307 @@
+"""
+Table driven animation state machines.
+
+What a character shows is declared as data: its states, the animation each
+state shows, the transitions between states and their side effects on the
+sprite. A StateMachine compiles the declaration into lookup tables indexed
+by the state and by the situation of the sprite, a few flags read from it.
+Each update is then one lookup for the next state, one for the animation and
+an index into its textures, and every sprite of a character set shares the
+tables, so hundreds of characters cost little more than one.
+
+Sprites driven by a machine need is_on_ladder, can_jump and
+character_face_direction attributes, plus the ones AnimationController.reset()
+adds. The animations face right, mirrored_sprite.MirroredSprite turns them
+around.
+"""
+from constants import LEFT_FACING, RIGHT_FACING
+
+# --- Situation flags
+LADDER = 0x01       # is_on_ladder
+AIRBORNE = 0x02     # not can_jump
+RISING = 0x04       # change_y > 0
+FALLING = 0x08      # change_y < 0
+MOVING_X = 0x10     # change_x != 0
+MOVING = 0x20       # moving more than a pixel per update in either direction
+FINISHED = 0x40     # the state has shown its whole animation, only set right after its last frame
+QUEUED = 0x80       # an event was queued while in the state
+SITUATIONS = 0x100
+
+# --- Clocks, what the frame of an animation is counted from
+# Updates since the sprite was created, shared by every state with this clock
+UPDATE_CLOCK = 0
+# Updates since the state was entered
+STATE_CLOCK = 1
+# Updates spent moving in states with this clock, kept between visits
+MOTION_CLOCK = 2
+
+# Target of an event transition that queues the event for the state's
+# transitions, see the QUEUED flag
+QUEUE = "queue"
+
+# Pixels a lunge moves the sprite the way it faces
+LUNGE_DISTANCE = 30
+
+
+def _freeze_x(sprite):
+    sprite.change_x = 0
+
+
+def _lunge(sprite):
+    direction = -1 if sprite.character_face_direction == LEFT_FACING else 1
+    sprite.set_position(sprite.center_x + LUNGE_DISTANCE * direction, sprite.center_y)
+
+
+# Side effects on the sprite, by name
+EFFECTS = {
+    "freeze_x": _freeze_x,
+    "lunge": _lunge,
+}
+
+
+class State:
+    """
+    A state of a machine.
+
+    :param animation: Name of the animation to show, or a list of (animation name,
+        required flags, forbidden flags) of which the first matching the situation is shown.
+        None keeps the texture the sprite has.
+    :param int clock: What the frame of the animation is counted from, one of the *_CLOCK values
+    :param Sequence[str] effects: Names of EFFECTS applied on every update in the state
+    :param int duration: Updates until the state is FINISHED, the length of its animation if None
+    :param paused_by: (state name, situation flags), while the situation has all the flags
+        the state is paused, its clock, effects and transitions stop, and the sprite shows
+        what the named state would
+    """
+
+    def __init__(self, animation, clock=UPDATE_CLOCK, effects=(), duration=None, paused_by=None):
+        if animation is None or isinstance(animation, str):
+            self.animations = [(animation, 0, 0)]
+        else:
+            self.animations = list(animation)
+        self.clock = clock
+        self.effects = tuple(effects)
+        self.duration = duration
+        self.paused_by = paused_by
+
+
+class Transition:
+    """
+    A move from one state to another. The first transition of a list that
+    matches the state and the situation is taken.
+
+    :param Sequence[str] from_states: States it leaves, every state if None
+    :param str to: State it goes to. For events, None ignores the event and QUEUE queues it.
+    :param int required: Situation flags that must all be set
+    :param int forbidden: Situation flags that must all be clear
+    :param Sequence[str] effects: Names of EFFECTS applied when it is taken
+    :param bool restart: Start the state clock over, or else carry it on into the new state
+    """
+
+    def __init__(self, from_states, to, required=0, forbidden=0, effects=(), restart=True):
+        self.from_states = None if from_states is None else set(from_states)
+        self.to = to
+        self.required = required
+        self.forbidden = forbidden
+        self.effects = tuple(effects)
+        self.restart = restart
+
+    def matches(self, state, situation):
+        return ((self.from_states is None or state in self.from_states) and
+                situation & self.required == self.required and not situation & self.forbidden)
+
+
+def _match(choices, situation):
+    for choice, required, forbidden in choices:
+        if situation & required == required and not situation & forbidden:
+            return choice
+    return None
+
+
+class StateMachine:
+    """
+    Compiled state machine, shared by every character that uses it.
+
+    :param Dict[str, State] states: States by name
+    :param Sequence[Transition] transitions: Transitions checked on every update
+    :param Dict[str, Sequence[Transition]] events: Transitions of each event, see AnimationController.trigger()
+    :param str initial: State sprites start in
+    """
+
+    def __init__(self, states, transitions, events=None, initial=None):
+        self.names = list(states)
+        index = {name: i for i, name in enumerate(self.names)}
+        self.initial = index[initial or self.names[0]]
+        self.clocks = [state.clock for state in states.values()]
+        self.durations = [state.duration for state in states.values()]
+        self.effects = [tuple(EFFECTS[effect] for effect in state.effects) for state in states.values()]
+        # State shown while paused and the flags that pause, or None
+        self.pauses = [state.paused_by and (index[state.paused_by[0]], state.paused_by[1])
+                       for state in states.values()]
+
+        # Next state, whether its clock restarts and animation name, by state and situation
+        self.next_state = []
+        self.restarts = []
+        self.animation_names = []
+        for name, state in states.items():
+            paused_by = state.paused_by[1] if state.paused_by else None
+            taken = [None if paused_by is not None and situation & paused_by == paused_by else
+                     next((transition for transition in transitions if transition.matches(name, situation)), None)
+                     for situation in range(SITUATIONS)]
+            self.next_state.append([index[name if transition is None else transition.to] for transition in taken])
+            self.restarts.append([transition is None or transition.restart for transition in taken])
+            self.animation_names.append([_match(state.animations, situation) for situation in range(SITUATIONS)])
+
+        # Target state, or None or QUEUE, effects and restart, by event, state and situation
+        self.events = {}
+        for event, event_transitions in (events or {}).items():
+            table = self.events[event] = []
+            for name in self.names:
+                row = []
+                for situation in range(SITUATIONS):
+                    transition = next((transition for transition in event_transitions
+                                       if transition.matches(name, situation)), None)
+                    if transition is None or transition.to is None:
+                        row.append((None, (), True))
+                    else:
+                        target = QUEUE if transition.to == QUEUE else index[transition.to]
+                        row.append((target, tuple(EFFECTS[effect] for effect in transition.effects),
+                                    transition.restart))
+                table.append(row)
+
+        # Controllers by character set
+        self.controllers = {}
+
+    def controller(self, animations):
+        """ The shared AnimationController of this machine for a character set """
+        controller = self.controllers.get(animations.name)
+        if controller is None:
+            controller = self.controllers[animations.name] = AnimationController(self, animations)
+        return controller
+
+
+class AnimationController:
+    """
+    A StateMachine with the animations of one character set.
+
+    :param StateMachine machine: States and transitions
+    :param CharacterAnimations animations: Animations the states show
+    """
+
+    def __init__(self, machine, animations):
+        self.machine = machine
+        self.animations = [[name and animations[name] for name in row] for row in machine.animation_names]
+
+        # Updates until a state is finished: its duration, or else until it
+        # has shown its animation. States choosing between animations never finish.
+        self.lengths = []
+        for row, duration in zip(machine.animation_names, machine.durations):
+            names = {name for name in row if name}
+            if duration is not None:
+                self.lengths.append(duration)
+            else:
+                self.lengths.append(animations[names.pop()].length if len(names) == 1 else float("inf"))
+
+    def reset(self, sprite):
+        """ Put the sprite in the initial state, adding the attributes the controller keeps on it """
+        sprite.animation_state = self.machine.initial
+        sprite.animation_frame = 0
+        sprite.state_frame = 0
+        sprite.motion_frame = 0
+        sprite.animation_queued = False
+
+    def state_name(self, sprite):
+        return self.machine.names[sprite.animation_state]
+
+    def situation(self, sprite):
+        """ Situation flags of the sprite """
+        change_x = sprite.change_x
+        change_y = sprite.change_y
+        situation = 0
+        if sprite.is_on_ladder:
+            situation |= LADDER
+        if not sprite.can_jump:
+            situation |= AIRBORNE
+        if change_y > 0:
+            situation |= RISING
+        elif change_y < 0:
+            situation |= FALLING
+        if change_x:
+            situation |= MOVING_X
+        if abs(change_x) > 1 or abs(change_y) > 1:
+            situation |= MOVING
+        if sprite.animation_queued:
+            situation |= QUEUED
+        return situation
+
+    def _enter(self, sprite, state, restart=True):
+        sprite.animation_state = state
+        if restart:
+            sprite.state_frame = 0
+        sprite.animation_queued = False
+
+    def update(self, sprite):
+        """
+        Take the transitions of the sprite's situation and show its animation.
+        Transitions on FINISHED are taken right after the last frame is shown.
+        """
+        sprite.animation_frame += 1
+
+        # Figure out if we need to flip face left or right
+        if sprite.change_x < 0:
+            sprite.character_face_direction = LEFT_FACING
+        elif sprite.change_x > 0:
+            sprite.character_face_direction = RIGHT_FACING
+
+        machine = self.machine
+        situation = self.situation(sprite)
+        state = machine.next_state[sprite.animation_state][situation]
+        if state != sprite.animation_state:
+            self._enter(sprite, state, machine.restarts[sprite.animation_state][situation])
+
+        # A paused state shows the one it is paused by, and stays as it is
+        shown = state
+        pause = machine.pauses[state]
+        if pause is not None and situation & pause[1] == pause[1]:
+            shown = pause[0]
+
+        clock = machine.clocks[shown]
+        if clock == STATE_CLOCK:
+            frame = sprite.state_frame
+        elif clock == MOTION_CLOCK:
+            if situation & MOVING:
+                sprite.motion_frame += 1
+            frame = sprite.motion_frame
+        else:
+            frame = sprite.animation_frame
+        animation = self.animations[shown][situation]
+        if animation is not None:
+            sprite.texture = animation.texture(frame)
+        if shown != state:
+            return
+
+        for effect in machine.effects[state]:
+            effect(sprite)
+
+        sprite.state_frame += 1
+        if sprite.state_frame >= self.lengths[state]:
+            next_state = machine.next_state[state][situation | FINISHED]
+            if next_state != state:
+                self._enter(sprite, next_state, machine.restarts[state][situation | FINISHED])
+
+    def trigger(self, sprite, event):
+        """
+        React to an event, like an attack button press.
+
+        :Returns: False if the event was ignored
+        """
+        target, effects, restart = self.machine.events[event][sprite.animation_state][self.situation(sprite)]
+        if target is None:
+            return False
+        if target == QUEUE:
+            sprite.animation_queued = True
+        elif target != sprite.animation_state:
+            self._enter(sprite, target, restart)
+        for effect in effects:
+            effect(sprite)
+        return True
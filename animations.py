@@ -0,0 +1,106 @@
+"""
+Shared animation textures for the characters.
+
+Animation sets are declared as data below and loaded the first time a
+character asks for them. Every sprite of the same character then references
+the same textures instead of loading its own copies. Only right facing
+textures are loaded, see mirrored_sprite.MirroredSprite.
+"""
+from atlas import load_texture
+
+# Animations of each character set, as
+# name: (texture path pattern, number of frames, updates per frame)
+# The pattern is formatted with the character's path and the frame number.
+ADVENTURER_ANIMATIONS = {
+    "idle": ("{path}-idle-2-{frame:02d}.png", 4, 5),
+    "walk": ("{path}-run3-{frame:02d}.png", 6, 4),
+    "jump": ("{path}-crnr-jmp-{frame:02d}.png", 2, 4),
+    "fall": ("{path}-fall-{frame:02d}.png", 2, 4),
+    "climb": ("{path}-ladder-climb-{frame:02d}.png", 4, 4),
+    "jump_attack": ("{path}-air-attack1-{frame:02d}.png", 4, 4),
+    "attack1": ("{path}-attack1-{frame:02d}.png", 5, 4),
+    "attack2": ("{path}-attack2-{frame:02d}.png", 6, 4),
+    "attack3": ("{path}-attack3-{frame:02d}.png", 6, 4),
+}
+
+# Kenney.nl's Asset Pack 3 has no attack frames, so attacks hold the idle
+# image for as long as the adventurer's attacks last.
+KENNEY_ANIMATIONS = {
+    "idle": ("{path}_idle.png", 1, 5),
+    "walk": ("{path}_walk{frame}.png", 8, 4),
+    "jump": ("{path}_jump.png", 1, 4),
+    "fall": ("{path}_fall.png", 1, 4),
+    "climb": ("{path}_climb{frame}.png", 2, 4),
+    "jump_attack": ("{path}_jump.png", 4, 4),
+    "attack1": ("{path}_idle.png", 5, 4),
+    "attack2": ("{path}_idle.png", 6, 4),
+    "attack3": ("{path}_idle.png", 6, 4),
+}
+
+# Character name: (path prefix of its images, animations)
+CHARACTERS = {
+    "adventurer": ("resources/images/player/adventurer", ADVENTURER_ANIMATIONS),
+    "female_adventurer": ("resources/images/animated_characters/female_adventurer/femaleAdventurer", KENNEY_ANIMATIONS),
+    "female_person": ("resources/images/animated_characters/female_person/femalePerson", KENNEY_ANIMATIONS),
+    "male_person": ("resources/images/animated_characters/male_person/malePerson", KENNEY_ANIMATIONS),
+    "male_adventurer": ("resources/images/animated_characters/male_adventurer/maleAdventurer", KENNEY_ANIMATIONS),
+    "zombie": ("resources/images/animated_characters/zombie/zombie", KENNEY_ANIMATIONS),
+    "robot": ("resources/images/animated_characters/robot/robot", KENNEY_ANIMATIONS),
+}
+
+
+class Animation:
+    """ The frames of one animation, facing right """
+
+    def __init__(self, textures, frame_duration):
+        self.textures = textures
+        self.frame_duration = frame_duration
+
+        # Number of updates the whole animation takes
+        self.length = len(textures) * frame_duration
+
+    def __len__(self):
+        return len(self.textures)
+
+    def texture(self, frame):
+        """ Texture to show after frame updates, looping the animation """
+        return self.textures[frame // self.frame_duration % len(self.textures)]
+
+
+def _frame_files(name):
+    """ Image file of every frame of each animation of a character set """
+    path, animations = CHARACTERS[name]
+    return {animation_name: ([pattern.format(path=path, frame=i) for i in range(frame_count)], frame_duration)
+            for animation_name, (pattern, frame_count, frame_duration) in animations.items()}
+
+
+def texture_files(name):
+    """ Image files a character set loads, each once """
+    return list(dict.fromkeys(file_name for files, frame_duration in _frame_files(name).values()
+                              for file_name in files))
+
+
+class CharacterAnimations:
+    """ All animations of one character set """
+
+    def __init__(self, name):
+        self.name = name
+
+        self.animations = {}
+        for animation_name, (files, frame_duration) in _frame_files(name).items():
+            textures = [load_texture(file_name) for file_name in files]
+            self.animations[animation_name] = Animation(textures, frame_duration)
+
+    def __getitem__(self, animation_name):
+        return self.animations[animation_name]
+
+
+# Loaded character sets, shared by every sprite in the process
+_loaded_characters = {}
+
+
+def get_animations(name):
+    """ Return the animations of a character set, loading them the first time. """
+    if name not in _loaded_characters:
+        _loaded_characters[name] = CharacterAnimations(name)
+    return _loaded_characters[name]
@@ -0,0 +1,138 @@
+"""
+Pre-built texture atlas.
+
+build_atlas.py packs the player, item and tileset images into a few atlas
+pages and writes a manifest with the position and hit box of every frame. At
+run time the pages are opened once and textures are cut out of them instead
+of opening and decoding each image file on its own. The atlas only makes
+loading faster: the textures cut out are ordinary arcade textures, which
+arcade puts in its own GPU atlas when they are drawn.
+
+Textures are stored in arcade's load_texture cache under the same name
+arcade would give them, so the tilemap loader picks them up as well. Images
+that are not in the atlas, or a missing atlas, fall back to loading the file.
+"""
+import json
+import os
+
+import arcade
+import PIL.Image
+
+ATLAS_DIRECTORY = "resources/atlas"
+ATLAS_MANIFEST = f"{ATLAS_DIRECTORY}/atlas.json"
+
+
+def frame_key(file_name, x=0, y=0, width=0, height=0):
+    """
+    Name of a frame in the manifest. Whole images use their path relative to
+    the game directory, tiles cut out of a sheet add their rectangle.
+    """
+    path = os.path.relpath(os.path.normpath(str(file_name))).replace(os.sep, "/")
+    if x == 0 and y == 0 and width == 0 and height == 0:
+        return path
+    return f"{path}#{x},{y},{width},{height}"
+
+
+def _texture_cache_name(file_name, x, y, width, height, flipped_horizontally, flipped_vertically,
+                        flipped_diagonally, hit_box_algorithm):
+    # Same name arcade.load_texture uses for its cache
+    return f"{file_name}-{x}-{y}-{width}-{height}-{flipped_horizontally}-{flipped_vertically}-{flipped_diagonally}-{hit_box_algorithm} "  # noqa
+
+
+class PackedAtlas:
+    """
+    Atlas pages and the frames packed in them.
+
+    :param str manifest_file: Manifest written by build_atlas.py
+    """
+
+    def __init__(self, manifest_file=ATLAS_MANIFEST):
+        self.frames = {}
+        self.pages = []
+        self._page_images = {}
+
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+            directory = os.path.dirname(manifest_file)
+            self.pages = [os.path.join(directory, page) for page in manifest["pages"]]
+            self.frames = manifest["frames"]
+
+    def _page(self, index):
+        if index not in self._page_images:
+            self._page_images[index] = PIL.Image.open(self.pages[index]).convert("RGBA")
+        return self._page_images[index]
+
+    def find_frame(self, file_name, x=0, y=0, width=0, height=0):
+        """ Manifest entry for an image, or part of one, None if it isn't packed. """
+        frame = self.frames.get(frame_key(file_name, x, y, width, height))
+        if frame is None and x == 0 and y == 0:
+            # Whole images are also asked for with their size as crop area
+            frame = self.frames.get(frame_key(file_name))
+            if frame is not None and (width, height) not in ((0, 0), (frame["width"], frame["height"])):
+                frame = None
+        return frame
+
+    def load_texture(self, file_name, x=0, y=0, width=0, height=0,
+                     flipped_horizontally=False, flipped_vertically=False, flipped_diagonally=False,
+                     hit_box_algorithm="Simple", hit_box_detail=4.5):
+        """
+        Drop-in replacement for arcade.load_texture that reads from the atlas
+        pages when the image has been packed.
+        """
+        cache_name = _texture_cache_name(file_name, x, y, width, height, flipped_horizontally,
+                                         flipped_vertically, flipped_diagonally, hit_box_algorithm)
+        if cache_name in arcade.load_texture.texture_cache:
+            return arcade.load_texture.texture_cache[cache_name]
+
+        frame = self.find_frame(file_name, x, y, width, height)
+        if frame is None:
+            return arcade.load_texture(file_name, x, y, width, height,
+                                       flipped_horizontally=flipped_horizontally,
+                                       flipped_vertically=flipped_vertically,
+                                       flipped_diagonally=flipped_diagonally,
+                                       hit_box_algorithm=hit_box_algorithm,
+                                       hit_box_detail=hit_box_detail)
+
+        image = self._page(frame["page"]).crop((frame["x"], frame["y"],
+                                                frame["x"] + frame["width"], frame["y"] + frame["height"]))
+        points = [tuple(point) for point in frame["hit_box"]]
+
+        # Same order of flips as arcade.load_texture
+        if flipped_diagonally:
+            image = image.transpose(PIL.Image.TRANSPOSE)
+            points = [(-py, -px) for px, py in points]
+        if flipped_horizontally:
+            image = image.transpose(PIL.Image.FLIP_LEFT_RIGHT)
+            points = [(-px, py) for px, py in points]
+        if flipped_vertically:
+            image = image.transpose(PIL.Image.FLIP_TOP_BOTTOM)
+            points = [(px, -py) for px, py in points]
+
+        texture = arcade.Texture(cache_name, image,
+                                 hit_box_algorithm=hit_box_algorithm,
+                                 hit_box_detail=hit_box_detail)
+
+        # The manifest holds the simple hit box, no need to scan the pixels again
+        if hit_box_algorithm == "Simple":
+            texture._hit_box_points = tuple(points)
+
+        arcade.load_texture.texture_cache[cache_name] = texture
+        return texture
+
+
+# Atlas shared by everything in the process
+_atlas = None
+
+
+def get_atlas():
+    """ Return the pre-built atlas, reading the manifest the first time. """
+    global _atlas
+    if _atlas is None:
+        _atlas = PackedAtlas()
+    return _atlas
+
+
+def load_texture(file_name, *args, **kwargs):
+    """ Load a texture through the pre-built atlas, see PackedAtlas.load_texture. """
+    return get_atlas().load_texture(file_name, *args, **kwargs)
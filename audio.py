@@ -0,0 +1,141 @@
+"""
+Sound effects through a fixed pool of voices.
+
+Every sound in the sounds directory is loaded and decoded on the audio
+thread as soon as the manager is created, so playing one never reads or
+decodes a file and the game doesn't wait for them to start. Sounds are played on a
+fixed number of voices, pyglet players created once and reused, and each
+sound may only use so many of them at a time: past its limit, or when every
+voice is busy, the voice that has played longest is restarted with the new
+sound. Sounds asked for during a frame are collected, the same sound asked
+for twice plays once, and handed to a thread of their own at the end of the
+frame, which starts the voices while the game goes on drawing.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import arcade
+from pyglet import media
+
+# Sounds loaded at startup, by file name without the extension
+SOUND_DIRECTORY = "resources/sounds"
+
+# Sounds playing at once, at most
+MAX_VOICES = 8
+
+# Voices each sound may use at once, sounds not listed may use every voice
+SOUND_VOICE_LIMITS = {
+    "coin1": 3,
+    "jump1": 2,
+}
+
+
+def _ignore_eos():
+    pass
+
+
+class Voice:
+    """
+    A reused player and the sound it plays.
+
+    The player is only ever touched from the audio thread.
+    """
+
+    def __init__(self):
+        self.player = media.Player()
+        # Keep the finished source on the player, starting it again is then a seek
+        self.player.on_eos = _ignore_eos
+        self.sound = None
+        self.started = 0.0
+        self.ends = 0.0
+
+    def start(self, sound, volume, now):
+        player = self.player
+        player.volume = volume
+        if sound is self.sound:
+            player.seek(0.0)
+        else:
+            player.pause()
+            player.queue(sound.source)
+            if self.sound is not None:
+                player.next_source()
+            self.sound = sound
+        player.play()
+        self.started = now
+        self.ends = now + sound.source.duration
+
+    def delete(self):
+        self.player.pause()
+        self.player.delete()
+
+
+class AudioManager:
+    """
+    Plays the sounds of a directory on a pool of voices.
+
+    :param str directory: Directory of the .wav files to load
+    :param int max_voices: Sounds playing at once, at most
+    :param Dict[str, int] voice_limits: Voices each sound may use at once
+    """
+
+    def __init__(self, directory=SOUND_DIRECTORY, max_voices=MAX_VOICES, voice_limits=None):
+        self.max_voices = max_voices
+        self.voice_limits = SOUND_VOICE_LIMITS if voice_limits is None else voice_limits
+
+        # Sound name: Sound, filled on the audio thread
+        self.sounds = {}
+
+        # Sound name: volume, asked for since the last flush()
+        self.requests = {}
+
+        # Created on the audio thread, the only one that touches them
+        self._voices = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio")
+
+        # Sounds asked for before they are loaded wait for them in the queue
+        self.loading = self._executor.submit(self._load, directory)
+
+    def _load(self, directory):
+        # Decoded up front, arcade loads sounds as static sources
+        for file_name in sorted(os.listdir(directory)):
+            name, extension = os.path.splitext(file_name)
+            if extension.lower() == ".wav":
+                self.sounds[name] = arcade.load_sound(os.path.join(directory, file_name))
+
+    def play(self, name, volume=1.0):
+        """ Play a sound at the end of the frame, once however many times it is asked for """
+        self.requests[name] = max(volume, self.requests.get(name, 0.0))
+
+    def flush(self):
+        """ Start the sounds asked for during the frame, on the audio thread """
+        if self.requests:
+            self._executor.submit(self._start, self.requests)
+            self.requests = {}
+
+    def _start(self, requests):
+        now = time.perf_counter()
+        if not self._voices:
+            self._voices = [Voice() for i in range(self.max_voices)]
+        for name, volume in requests.items():
+            sound = self.sounds.get(name)
+            if sound is None:
+                print(f"Warning, no sound named {name} in the sound directory.")
+                continue
+            busy = [voice for voice in self._voices if voice.ends > now]
+            same = [voice for voice in busy if voice.sound is sound]
+            if len(same) >= self.voice_limits.get(name, self.max_voices):
+                voice = min(same, key=lambda voice: voice.started)
+            elif len(busy) < len(self._voices):
+                # A free voice, one that played this sound before if there is one
+                free = [voice for voice in self._voices if voice.ends <= now]
+                voice = next((voice for voice in free if voice.sound is sound), free[0])
+            else:
+                voice = min(busy, key=lambda voice: voice.started)
+            voice.start(sound, volume, now)
+
+    def close(self):
+        """ Stop the sounds and the audio thread """
+        self.requests = {}
+        self._executor.submit(lambda: [voice.delete() for voice in self._voices])
+        self._executor.shutdown(wait=True)
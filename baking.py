@@ -0,0 +1,234 @@
+"""
+Baked tile layers.
+
+A BakedLayer renders the still sprites of a sprite list into textures, one
+per square chunk of the map, and then draws the chunks in view as single
+quads instead of every sprite. A chunk is rendered again only once it is
+marked dirty, by add() and remove() when its sprites change, like when a
+coin is picked up, or by invalidate() when they move or change texture.
+Animated sprites are left out of the textures and drawn as sprites on top.
+
+Needs a window, the level itself stays free of GL resources.
+"""
+import math
+
+import arcade
+from arcade.gl import geometry
+from pyglet import gl
+
+# Width and height of a baked chunk in pixels
+BAKE_CHUNK_SIZE = 1024
+
+_VERTEX_SHADER = """
+#version 330
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+in vec2 in_vert;
+in vec2 in_uv;
+out vec2 v_uv;
+
+void main() {
+    gl_Position = proj.matrix * vec4(in_vert, 0.0, 1.0);
+    v_uv = in_uv;
+}
+"""
+
+_FRAGMENT_SHADER = """
+#version 330
+
+uniform sampler2D texture0;
+
+in vec2 v_uv;
+out vec4 f_color;
+
+void main() {
+    f_color = texture(texture0, v_uv);
+}
+"""
+
+# Programs are per context
+_programs = {}
+
+
+def _get_program(ctx):
+    if ctx not in _programs:
+        _programs[ctx] = ctx.program(vertex_shader=_VERTEX_SHADER, fragment_shader=_FRAGMENT_SHADER)
+    return _programs[ctx]
+
+
+class _Chunk:
+    """ Sprites overlapping one chunk and the texture they are baked into """
+
+    def __init__(self, column, row, size):
+        self.left = column * size
+        self.bottom = row * size
+        self.sprites = arcade.SpriteList(lazy=True)
+        self.framebuffer = None
+        self.quad = None
+        # Whether the texture is out of date with the sprites
+        self.dirty = True
+
+
+class BakedLayer:
+    """
+    Draws the still sprites of a sprite list from textures baked per chunk.
+
+    :param ArcadeContext ctx: Context of the window
+    :param SpriteList sprite_list: Layer to bake, sprites are only read
+    :param int chunk_size: Width and height of a chunk in pixels
+    """
+
+    def __init__(self, ctx, sprite_list, chunk_size=BAKE_CHUNK_SIZE):
+        self.ctx = ctx
+        self.sprite_list = sprite_list
+        self.chunk_size = chunk_size
+        self.program = _get_program(ctx)
+
+        # (column, row): _Chunk
+        self.chunks = {}
+        # Sprite: keys of the chunks it overlaps
+        self._chunks_of = {}
+        self._sprite_count = 0
+
+        # Animated sprites stay sprites
+        self.animated = arcade.SpriteList()
+
+        self.sync()
+
+    def _chunk_keys(self, sprite):
+        """ Chunks a sprite overlaps """
+        size = self.chunk_size
+        half_width = sprite.width / 2
+        half_height = sprite.height / 2
+        return [(column, row)
+                for column in range(math.floor((sprite.center_x - half_width) / size),
+                                    math.floor((sprite.center_x + half_width) / size) + 1)
+                for row in range(math.floor((sprite.center_y - half_height) / size),
+                                 math.floor((sprite.center_y + half_height) / size) + 1)]
+
+    def _is_known(self, sprite):
+        """ Whether the sprite is in its chunks """
+        keys = self._chunks_of.get(sprite)
+        if keys is None:
+            return self.animated in sprite.sprite_lists
+        return self.chunks[keys[0]].sprites in sprite.sprite_lists
+
+    def add(self, sprites):
+        """ Put sprites added to the layer in their chunks, those already there are skipped """
+        for sprite in sprites:
+            if isinstance(sprite, arcade.AnimatedTimeBasedSprite):
+                if self.animated not in sprite.sprite_lists:
+                    self.animated.append(sprite)
+                continue
+
+            keys = self._chunks_of.get(sprite)
+            if keys is None:
+                keys = self._chunks_of[sprite] = self._chunk_keys(sprite)
+            for key in keys:
+                chunk = self.chunks.get(key)
+                if chunk is None:
+                    chunk = self.chunks[key] = _Chunk(key[0], key[1], self.chunk_size)
+                if chunk.sprites not in sprite.sprite_lists:
+                    chunk.sprites.append(sprite)
+                    chunk.dirty = True
+
+    def remove(self, sprites):
+        """ Take sprites removed from the layer out of their chunks, before or after they leave it """
+        for sprite in sprites:
+            if self.animated in sprite.sprite_lists:
+                self.animated.remove(sprite)
+            for key in self._chunks_of.pop(sprite, ()):
+                chunk = self.chunks[key]
+                if chunk.sprites in sprite.sprite_lists:
+                    chunk.sprites.remove(sprite)
+                chunk.dirty = True
+
+    def invalidate(self, sprites=None):
+        """
+        Bake the chunks of sprites that moved or changed texture again the
+        next time they are drawn, every chunk without sprites.
+        """
+        if sprites is None:
+            for chunk in self.chunks.values():
+                chunk.dirty = True
+            return
+        sprites = list(sprites)
+        self.remove(sprites)
+        self.add(sprite for sprite in sprites if self.sprite_list in sprite.sprite_lists)
+
+    def sync(self):
+        """
+        Pick up sprites appended to the layer since the last call without
+        add(). Removed sprites have to be passed to remove().
+        """
+        sprite_list = self.sprite_list
+        # Sprites are appended at the end, so if the last one is known and
+        # the count hasn't changed there is nothing new
+        if len(sprite_list) == self._sprite_count and \
+                (len(sprite_list) == 0 or self._is_known(sprite_list[-1])):
+            return
+        self.add(sprite for sprite in sprite_list if not self._is_known(sprite))
+        self._sprite_count = len(sprite_list)
+
+    def _bake(self, chunk):
+        ctx = self.ctx
+        size = self.chunk_size
+        if chunk.framebuffer is None:
+            texture = ctx.texture((size, size), components=4)
+            texture.filter = ctx.NEAREST, ctx.NEAREST
+            chunk.framebuffer = ctx.framebuffer(color_attachments=[texture])
+            chunk.quad = geometry.screen_rectangle(chunk.left, chunk.bottom, size, size)
+
+        projection = ctx.projection_2d
+        with chunk.framebuffer.activate():
+            chunk.framebuffer.clear()
+            ctx.projection_2d = (chunk.left, chunk.left + size, chunk.bottom, chunk.bottom + size)
+            if len(chunk.sprites) > 0:
+                # Colour with the usual blending, which leaves it premultiplied
+                # on the transparent texture, then alpha on its own so it
+                # adds up the way the screen would see it.
+                gl.glColorMask(True, True, True, False)
+                chunk.sprites.draw()
+                gl.glColorMask(False, False, False, True)
+                chunk.sprites.draw(blend_function=(ctx.ONE, ctx.ONE_MINUS_SRC_ALPHA))
+                gl.glColorMask(True, True, True, True)
+        ctx.projection_2d = projection
+        chunk.dirty = False
+
+    def bake(self):
+        """ Bake every dirty chunk, done up front when a level is loaded. """
+        self.sync()
+        for chunk in self.chunks.values():
+            if chunk.dirty and len(chunk.sprites) > 0:
+                self._bake(chunk)
+
+    def draw(self):
+        """ Draw the chunks in the current projection, baking the dirty ones. """
+        if not self.sprite_list.visible:
+            return
+        self.sync()
+
+        ctx = self.ctx
+        left, right, bottom, top = ctx.projection_2d
+        size = self.chunk_size
+        visible = [self.chunks.get((column, row))
+                   for column in range(math.floor(left / size), math.floor(right / size) + 1)
+                   for row in range(math.floor(bottom / size), math.floor(top / size) + 1)]
+        visible = [chunk for chunk in visible if chunk is not None and len(chunk.sprites) > 0]
+
+        for chunk in visible:
+            if chunk.dirty:
+                self._bake(chunk)
+
+        if visible:
+            ctx.enable(ctx.BLEND)
+            ctx.blend_func = ctx.ONE, ctx.ONE_MINUS_SRC_ALPHA
+            for chunk in visible:
+                chunk.framebuffer.color_attachments[0].use(0)
+                chunk.quad.render(self.program)
+            ctx.blend_func = ctx.BLEND_DEFAULT
+
+        self.animated.draw()
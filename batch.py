@@ -0,0 +1,206 @@
+"""
+Batch simulation
+
+Plays many scripted runs of the game without a window. The runs of a batch
+are stepped side by side in one process, each with its own GameEngine and
+LevelInstances of levels loaded once per process. Batches are spread over
+the CPU cores with a process pool. Every run returns a RunTrace of where the
+player went and what it did.
+
+The command line checks which coins and doors of the given maps a number of
+random players can reach.
+
+python batch.py [map files] [--runs N] [--steps N] [--processes N]
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import TILE_SCALING
+from engine import INPUT_ATTACK, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_UP, GameEngine, GameObserver
+from levels import LevelCache, LevelInstanceCache
+
+# Runs stepped side by side in one process
+BATCH_SIZE = 16
+
+# Levels each process keeps loaded for its runs
+SHARED_LEVEL_CACHE_SIZE = 32
+
+
+class Run:
+    """
+    A scripted run of the game.
+
+    :param str map_name: Map to start in
+    :param Sequence[int] inputs: INPUT_* flags for each step, the run lasts as many steps
+    :param int to_id: Door to start at
+    :param str name: Name of the run in its trace
+    :param int trace_interval: Steps between the positions kept in the trace
+    """
+
+    def __init__(self, map_name, inputs, to_id=0, name=None, trace_interval=1):
+        self.map_name = map_name
+        self.inputs = inputs
+        self.to_id = to_id
+        self.name = name or map_name
+        self.trace_interval = trace_interval
+
+
+class RunTrace(GameObserver):
+    """
+    What happened during a run, filled in by watching its engine.
+
+    Positions are (step, map name, x, y) of the player every trace_interval
+    steps, coins (step, map name, x, y, points), doors (step, map name, x, y,
+    destination map) and deaths (step, map name, x, y).
+
+    :param Run run: The run traced
+    """
+
+    def __init__(self, run):
+        self.name = run.name
+        self.trace_interval = run.trace_interval
+        self.positions = []
+        self.coins = []
+        self.doors = []
+        self.deaths = []
+        self.score = 0
+        self.steps = 0
+
+    def on_coin_collected(self, engine, coin):
+        self.coins.append((engine.step_count, engine.map_name, coin.center_x, coin.center_y,
+                           int(coin.properties.get("Points", 0))))
+
+    def on_door(self, engine, door):
+        self.doors.append((engine.step_count, engine.map_name, door.center_x, door.center_y,
+                           door.properties["to_name"]))
+
+    def on_death(self, engine):
+        player = engine.player_sprite
+        self.deaths.append((engine.step_count, engine.map_name, player.center_x, player.center_y))
+
+    def on_step(self, engine):
+        if (engine.step_count - 1) % self.trace_interval == 0:
+            player = engine.player_sprite
+            self.positions.append((engine.step_count, engine.map_name, player.center_x, player.center_y))
+        self.score = engine.score
+        self.steps = engine.step_count
+
+
+def simulate_batch(runs, level_cache=None):
+    """
+    Play runs side by side in this process.
+
+    :param Sequence[Run] runs: Runs to play
+    :param LevelCache level_cache: Levels shared by the runs, a new cache if None
+    :Returns: RunTrace of each run, in the same order
+    """
+    if level_cache is None:
+        level_cache = LevelCache(SHARED_LEVEL_CACHE_SIZE, TILE_SCALING)
+
+    engines = []
+    traces = []
+    for run in runs:
+        engine = GameEngine(LevelInstanceCache(level_cache), move_parallax=False, animate_scenery=False)
+        trace = RunTrace(run)
+        engine.add_observer(trace)
+        engine.setup(run.map_name, run.to_id)
+        engines.append(engine)
+        traces.append(trace)
+
+    for step in range(max((len(run.inputs) for run in runs), default=0)):
+        for run, engine in zip(runs, engines):
+            if step < len(run.inputs):
+                engine.step(run.inputs[step])
+    return traces
+
+
+# Levels of a worker process, loaded as its batches need them
+_process_level_cache = None
+
+
+def _init_process():
+    global _process_level_cache
+    # Level and image paths are relative to the game directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    _process_level_cache = LevelCache(SHARED_LEVEL_CACHE_SIZE, TILE_SCALING)
+
+
+def _simulate_in_process(runs):
+    return simulate_batch(runs, _process_level_cache)
+
+
+def simulate(runs, processes=None, batch_size=BATCH_SIZE):
+    """
+    Play runs in batches spread over a pool of processes.
+
+    :param Sequence[Run] runs: Runs to play
+    :param int processes: Processes to use, one per CPU core if None
+    :param int batch_size: Runs played side by side in a process
+    :Returns: RunTrace of each run, in the same order
+    """
+    batches = [runs[i:i + batch_size] for i in range(0, len(runs), batch_size)]
+    with ProcessPoolExecutor(processes, initializer=_init_process) as executor:
+        return [trace for traces in executor.map(_simulate_in_process, batches) for trace in traces]
+
+
+def random_inputs(seed, steps):
+    """
+    Inputs of a player that mashes the controls, holding each combination
+    for a random while. The same seed gives the same inputs.
+    """
+    rng = random.Random(seed)
+    inputs = []
+    while len(inputs) < steps:
+        held = rng.choice([INPUT_RIGHT, INPUT_RIGHT | INPUT_UP, INPUT_LEFT, INPUT_LEFT | INPUT_UP,
+                           INPUT_UP, INPUT_DOWN, INPUT_RIGHT | INPUT_DOWN, INPUT_LEFT | INPUT_DOWN, 0])
+        duration = rng.randint(5, 90)
+        inputs += [held] * duration
+        if rng.random() < 0.1:
+            inputs.append(held | INPUT_ATTACK)
+    return inputs[:steps]
+
+
+def main():
+    """ Main method """
+    parser = argparse.ArgumentParser(description="Check which coins and doors random players reach.")
+    parser.add_argument("maps", nargs="*", default=["test2.json"], help="Maps to start in")
+    parser.add_argument("--runs", type=int, default=64, help="Random players per map")
+    parser.add_argument("--steps", type=int, default=3600, help="Steps per run")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes, one per core by default")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first run")
+    args = parser.parse_args()
+
+    runs = [Run(map_name, random_inputs(args.seed + i, args.steps), name=f"{map_name}#{args.seed + i}",
+                trace_interval=60)
+            for map_name in args.maps for i in range(args.runs)]
+
+    start_time = time.perf_counter()
+    traces = simulate(runs, args.processes)
+    elapsed = time.perf_counter() - start_time
+    total_steps = sum(trace.steps for trace in traces)
+    print(f"{len(runs)} runs, {total_steps} steps in {elapsed:.2f} s, {total_steps / elapsed:.0f} steps/s")
+
+    # Everything there is to reach, from the levels as loaded
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    level_cache = LevelCache(SHARED_LEVEL_CACHE_SIZE, TILE_SCALING)
+    visited = sorted(set(args.maps) | {door[4] for trace in traces for door in trace.doors})
+    for map_name in visited:
+        level = level_cache.get(map_name)
+        coins = {(coin.center_x, coin.center_y) for coin in level.coins}
+        doors = {(door.center_x, door.center_y) for door in level.door_list if "to_name" in door.properties}
+        coins_reached = {coin[2:4] for trace in traces for coin in trace.coins if coin[1] == map_name}
+        doors_used = {door[2:4] for trace in traces for door in trace.doors if door[1] == map_name}
+        deaths = sum(1 for trace in traces for death in trace.deaths if death[1] == map_name)
+        print(f"{map_name}: {len(coins_reached & coins)}/{len(coins)} coins, "
+              f"{len(doors_used & doors)}/{len(doors)} doors, {deaths} deaths")
+        for x, y in sorted(coins - coins_reached):
+            print(f"    coin not reached at ({x:.0f}, {y:.0f})")
+        for x, y in sorted(doors - doors_used):
+            print(f"    door not used at ({x:.0f}, {y:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""
+Benchmarks
+
+generate_map writes synthetic Tiled maps of any size, and run measures how
+loading, updating, drawing and memory scale with them against a saved
+baseline.
+
+python -m benchmarks.run
+"""
@@ -0,0 +1,235 @@
+"""
+Synthetic level generator.
+
+Writes Tiled JSON maps with the layers the game reads, filled at random
+with ground, floating platforms, one-way platforms, moving platforms,
+coins, ladders, parallax scenery and doors. The maps use the tilesets of
+resources/tilesets, so they are written to resources/tilemaps next to the
+real levels. The same arguments and seed always give the same map.
+
+python -m benchmarks.generate_map bench.json --width 1000 --height 40
+"""
+import argparse
+import json
+import os
+import random
+
+TILEMAP_DIRECTORY = "resources/tilemaps"
+
+TILE_SIZE = 64
+
+# Tilesets of test2.json, the gids below are from it
+TILESETS = [
+    {"firstgid": 1, "source": "../tilesets/items.json"},
+    {"firstgid": 25, "source": "../tilesets/painted-style.json"},
+    {"firstgid": 257, "source": "../tilesets/painted-style2.json"},
+    {"firstgid": 261, "source": "../tilesets/painted-style3.json"},
+    {"firstgid": 263, "source": "../tilesets/painted-style4.json"},
+    {"firstgid": 265, "source": "../tilesets/sunny-land.json"},
+    {"firstgid": 793, "source": "../tilesets/sunny-land2.json"},
+    {"firstgid": 1157, "source": "../tilesets/sunny-land4.json"},
+    {"firstgid": 1410, "source": "../tilesets/door.json"},
+    {"firstgid": 4482, "source": "../tilesets/sunny-land3.json"},
+]
+
+GROUND_TOP_GID = 315
+GROUND_GID = 267
+PASSABLE_GID = 368
+LADDER_GID = 363
+COIN_GIDS = [1, 2, 3]
+DOOR_GID = 3052
+BACKGROUND_GIDS = [676, 4482, 4650]
+FOREGROUND_GIDS = [838, 839, 840]
+
+# Parallax factors of the scenery layers, 1 to 3
+PARALLAX_FACTORS = [1.0, 0.7, 0.5]
+
+# Rows of solid ground at the bottom of the map
+GROUND_ROWS = 2
+
+
+def generate_map(width, height, platforms=0, passable=0, moving_platforms=0, coins=0, ladders=0,
+                 parallax_layers=0, scenery_density=0.1, doors=1, map_name="bench.json", seed=0):
+    """
+    Create a Tiled map.
+
+    :param int width: Width in tiles
+    :param int height: Height in tiles, at least GROUND_ROWS + 4
+    :param int platforms: Floating platforms, 3 to 8 tiles long
+    :param int passable: One-way platforms, 2 to 6 tiles long
+    :param int moving_platforms: Platforms moving left and right
+    :param int coins: Coins, placed in empty cells
+    :param int ladders: Ladders, 3 to 6 tiles tall
+    :param int parallax_layers: Background and foreground layers, 0 to 3 of each
+    :param float scenery_density: Part of the cells of a scenery layer with a tile
+    :param int doors: Doors, leading to each other in a ring. The first is where the player starts.
+    :param str map_name: Name of the map the doors lead to
+    :param int seed: Seed of the random placement
+    :Returns: The map as a dict of Tiled's JSON format
+    """
+    rng = random.Random(seed)
+    cells = width * height
+
+    def index(column, row_from_bottom):
+        return (height - 1 - row_from_bottom) * width + column
+
+    # -- Ground, with a gap now and then
+    solid = [0] * cells
+    column = 0
+    while column < width:
+        run = rng.randint(8, 30)
+        for x in range(column, min(column + run, width)):
+            solid[index(x, GROUND_ROWS - 1)] = GROUND_TOP_GID
+            for row in range(GROUND_ROWS - 1):
+                solid[index(x, row)] = GROUND_GID
+        column += run + rng.randint(2, 3)
+    # The start is always on the ground
+    for x in range(0, min(4, width)):
+        solid[index(x, GROUND_ROWS - 1)] = GROUND_TOP_GID
+
+    def place_strip(layer, gid, count, min_length, max_length):
+        for i in range(count):
+            length = rng.randint(min_length, max_length)
+            x = rng.randrange(0, max(width - length, 1))
+            row = rng.randrange(GROUND_ROWS + 2, height - 1)
+            for column in range(x, min(x + length, width)):
+                if not solid[index(column, row)]:
+                    layer[index(column, row)] = gid
+
+    # -- Platforms and one-way platforms
+    place_strip(solid, GROUND_TOP_GID, platforms, 3, 8)
+    one_way = [0] * cells
+    place_strip(one_way, PASSABLE_GID, passable, 2, 6)
+
+    # -- Ladders, standing on something
+    ladder_layer = [0] * cells
+    for i in range(ladders):
+        x = rng.randrange(width)
+        top = rng.randrange(GROUND_ROWS + 3, height - 1)
+        for row in range(max(top - rng.randint(3, 6), GROUND_ROWS), top + 1):
+            ladder_layer[index(x, row)] = LADDER_GID
+
+    # -- Coins, in empty cells
+    coin_layer = [0] * cells
+    for i in range(coins):
+        for attempt in range(10):
+            cell = index(rng.randrange(width), rng.randrange(GROUND_ROWS, height - 1))
+            if not solid[cell] and not one_way[cell] and not coin_layer[cell]:
+                coin_layer[cell] = rng.choice(COIN_GIDS)
+                break
+
+    layers = []
+    next_id = [1]
+
+    def tile_layer(name, data, parallax_factor=1.0):
+        layer = {"data": data, "height": height, "id": next_id[0], "name": name, "opacity": 1,
+                 "type": "tilelayer", "visible": True, "width": width, "x": 0, "y": 0}
+        if parallax_factor != 1.0:
+            layer["parallaxx"] = parallax_factor
+        next_id[0] += 1
+        return layer
+
+    objects = []
+
+    def tile_object(gid, column, row_from_bottom, properties=None, width_in_tiles=1):
+        tiled_object = {"gid": gid, "height": TILE_SIZE, "id": len(objects) + 1, "name": "", "rotation": 0,
+                        "type": "", "visible": True, "width": TILE_SIZE * width_in_tiles,
+                        "x": column * TILE_SIZE, "y": (height - row_from_bottom) * TILE_SIZE}
+        if properties:
+            tiled_object["properties"] = [{"name": name, "type": kind, "value": value}
+                                          for name, kind, value in properties]
+        objects.append(tiled_object)
+        return tiled_object
+
+    # -- Moving platforms
+    moving = []
+    for i in range(moving_platforms):
+        x = rng.randrange(0, max(width - 8, 1))
+        row = rng.randrange(GROUND_ROWS + 2, height - 1)
+        moving.append(tile_object(PASSABLE_GID, x, row, [
+            ("change_x", "float", rng.choice([-2.0, -1.0, 1.0, 2.0])),
+            ("boundary_left", "float", float(x * TILE_SIZE)),
+            ("boundary_right", "float", float((x + 8) * TILE_SIZE)),
+        ], width_in_tiles=2))
+
+    # -- Doors, on the ground in a ring, each to the next one
+    door_objects = []
+    doors = max(doors, 1)
+    for i in range(doors):
+        x = 1 if i == 0 else rng.randrange(1, width - 1)
+        # Somewhere to stand in front of the door
+        solid[index(x, GROUND_ROWS - 1)] = solid[index(x, GROUND_ROWS - 1)] or GROUND_TOP_GID
+        door_objects.append(tile_object(DOOR_GID, x, GROUND_ROWS, [
+            ("id", "int", i),
+            ("to_id", "int", (i + 1) % doors),
+            ("to_name", "string", map_name),
+        ]))
+
+    def object_layer(name, layer_objects):
+        layer = {"draworder": "topdown", "id": next_id[0], "name": name, "objects": layer_objects,
+                 "opacity": 1, "type": "objectgroup", "visible": True, "x": 0, "y": 0}
+        next_id[0] += 1
+        return layer
+
+    def scenery(gids):
+        return [rng.choice(gids) if rng.random() < scenery_density else 0 for i in range(cells)]
+
+    parallax_layers = min(max(parallax_layers, 0), 3)
+    layers.append(object_layer("Moving Platforms", moving))
+    layers.append(object_layer("Doors", door_objects))
+    layers.append(tile_layer("Ladders", ladder_layer))
+    layers.append(tile_layer("Coins", coin_layer))
+    for i in range(parallax_layers, 0, -1):
+        layers.append(tile_layer(f"Background{i}", scenery(BACKGROUND_GIDS), PARALLAX_FACTORS[i - 1]))
+    layers.append(tile_layer("Passable Platforms", one_way))
+    layers.append(tile_layer("Platforms", solid))
+    for i in range(parallax_layers, 0, -1):
+        layers.append(tile_layer(f"Foreground{i}", scenery(FOREGROUND_GIDS), PARALLAX_FACTORS[i - 1]))
+
+    return {"backgroundcolor": "#ffffff", "compressionlevel": -1, "height": height, "infinite": False,
+            "layers": layers, "nextlayerid": next_id[0], "nextobjectid": len(objects) + 1,
+            "orientation": "orthogonal", "renderorder": "left-up", "tiledversion": "1.7.2",
+            "tileheight": TILE_SIZE, "tilesets": TILESETS, "tilewidth": TILE_SIZE, "type": "map",
+            "version": "1.6", "width": width}
+
+
+def write_map(map_name, width, height, **kwargs):
+    """
+    Generate a map and write it to TILEMAP_DIRECTORY, kwargs go to generate_map().
+
+    :Returns: Path of the map file
+    """
+    tiled_map = generate_map(width, height, map_name=map_name, **kwargs)
+    file_name = os.path.join(TILEMAP_DIRECTORY, map_name)
+    with open(file_name, "w") as file:
+        json.dump(tiled_map, file)
+    return file_name
+
+
+def main():
+    """ Main method """
+    parser = argparse.ArgumentParser(description="Write a synthetic Tiled map.")
+    parser.add_argument("map_name", help="File name of the map in resources/tilemaps")
+    parser.add_argument("--width", type=int, default=150, help="Width in tiles")
+    parser.add_argument("--height", type=int, default=13, help="Height in tiles")
+    parser.add_argument("--platforms", type=int, default=20)
+    parser.add_argument("--passable", type=int, default=10)
+    parser.add_argument("--moving-platforms", type=int, default=2)
+    parser.add_argument("--coins", type=int, default=30)
+    parser.add_argument("--ladders", type=int, default=5)
+    parser.add_argument("--parallax-layers", type=int, default=3)
+    parser.add_argument("--scenery-density", type=float, default=0.1)
+    parser.add_argument("--doors", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    file_name = write_map(args.map_name, args.width, args.height, platforms=args.platforms,
+                          passable=args.passable, moving_platforms=args.moving_platforms, coins=args.coins,
+                          ladders=args.ladders, parallax_layers=args.parallax_layers,
+                          scenery_density=args.scenery_density, doors=args.doors, seed=args.seed)
+    print(f"{file_name} ({os.path.getsize(file_name)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Benchmark suite.
+
+Generates a map for each size in SIZES and measures, each in a fresh
+process so every size starts with cold caches:
+
+    load_s          GameEngine.setup() of the map
+    update_*_ms     one engine step, after a warm-up, running and jumping
+    draw_*_ms       one on_draw() including the GPU finishing it, with --draw
+    memory_mb       Python memory held by the loaded level
+    peak_rss_mb     peak resident memory of the process, where the OS reports it
+
+Results are compared against benchmarks/baseline.json, written with
+--save-baseline on a reference machine.
+
+python -m benchmarks.run [--sizes small medium] [--draw] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.generate_map import write_map
+from constants import TILE_SCALING
+from engine import INPUT_RIGHT, INPUT_UP, GameEngine
+from levels import LevelCache
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Width and height in tiles of each map size. What is in the map scales
+# with its area, see map_contents().
+SIZES = {
+    "small": (150, 13),
+    "medium": (1000, 40),
+    "large": (4000, 100),
+}
+
+WARMUP_STEPS = 60
+UPDATE_STEPS = 600
+DRAW_FRAMES = 300
+
+# How much slower than the baseline a result may be before it counts as a regression
+REGRESSION_THRESHOLD = 1.25
+
+
+def map_contents(width, height):
+    """ Arguments of generate_map() for a map of the given size """
+    cells = width * height
+    return {
+        "platforms": cells // 100,
+        "passable": cells // 200,
+        "moving_platforms": cells // 2000,
+        "coins": cells // 50,
+        "ladders": cells // 400,
+        "parallax_layers": 3,
+        "doors": cells // 2000 + 1,
+    }
+
+
+def _scripted_inputs(steps):
+    return [INPUT_RIGHT | (INPUT_UP if step % 90 < 20 else 0) for step in range(steps)]
+
+
+def _milliseconds(times):
+    times = np.array(times) * 1000
+    return {"mean": float(times.mean()), "p95": float(np.percentile(times, 95))}
+
+
+def benchmark_size(size, draw=False):
+    """ Measure one map size, meant to run in a process of its own """
+    # Level and image paths are relative to the game directory
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    width, height = SIZES[size]
+    map_name = f"bench-{size}.json"
+    write_map(map_name, width, height, **map_contents(width, height))
+    results = {"tiles": width * height}
+
+    # Load, cold
+    engine = GameEngine(animate_scenery=draw)
+    start_time = time.perf_counter()
+    engine.setup(map_name)
+    results["load_s"] = time.perf_counter() - start_time
+
+    # Memory of a second copy of the level, textures are cached by now
+    tracemalloc.start()
+    level = LevelCache(1, TILE_SCALING).get(map_name)
+    results["memory_mb"] = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    level.close()
+    del level
+
+    # Steady state updates
+    inputs = _scripted_inputs(WARMUP_STEPS + UPDATE_STEPS)
+    engine.run(inputs[:WARMUP_STEPS])
+    times = []
+    for step_inputs in inputs[WARMUP_STEPS:]:
+        start_time = time.perf_counter()
+        engine.step(step_inputs)
+        times.append(time.perf_counter() - start_time)
+    for name, value in _milliseconds(times).items():
+        results[f"update_{name}_ms"] = value
+
+    if draw:
+        from main_window import MyGame
+
+        window = MyGame(engine)
+        window.on_level_loaded(engine)
+        times = []
+        for step_inputs in _scripted_inputs(DRAW_FRAMES):
+            engine.step(step_inputs)
+            window.scroll_viewport()
+            start_time = time.perf_counter()
+            window.on_draw()
+            window.ctx.finish()
+            times.append(time.perf_counter() - start_time)
+            window.flip()
+        window.close()
+        for name, value in _milliseconds(times).items():
+            results[f"draw_{name}_ms"] = value
+
+    try:
+        import resource
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        results["peak_rss_mb"] = peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+    except ImportError:
+        pass
+
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Print results next to the baseline.
+
+    :Returns: Number of results over threshold times their baseline
+    """
+    regressions = 0
+    for size, metrics in results.items():
+        print(size)
+        for metric, value in metrics.items():
+            line = f"    {metric:16} {value:12.3f}"
+            reference = baseline.get(size, {}).get(metric)
+            if reference:
+                ratio = value / reference
+                line += f"   baseline {reference:12.3f}   {ratio:5.2f}x"
+                if metric != "tiles" and ratio > threshold:
+                    line += "   REGRESSION"
+                    regressions += 1
+            print(line)
+    return regressions
+
+
+def main():
+    """ Main method """
+    parser = argparse.ArgumentParser(description="Measure how the game scales with the size of a map.")
+    parser.add_argument("--sizes", nargs="*", default=list(SIZES), choices=list(SIZES), help="Map sizes to run")
+    parser.add_argument("--draw", action="store_true", help="Also measure drawing, needs a display")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown against the baseline that counts as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results[size] = executor.submit(benchmark_size, size, args.draw).result()
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as file:
+            baseline = json.load(file)
+    else:
+        print(f"No baseline at {BASELINE_FILE}, run with --save-baseline to make one")
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE_FILE, "w") as file:
+            json.dump(baseline, file, indent=4, sort_keys=True)
+        print(f"Saved the baseline to {BASELINE_FILE}")
+    elif regressions:
+        print(f"{regressions} regressions")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
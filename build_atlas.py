@@ -0,0 +1,199 @@
+"""
+Build the texture atlas
+
+Packs the player and character images, the item images and the tileset
+tiles used by the maps into atlas pages under resources/atlas, and writes
+the manifest read by atlas.py.
+
+python build_atlas.py
+"""
+import argparse
+import glob
+import json
+import os
+
+import arcade
+import PIL.Image
+
+from atlas import ATLAS_DIRECTORY, ATLAS_MANIFEST, frame_key
+
+# Loose images packed into the atlas
+IMAGE_PATTERNS = [
+    "resources/images/player/*.png",
+    "resources/images/animated_characters/*/*.png",
+]
+TILESET_PATTERN = "resources/tilesets/*.json"
+TILEMAP_PATTERN = "resources/tilemaps/*.json"
+
+# Tiled stores flips in the top bits of a gid
+_GID_MASK = 0x1FFFFFFF
+
+
+def _resource_path(base_file, relative_path):
+    """ Path of a file referenced from a Tiled file, relative to the game directory """
+    return os.path.relpath(os.path.normpath(os.path.join(os.path.dirname(base_file), relative_path)))
+
+
+def used_tiles():
+    """
+    Tiles used by the maps, as a dict of tileset file to the set of tile ids.
+    """
+    used = {}
+    for map_file in sorted(glob.glob(TILEMAP_PATTERN)):
+        with open(map_file) as f:
+            tiled_map = json.load(f)
+
+        gids = set()
+        layers = list(tiled_map["layers"])
+        while layers:
+            layer = layers.pop()
+            if layer["type"] == "group":
+                layers.extend(layer["layers"])
+            elif layer["type"] == "tilelayer":
+                gids.update(gid & _GID_MASK for gid in layer["data"])
+            elif layer["type"] == "objectgroup":
+                gids.update(obj["gid"] & _GID_MASK for obj in layer["objects"] if "gid" in obj)
+        gids.discard(0)
+
+        tilesets = sorted(tiled_map["tilesets"], key=lambda tileset: tileset["firstgid"], reverse=True)
+        for gid in gids:
+            for tileset in tilesets:
+                if gid >= tileset["firstgid"]:
+                    source = _resource_path(map_file, tileset["source"])
+                    used.setdefault(source, set()).add(gid - tileset["firstgid"])
+                    break
+    return used
+
+
+def collect_frames():
+    """
+    Find every image to pack.
+
+    :returns: List of (manifest key, PIL image)
+    """
+    frames = []
+
+    for pattern in IMAGE_PATTERNS:
+        for file_name in sorted(glob.glob(pattern)):
+            frames.append((frame_key(file_name), PIL.Image.open(file_name).convert("RGBA")))
+
+    used = used_tiles()
+    for tileset_file in sorted(glob.glob(TILESET_PATTERN)):
+        with open(tileset_file) as f:
+            tileset = json.load(f)
+        tiles = {tile["id"]: tile for tile in tileset.get("tiles", [])}
+
+        if "image" not in tileset:
+            # Image collection, every tile is a file of its own
+            for tile in tiles.values():
+                file_name = _resource_path(tileset_file, tile["image"])
+                frames.append((frame_key(file_name), PIL.Image.open(file_name).convert("RGBA")))
+            continue
+
+        # Sprite sheet, only pack the tiles the maps use and their animation frames
+        tile_ids = set(used.get(os.path.relpath(tileset_file), ()))
+        for tile_id in list(tile_ids):
+            for frame in tiles.get(tile_id, {}).get("animation", []):
+                tile_ids.add(frame["tileid"])
+
+        file_name = _resource_path(tileset_file, tileset["image"])
+        sheet = PIL.Image.open(file_name).convert("RGBA")
+        margin = tileset.get("margin", 0)
+        spacing = tileset.get("spacing", 0)
+        width = tileset["tilewidth"]
+        height = tileset["tileheight"]
+        for tile_id in sorted(tile_ids):
+            x = margin + tile_id % tileset["columns"] * (width + spacing)
+            y = margin + tile_id // tileset["columns"] * (height + spacing)
+            image = sheet.crop((x, y, x + width, y + height))
+            if image.getbbox() is None:
+                # Fully transparent
+                continue
+            frames.append((frame_key(file_name, x, y, width, height), image))
+
+    # The same image may be listed by more than one tileset
+    return list(dict(frames).items())
+
+
+def pack(frames, page_size, padding):
+    """
+    Shelf-pack frames into pages, tallest first.
+
+    :returns: Dict of key to (page, x, y), and the number of pages
+    """
+    placements = {}
+    page = 0
+    x = y = shelf_height = 0
+    for key, image in sorted(frames, key=lambda frame: frame[1].height, reverse=True):
+        width, height = image.size
+        if width + padding > page_size or height + padding > page_size:
+            print(f"Warning, {key} is larger than an atlas page and is left out.")
+            continue
+
+        # Next shelf
+        if x + width + padding > page_size:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+
+        # Next page
+        if y + height + padding > page_size:
+            page += 1
+            x = y = shelf_height = 0
+
+        placements[key] = (page, x + padding, y + padding)
+        x += width + padding
+        shelf_height = max(shelf_height, height + padding)
+
+    page_count = page + 1 if placements else 0
+    return placements, page_count
+
+
+def build(page_size=2048, padding=2):
+    """ Pack the images, write the pages and the manifest. """
+    frames = collect_frames()
+    placements, page_count = pack(frames, page_size, padding)
+
+    os.makedirs(ATLAS_DIRECTORY, exist_ok=True)
+    pages = [PIL.Image.new("RGBA", (page_size, page_size), (0, 0, 0, 0)) for i in range(page_count)]
+    manifest_frames = {}
+    for key, image in frames:
+        if key not in placements:
+            continue
+        page, x, y = placements[key]
+        pages[page].paste(image, (x, y))
+        width, height = image.size
+        manifest_frames[key] = {
+            "page": page,
+            "x": x,
+            "y": y,
+            "width": width,
+            "height": height,
+            "hit_box": [list(point) for point in arcade.calculate_hit_box_points_simple(image)],
+        }
+
+    page_names = []
+    for i, page_image in enumerate(pages):
+        page_names.append(f"atlas{i}.png")
+        page_image.save(os.path.join(ATLAS_DIRECTORY, page_names[-1]))
+
+    with open(ATLAS_MANIFEST, "w") as f:
+        json.dump({"size": page_size, "pages": page_names, "frames": manifest_frames}, f)
+
+    print(f"Packed {len(manifest_frames)} frames into {page_count} pages of {page_size}x{page_size}.")
+
+
+def main():
+    """ Main method """
+    parser = argparse.ArgumentParser(description="Pack the game images into atlas pages.")
+    parser.add_argument("--size", type=int, default=2048, help="Width and height of a page in pixels")
+    parser.add_argument("--padding", type=int, default=2, help="Empty pixels around each frame")
+    args = parser.parse_args()
+
+    # Paths in the manifest are relative to the game directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    build(args.size, args.padding)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compile levels
+
+Compiles the Tiled maps in resources/tilemaps and resources/tmx_maps into
+the binary level format read by level_format.CompiledMap. The game loads
+the compiled version of a map when it is at least as new as the source.
+
+python compile_levels.py [map files] [--benchmark]
+"""
+import argparse
+import glob
+import os
+import time
+
+from level_format import SOURCE_DIRECTORIES, CompiledMap, compiled_level_path, write_compiled_map
+
+
+def benchmark(file_name, compiled_file, repeat):
+    """
+    Time loading a map through arcade.tilemap.TileMap and through the
+    compiled format. Textures are cached after the first load in both cases,
+    so this compares parsing and building the sprite lists.
+    """
+    from levels import LAYER_OPTIONS, AtlasTileMap
+
+    timings = {}
+    loaders = [("tilemap", lambda: AtlasTileMap(file_name, 1.0, LAYER_OPTIONS)),
+               ("compiled", lambda: CompiledMap(compiled_file, 1.0, LAYER_OPTIONS))]
+    for name, loader in loaders:
+        if name == "tilemap" and file_name.endswith(".tmx"):
+            # arcade's TileMap only reads JSON maps
+            continue
+        loader()
+        start_time = time.perf_counter()
+        for i in range(repeat):
+            loader()
+        timings[name] = (time.perf_counter() - start_time) / repeat
+    return timings
+
+
+def main():
+    """ Main method """
+    parser = argparse.ArgumentParser(description="Compile Tiled maps into the binary level format.")
+    parser.add_argument("maps", nargs="*", help="Maps to compile, defaults to every map in the resources")
+    parser.add_argument("--benchmark", action="store_true", help="Compare load times against arcade's TileMap")
+    parser.add_argument("--repeat", type=int, default=10, help="Loads per map when benchmarking")
+    args = parser.parse_args()
+
+    # Image paths in the compiled levels are relative to the game directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    maps = args.maps
+    if not maps:
+        for directory in SOURCE_DIRECTORIES:
+            maps += sorted(glob.glob(f"{directory}/*.json") + glob.glob(f"{directory}/*.tmx"))
+
+    for file_name in maps:
+        output_file = write_compiled_map(file_name, compiled_level_path(os.path.basename(file_name)))
+        print(f"{file_name} -> {output_file} "
+              f"({os.path.getsize(file_name)} -> {os.path.getsize(output_file)} bytes)")
+
+        if args.benchmark:
+            timings = benchmark(file_name, output_file, args.repeat)
+            line = "    " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items())
+            if len(timings) == 2:
+                line += f", {timings['tilemap'] / timings['compiled']:.1f}x faster"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
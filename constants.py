@@ -0,0 +1,82 @@
+"""
+Constants shared by the game engine and the window.
+"""
+
+# Constants
+SCREEN_WIDTH = 1280
+SCREEN_HEIGHT = 720
+SCREEN_TITLE = "Platformer"
+
+# Length of a simulation step in seconds. The engine always advances by
+# exactly this much, however fast the window is drawn.
+FIXED_TIMESTEP = 1 / 60
+
+# Simulation steps one window update may run at most, so a long stall
+# doesn't leave the game catching up for seconds
+MAX_STEPS_PER_UPDATE = 5
+
+# Frames the window updates and draws per second, the simulation runs at
+# FIXED_TIMESTEP either way
+FRAME_RATE = 60
+
+# Draw the player, the moving platforms and the camera between the last two
+# simulation steps, by how far the frame is into the next one, instead of
+# where the last step left them
+INTERPOLATE_DRAWING = True
+
+# Steps between the checkpoints the engine keeps, see snapshots.Snapshot, and
+# how many of the last ones it keeps for rewinding
+CHECKPOINT_INTERVAL = 60
+CHECKPOINT_COUNT = 30
+
+# Constants used to scale our sprites from their original size
+TILE_SCALING = 1.0
+CHARACTER_SCALING = 1.0
+COIN_SCALING = TILE_SCALING
+SPRITE_PIXEL_SIZE = 64
+GRID_PIXEL_SIZE = (SPRITE_PIXEL_SIZE * TILE_SCALING)
+
+# Movement speed of player, in pixels per simulation step
+PLAYER_MOVEMENT_SPEED = 7
+GRAVITY = 1.5
+PLAYER_JUMP_SPEED = 18
+PLAYER_FALL_SPEED = 18
+
+# How many pixels to keep as a minimum margin between the character
+# and the edge of the screen.
+LEFT_VIEWPORT_MARGIN = 200
+RIGHT_VIEWPORT_MARGIN = 200
+BOTTOM_VIEWPORT_MARGIN = 150
+TOP_VIEWPORT_MARGIN = 100
+
+# How many loaded levels to keep around for respawns and door transitions
+LEVEL_CACHE_SIZE = 4
+
+# Only keep the tiles around the camera as sprites, for very large maps
+STREAM_LEVELS = False
+
+# Draw the Background and Foreground layers with a projection of their own,
+# placed from the viewport and their parallax factor, instead of moving their
+# sprites every frame
+GPU_PARALLAX = True
+
+# Collide with the static platforms through the level's tile grid instead of
+# their sprites. Moving platforms are sprites either way.
+TILE_GRID_COLLISION = False
+
+# Draw the static tile layers from textures baked per chunk instead of
+# drawing every tile sprite each frame
+BAKE_STATIC_LAYERS = False
+
+# Draw the tile layers that aren't baked or streamed chunk by chunk, only the
+# chunks in view
+CULL_LAYERS = True
+
+# Animation set of the player, see animations.CHARACTERS.
+# Images from Kenney.nl's Asset Pack 3 are "female_adventurer", "female_person",
+# "male_person", "male_adventurer", "zombie" and "robot".
+PLAYER_CHARACTER = "adventurer"
+
+# Constants used to track if the player is facing left or right
+RIGHT_FACING = 0
+LEFT_FACING = 1
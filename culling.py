@@ -0,0 +1,146 @@
+"""
+Viewport culling of sprite layers.
+
+A CulledLayer sorts the sprites of a sprite list into a grid of chunks, each
+a sprite list of its own, and draws only the chunks the current projection
+can see. What is drawn depends on the size of the screen rather than on the
+length of the level. The projection is the one the layer is drawn with, so
+parallax layers drawn through their own projection are culled where they
+are seen. Layers moved as a whole on the CPU are followed by watching one
+of their sprites.
+
+Needs a window, like baking.BakedLayer.
+"""
+import math
+
+import arcade
+
+# Width and height of a chunk in pixels
+CULL_CHUNK_SIZE = 512
+
+# Sprites sorted into chunks between yields of CulledLayer.sync_steps()
+SYNC_BATCH = 2000
+
+
+class CulledLayer:
+    """
+    Draws the sprites of a sprite list that are in view, chunk by chunk.
+
+    Sprites are placed in the chunk of their center when they are first
+    seen and are expected to stay there, unless the whole layer moves.
+
+    :param ArcadeContext ctx: Context of the window
+    :param SpriteList sprite_list: Layer to draw, sprites are only read
+    :param int chunk_size: Width and height of a chunk in pixels
+    """
+
+    def __init__(self, ctx, sprite_list, chunk_size=CULL_CHUNK_SIZE):
+        self.ctx = ctx
+        self.sprite_list = sprite_list
+        self.chunk_size = chunk_size
+
+        # (column, row): SpriteList
+        self.chunks = {}
+        # Sprite: key of its chunk
+        self._chunk_of = {}
+        self._sprite_count = 0
+
+        # How far a sprite can reach out of its chunk
+        self.margin = 0.0
+
+        # A sprite of the layer and where it was when chunking started, to
+        # know how far the layer has moved since
+        self._reference = None
+        self._origin = (0.0, 0.0)
+
+    def offset(self):
+        """ How far the layer has moved since its sprites were chunked """
+        if self._reference is None:
+            return 0.0, 0.0
+        return self._reference.center_x - self._origin[0], self._reference.center_y - self._origin[1]
+
+    def _is_known(self, sprite):
+        """ Whether the sprite is in its chunk """
+        key = self._chunk_of.get(sprite)
+        return key is not None and self.chunks[key] in sprite.sprite_lists
+
+    def _place(self, sprite):
+        """ Put a sprite in its chunk if it isn't there """
+        key = self._chunk_of.get(sprite)
+        if key is None:
+            size = self.chunk_size
+            offset_x, offset_y = self.offset()
+            key = self._chunk_of[sprite] = (math.floor((sprite.center_x - offset_x) / size),
+                                            math.floor((sprite.center_y - offset_y) / size))
+            self.margin = max(self.margin, abs(sprite.width) / 2, abs(sprite.height) / 2)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = arcade.SpriteList()
+        if chunk not in sprite.sprite_lists:
+            chunk.append(sprite)
+
+    def add(self, sprites):
+        """ Put sprites added to the layer in their chunks, like BakedLayer.add() """
+        # Before the first sync the layer has nothing to place them against,
+        # sync() picks them up then
+        if self._reference is None:
+            return
+        for sprite in sprites:
+            self._place(sprite)
+
+    def remove(self, sprites):
+        """ Take sprites removed from the layer out of their chunks, like BakedLayer.remove() """
+        for sprite in sprites:
+            key = self._chunk_of.pop(sprite, None)
+            if key is not None and self.chunks[key] in sprite.sprite_lists:
+                self.chunks[key].remove(sprite)
+
+    def sync_steps(self, batch=SYNC_BATCH):
+        """
+        Generator picking up the sprites added to the layer since the last
+        sync, yielding every batch sprites. Removed sprites drop out of the
+        chunks by themselves, as they leave every sprite list.
+        """
+        sprite_list = self.sprite_list
+        # Sprites are appended at the end, so if the last one is in its chunk
+        # and the count hasn't changed there is nothing new
+        if len(sprite_list) == self._sprite_count and \
+                (len(sprite_list) == 0 or self._is_known(sprite_list[-1])):
+            return
+
+        if self._reference is None and len(sprite_list) > 0:
+            self._reference = sprite_list[0]
+            self._origin = self._reference.position
+
+        for i, sprite in enumerate(sprite_list):
+            self._place(sprite)
+            if i % batch == batch - 1:
+                yield
+
+        # Forget sprites that left the layer for good
+        for sprite in [sprite for sprite in self._chunk_of if not sprite.sprite_lists]:
+            del self._chunk_of[sprite]
+        self._sprite_count = len(sprite_list)
+
+    def sync(self):
+        """ Pick up the sprites added to the layer since the last sync. """
+        for step in self.sync_steps():
+            pass
+
+    def draw(self):
+        """ Draw the chunks in view of the current projection. """
+        if not self.sprite_list.visible:
+            return
+        self.sync()
+
+        left, right, bottom, top = self.ctx.projection_2d
+        offset_x, offset_y = self.offset()
+        margin = self.margin
+        size = self.chunk_size
+        for column in range(math.floor((left - offset_x - margin) / size),
+                            math.floor((right - offset_x + margin) / size) + 1):
+            for row in range(math.floor((bottom - offset_y - margin) / size),
+                             math.floor((top - offset_y + margin) / size) + 1):
+                chunk = self.chunks.get((column, row))
+                if chunk is not None:
+                    chunk.draw()
@@ -0,0 +1,505 @@
+"""
+Game engine
+
+The simulation of the game without a window. GameEngine advances the game
+one fixed step at a time from the state of the controls, given as a bit
+mask of the INPUT_* flags, so the same inputs always play out the same way
+whether the game is drawn at 30 frames per second, 144, or not at all.
+
+Anything that only presents the game, like drawing and sounds, listens to
+the engine through a GameObserver.
+
+python engine.py [map file] [--steps N]
+"""
+import argparse
+import os
+import time
+from collections import deque
+
+import arcade
+
+from constants import (BOTTOM_VIEWPORT_MARGIN, CHECKPOINT_COUNT, CHECKPOINT_INTERVAL, FIXED_TIMESTEP, GPU_PARALLAX, GRAVITY, GRID_PIXEL_SIZE,
+                       LEVEL_CACHE_SIZE, PLAYER_CHARACTER, PLAYER_FALL_SPEED, PLAYER_JUMP_SPEED,
+                       PLAYER_MOVEMENT_SPEED, SCREEN_HEIGHT, SCREEN_WIDTH, STREAM_LEVELS, TILE_GRID_COLLISION,
+                       TILE_SCALING, TOP_VIEWPORT_MARGIN)
+from levels import LevelCache
+from physics import PlatformerPhysicsEngine
+from player import PlayerCharacter
+from profiler import NullProfiler
+from snapshots import restore_snapshot, take_snapshot
+from tile_physics import TileGridPhysicsEngine
+
+# Controls held during a step
+INPUT_LEFT = 0x01
+INPUT_RIGHT = 0x02
+INPUT_UP = 0x04
+INPUT_DOWN = 0x08
+# Attack is a button press, set for the one step it was pressed in
+INPUT_ATTACK = 0x10
+
+
+class GameObserver:
+    """
+    Receives what happens in a GameEngine. Every method does nothing by
+    default, override the ones you need.
+    """
+
+    def on_level_loaded(self, engine):
+        """ A level was set up, at the start, on respawn, through a door or from a snapshot """
+
+    def on_jump(self, engine):
+        """ The player jumped """
+
+    def on_coin_collected(self, engine, coin):
+        """ The player picked up a coin, already removed from the level """
+
+    def on_death(self, engine):
+        """ The player fell out of the level, it is set up again right after """
+
+    def on_door(self, engine, door):
+        """ The player went through a door, the next level is set up right after """
+
+    def on_step(self, engine):
+        """ A simulation step has finished """
+
+
+class GameEngine:
+    """
+    Simulation of the game, needs no window or OpenGL context.
+
+    :param LevelCache level_cache: Levels to play, a new cache if None
+    :param str character: Animation set of the player, see animations.CHARACTERS
+    :param bool tile_grid_collision: Collide with the level's tile grid instead of its sprites
+    :param bool move_parallax: Move the parallax layers with the camera. Not needed
+        when they are drawn through a projection of their own.
+    :param bool animate_scenery: Animate the background and foreground layers, which
+        only matters when the game is drawn
+    """
+
+    def __init__(self, level_cache=None, character=PLAYER_CHARACTER, tile_grid_collision=TILE_GRID_COLLISION,
+                 move_parallax=not GPU_PARALLAX, animate_scenery=True):
+        if level_cache is None:
+            level_cache = LevelCache(LEVEL_CACHE_SIZE, TILE_SCALING, STREAM_LEVELS, GPU_PARALLAX)
+        self.level_cache = level_cache
+        self.character = character
+        self.tile_grid_collision = tile_grid_collision
+        self.move_parallax = move_parallax
+        self.animate_scenery = animate_scenery
+
+        self.observers = []
+
+        # Times the phases of step(), see profiler.Profiler
+        self.profiler = NullProfiler()
+
+        # Controls held in the last step, attack is never held
+        self.inputs = 0
+        self.left_pressed = False
+        self.right_pressed = False
+        self.up_pressed = False
+        self.down_pressed = False
+        # Whether the last step's inputs had INPUT_ATTACK
+        self.attack_pressed = False
+        self.jump_needs_reset = False
+        # Down has to be let go after going through a door
+        self.down_needs_reset = False
+
+        # Steps simulated since the engine was created
+        self.step_count = 0
+
+        self.level = None
+        self.map_name = None
+        self.to_id = 0
+        self.player_sprite = None
+        self.player_list = None
+        self.physics_engine = None
+        self.score = 0
+
+        self.map_width = 0
+        self.map_height = 0
+
+        # The level as set up from its first door, respawning restores it
+        self.respawn_snapshot = None
+        # Snapshots of the last steps of the level, every CHECKPOINT_INTERVAL steps
+        self.checkpoints = deque(maxlen=CHECKPOINT_COUNT)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def notify(self, event, *args):
+        """ Call the method named event of every observer with the engine and args """
+        for observer in self.observers:
+            getattr(observer, event)(self, *args)
+
+    def setup(self, map_name, to_id=0):
+        """ Set up the game here. Call this function to restart the game. """
+
+        # Used to keep track of our scrolling
+        self.view_bottom = 0
+        self.view_bottom_old = 0
+        self.view_left = 0
+        self.view_left_old = 0
+
+        self.scroll_speed_x = 0
+        self.scroll_speed_y = 0
+
+        # Keep track of the score
+        self.score = 0
+
+        # Create the Sprite lists
+        self.player_list = arcade.SpriteList()
+
+        # --- Load in a map from the tiled editor ---
+        # Map name
+        self.map_name = map_name
+
+        # Reuse the level if it is still cached, otherwise read in the tiled map
+        self.level = self.level_cache.get(map_name)
+        self.my_map = self.level.my_map
+
+        # Parallax
+        self.background_parallax_list = self.level.background_parallax_list
+        self.foreground_parallax_list = self.level.foreground_parallax_list
+
+        # Calculate the right edge of the my_map in pixels
+        self.map_width = self.level.map_width
+        self.map_height = self.level.map_height
+
+        # Sprite lists built from the map
+        self.wall_list = self.level.wall_list
+        self.passable_wall_list = self.level.passable_wall_list
+        self.moving_platforms_list = self.level.moving_platforms_list
+        self.moving_platforms = self.level.moving_platforms
+        self.background_list = self.level.background_list
+        self.foreground_list = self.level.foreground_list
+        self.ladder_list = self.level.ladder_list
+        self.coin_list = self.level.coin_list
+        self.door_list = self.level.door_list
+
+        # Set up the player, specifically placing it at these coordinates.
+        self.player_sprite = PlayerCharacter(self.character)
+
+        self.to_id = to_id
+        for door in self.door_list:
+            if int(door.properties.get("id", -1)) == int(self.to_id):
+                self.player_sprite.center_x = door.center_x
+                self.player_sprite.bottom = door.center_y - 32
+                break
+        self.player_list.append(self.player_sprite)
+
+        # Load the chunks around the player before the first update, the
+        # viewport isn't placed yet so take a screen in every direction
+        self.level.stream(self.player_sprite.center_x - SCREEN_WIDTH,
+                          self.player_sprite.center_y - SCREEN_HEIGHT,
+                          SCREEN_WIDTH * 2, SCREEN_HEIGHT * 2, 0, 0)
+
+        # Create the "physics engine"
+        if self.tile_grid_collision:
+            self.physics_engine = TileGridPhysicsEngine(self.player_sprite,
+                                                        self.level.collision_grid,
+                                                        self.moving_platforms_list,
+                                                        gravity_constant=GRAVITY)
+        else:
+            # Moving platforms are moved by self.moving_platforms, so the
+            # engine gets them as walls and leaves them where they are
+            self.physics_engine = PlatformerPhysicsEngine(self.player_sprite,
+                                                          gravity_constant=GRAVITY,
+                                                          ladders=self.ladder_list,
+                                                          walls=[self.wall_list, self.moving_platforms_list],
+                                                          one_way_platforms=self.passable_wall_list)
+
+        # Start loading the levels behind the doors, nearest first, so going
+        # through one doesn't have to wait for the map to load
+        doors = sorted((door for door in self.door_list if door.properties.get("to_name")),
+                       key=lambda door: arcade.get_distance_between_sprites(door, self.player_sprite))
+        self.level_cache.prefetch(door.properties["to_name"] for door in doors
+                                  if door.properties["to_name"] != map_name)
+
+        # Respawning starts the level over from its first door, and
+        # checkpoints are for the level being played
+        self.checkpoints.clear()
+        if self.level.streamer:
+            self.respawn_snapshot = None
+        elif int(to_id) == 0:
+            self.respawn_snapshot = self.snapshot()
+        elif self.respawn_snapshot is not None and self.respawn_snapshot.map_name != map_name:
+            self.respawn_snapshot = None
+
+        self.notify("on_level_loaded")
+
+    def snapshot(self):
+        """ The state of the game, see snapshots.Snapshot """
+        return take_snapshot(self)
+
+    def restore(self, snapshot):
+        """ Put the game back in the state of a snapshot taken in the same level """
+        restore_snapshot(self, snapshot)
+        self.notify("on_level_loaded")
+
+    def respawn(self):
+        """ Start the level over from its first door """
+        if self.respawn_snapshot is not None:
+            self.restore(self.respawn_snapshot)
+        else:
+            self.setup(self.map_name)
+
+    def rewind(self, count=1):
+        """
+        Go back to the checkpoint count checkpoints ago, forgetting the newer ones.
+
+        :Returns: False if there is no checkpoint to go back to
+        """
+        if not self.checkpoints:
+            return False
+        for i in range(min(count, len(self.checkpoints)) - 1):
+            self.checkpoints.pop()
+        self.restore(self.checkpoints[-1])
+        return True
+
+    def process_keychange(self):
+        """
+        Called when we change a key up/down or we move on/off a ladder.
+        """
+        # Process up/down
+        if self.up_pressed and not self.down_pressed:
+            if self.physics_engine.is_on_ladder():
+                self.player_sprite.change_y = PLAYER_MOVEMENT_SPEED
+            elif self.physics_engine.can_jump(y_distance=10) and not self.jump_needs_reset:
+                self.player_sprite.change_y = PLAYER_JUMP_SPEED
+                self.jump_needs_reset = True
+                self.player_sprite.jump_frame = 0
+                self.notify("on_jump")
+        elif self.down_pressed and not self.up_pressed:
+            if self.physics_engine.is_on_ladder():
+                self.player_sprite.change_y = -PLAYER_MOVEMENT_SPEED
+
+        # Holding down drops through one-way platforms
+        self.physics_engine.drop_through = self.down_pressed and not self.up_pressed
+
+        if self.player_sprite.jump_frame < 12:
+            if self.up_pressed:
+                self.player_sprite.change_y = PLAYER_JUMP_SPEED
+
+        self.player_sprite.change_y = max(self.player_sprite.change_y, -PLAYER_FALL_SPEED)
+        self.player_sprite.jump_frame += 1
+
+        # Process up/down when on a ladder and no movement
+        if self.physics_engine.is_on_ladder():
+            if not self.up_pressed and not self.down_pressed:
+                self.player_sprite.change_y = 0
+            elif self.up_pressed and self.down_pressed:
+                self.player_sprite.change_y = 0
+
+        # Process left/right
+        if self.right_pressed and not self.left_pressed:
+            self.player_sprite.change_x = min(self.player_sprite.change_x + 0.7, PLAYER_MOVEMENT_SPEED)
+        elif self.left_pressed and not self.right_pressed:
+            self.player_sprite.change_x = max(self.player_sprite.change_x - 0.7, -PLAYER_MOVEMENT_SPEED)
+        else:
+            self.player_sprite.change_x = 0
+
+    def attack(self):
+        """ Start an attack, or the next one of the combo """
+        # Whether the player is in the air decides the attack, and the
+        # physics engine knows better than the last step
+        self.player_sprite.can_jump = self.physics_engine.can_jump()
+        self.player_sprite.attack()
+
+    def apply_inputs(self, inputs):
+        """ Take the controls for the next step, reacting to the buttons pressed and let go since the last one """
+        # Attack is a press of its own in every step it is set, so it isn't
+        # kept as held
+        self.attack_pressed = bool(inputs & INPUT_ATTACK)
+        inputs &= ~INPUT_ATTACK
+        released = self.inputs & ~inputs
+        self.inputs = inputs
+
+        if released & INPUT_UP:
+            self.jump_needs_reset = False
+        if released & INPUT_DOWN:
+            self.down_needs_reset = False
+
+        self.left_pressed = bool(inputs & INPUT_LEFT)
+        self.right_pressed = bool(inputs & INPUT_RIGHT)
+        self.up_pressed = bool(inputs & INPUT_UP)
+        self.down_pressed = bool(inputs & INPUT_DOWN) and not self.down_needs_reset
+
+        if self.attack_pressed:
+            self.attack()
+        if released:
+            self.process_keychange()
+
+    def step(self, inputs=0):
+        """
+        Advance the game by FIXED_TIMESTEP.
+
+        :param int inputs: INPUT_* flags of the controls held during the step
+        """
+        profiler = self.profiler
+        profiler.start()
+
+        self.apply_inputs(inputs)
+        profiler.lap("input")
+
+        # Move the player with the physics engine
+        hit_sprite_list = self.physics_engine.update()
+        profiler.lap("physics")
+
+        # Update animations
+        if self.physics_engine.can_jump():
+            self.player_sprite.can_jump = True
+        else:
+            self.player_sprite.can_jump = False
+
+        if self.physics_engine.is_on_ladder() and not self.physics_engine.can_jump():
+            self.player_sprite.is_on_ladder = True
+            self.process_keychange()
+        else:
+            self.player_sprite.is_on_ladder = False
+            self.process_keychange()
+        profiler.lap("controls")
+
+        # Only the animated tiles are visited, see tile_animation.TileAnimations
+        self.level.coin_animations.update(FIXED_TIMESTEP)
+        self.player_list.update_animation(FIXED_TIMESTEP)
+
+        if self.animate_scenery:
+            self.level.scenery_animations.update(FIXED_TIMESTEP)
+        profiler.lap("animation")
+
+        if self.move_parallax:
+            for i in range(1,4):
+                self.background_list[i].move(self.scroll_speed_x*(1-self.background_parallax_list[i][0]), self.scroll_speed_y*(1-self.background_parallax_list[i][1]))
+                self.foreground_list[i].move(self.scroll_speed_x*(1-self.foreground_parallax_list[i][0]), self.scroll_speed_y*(1-self.foreground_parallax_list[i][1]))
+            profiler.lap("parallax")
+
+        # Respawn
+        if self.player_sprite.bottom < -128:
+            self.notify("on_death")
+            self.respawn()
+            profiler.lap("respawn")
+
+        # Moving platforms
+        self.moving_platforms.update()
+        profiler.lap("moving platforms")
+
+        # See if we hit any coins, only the ones in the tiles under the player are looked at
+        coin_triggers = self.level.coin_triggers
+        coin_hit_list = coin_triggers.colliding(self.player_sprite)
+        if coin_hit_list:
+            # Score them with the points parsed when the level was loaded
+            for coin in coin_hit_list:
+                points = coin_triggers.values[coin]
+                if points is None:
+                    print("Warning, collected a coin without a Points property.")
+                else:
+                    self.score += points
+
+            # Remove them all, then tell the observers
+            coin_triggers.remove(coin_hit_list)
+            for coin in coin_hit_list:
+                coin.remove_from_sprite_lists()
+            self.level.layer_changed(self.coin_list, removed=coin_hit_list)
+            for coin in coin_hit_list:
+                self.notify("on_coin_collected", coin)
+        profiler.lap("coins")
+
+        # Door
+        if self.down_pressed:
+            for door in self.level.door_triggers.colliding(self.player_sprite):
+                if "to_name" in door.properties:
+                    self.down_pressed = False
+                    self.down_needs_reset = True
+                    self.notify("on_door", door)
+                    self.setup(door.properties["to_name"], door.properties.get("to_id", 0))
+                    break
+        profiler.lap("doors")
+
+        # --- Manage Scrolling ---
+        self.scroll_viewport()
+        profiler.lap("scrolling")
+
+        self.step_count += 1
+        if self.checkpoints.maxlen and self.step_count % CHECKPOINT_INTERVAL == 0 and not self.level.streamer:
+            self.checkpoints.append(self.snapshot())
+        self.notify("on_step")
+
+    def run(self, inputs):
+        """
+        Step once for every entry of inputs.
+
+        :param Iterable[int] inputs: INPUT_* flags for each step
+        """
+        for step_inputs in inputs:
+            self.step(step_inputs)
+
+    def scroll_viewport(self):
+        """ Move the camera after the player, the window shows what it sees """
+
+        self.view_left = self.player_sprite.position[0] - SCREEN_WIDTH // 2
+
+        # Scroll up
+        top_boundary = self.view_bottom + SCREEN_HEIGHT - TOP_VIEWPORT_MARGIN
+        if self.player_sprite.top > top_boundary:
+            self.view_bottom += self.player_sprite.top - top_boundary
+
+        # Scroll down
+        bottom_boundary = self.view_bottom + BOTTOM_VIEWPORT_MARGIN
+        if self.player_sprite.bottom < bottom_boundary:
+            self.view_bottom -= bottom_boundary - self.player_sprite.bottom
+
+        if self.view_left < GRID_PIXEL_SIZE:
+            self.view_left = GRID_PIXEL_SIZE
+        elif self.view_left > self.map_width - SCREEN_WIDTH - GRID_PIXEL_SIZE:
+            self.view_left = self.map_width - SCREEN_WIDTH - GRID_PIXEL_SIZE
+
+        if self.view_bottom < 0:
+            self.view_bottom = 0
+        elif self.view_bottom > self.map_height - SCREEN_HEIGHT:
+            self.view_bottom = self.map_height - SCREEN_HEIGHT
+
+        # Only scroll to integers. Otherwise we end up with pixels that
+        # don"t line up on the screen
+        self.view_bottom = int(self.view_bottom)
+        self.view_left = int(self.view_left)
+
+        # Stream in the level around the new view. When the parallax layers
+        # are moved they are still placed for the previous view, they move
+        # in the next step.
+        self.level.stream(self.view_left, self.view_bottom, SCREEN_WIDTH, SCREEN_HEIGHT,
+                          self.view_left_old, self.view_bottom_old)
+
+        self.scroll_speed_x = self.view_left - self.view_left_old
+        self.scroll_speed_y = self.view_bottom - self.view_bottom_old
+        self.view_left_old = self.view_left
+        self.view_bottom_old = self.view_bottom
+
+
+def main():
+    """ Main method """
+    parser = argparse.ArgumentParser(description="Run the game without a window.")
+    parser.add_argument("map", nargs="?", default="test2.json", help="Map to start in")
+    parser.add_argument("--steps", type=int, default=3600, help="Simulation steps to run")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    engine = GameEngine()
+    engine.setup(args.map)
+
+    # Run right and jump now and then
+    inputs = [INPUT_RIGHT | (INPUT_UP if step % 90 < 20 else 0) for step in range(args.steps)]
+    start_time = time.perf_counter()
+    engine.run(inputs)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"{args.steps} steps in {elapsed:.2f} s, {args.steps / elapsed:.0f} steps/s "
+          f"({args.steps * FIXED_TIMESTEP / elapsed:.1f}x real time)")
+    print(f"map {engine.map_name}, player at ({engine.player_sprite.center_x:.2f}, "
+          f"{engine.player_sprite.center_y:.2f}), score {engine.score}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Drawing between simulation steps.
+
+The engine steps at FIXED_TIMESTEP whatever the frame rate, so a frame
+usually falls somewhere between two steps. An Interpolator keeps where the
+player, the moving platforms and the camera were after the last two steps,
+and for drawing puts them in between, by how far the frame is into the next
+step. They are put back before the next step, so the simulation itself never
+sees the drawn positions.
+"""
+
+
+class Interpolator:
+    """
+    The last two steps of what moves on screen every step, the player, the
+    moving platforms and the camera of an engine.
+
+    :param GameEngine engine: Engine to follow
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.sprites = []
+        # Positions of the sprites and the camera, (x, y) pairs
+        self.previous = []
+        self.current = []
+        self.previous_view = (0, 0)
+        self.current_view = (0, 0)
+        # Positions to put back after drawing
+        self._saved = None
+
+    def _capture(self):
+        return [sprite.position for sprite in self.sprites], (self.engine.view_left, self.engine.view_bottom)
+
+    def reset(self):
+        """ Start over from the engine as it is, a new level doesn't move from the last """
+        engine = self.engine
+        self.sprites = [engine.player_sprite] + list(engine.moving_platforms_list)
+        self.current, self.current_view = self._capture()
+        self.previous, self.previous_view = self.current, self.current_view
+
+    def step(self):
+        """ Take in the state after a step """
+        self.previous, self.previous_view = self.current, self.current_view
+        self.current, self.current_view = self._capture()
+
+    def view(self, alpha):
+        """ Left and bottom of the camera alpha of the way from the previous step to the current one """
+        (previous_left, previous_bottom), (left, bottom) = self.previous_view, self.current_view
+        return (round(previous_left + (left - previous_left) * alpha),
+                round(previous_bottom + (bottom - previous_bottom) * alpha))
+
+    def apply(self, alpha):
+        """ Move the sprites alpha of the way from the previous step to the current one, until restore() """
+        self._saved = [sprite.position for sprite in self.sprites]
+        for sprite, (previous_x, previous_y), (x, y) in zip(self.sprites, self.previous, self.current):
+            sprite.position = (previous_x + (x - previous_x) * alpha, previous_y + (y - previous_y) * alpha)
+
+    def restore(self):
+        """ Put the sprites back where the simulation left them """
+        if self._saved is not None:
+            for sprite, position in zip(self.sprites, self._saved):
+                sprite.position = position
+            self._saved = None
@@ -0,0 +1,781 @@
+"""
+Compiled binary level format.
+
+Tiled JSON and TMX maps are compiled ahead of time (see compile_levels.py)
+into a compact little-endian file:
+
+    header
+    string table            length prefixed UTF-8 strings
+    tile table              one record per tile the map uses
+    layer table             one record per layer, object records inline
+    data section            tile layer GIDs, packed uint16 or uint32 arrays
+
+The runtime loader memory-maps the file and builds the sprite lists straight
+from the GID arrays, without decoding any JSON or XML.
+"""
+import base64
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ElementTree
+import zlib
+from array import array
+from collections import OrderedDict
+
+import arcade
+from arcade.geometry import rotate_point
+
+from atlas import get_atlas
+
+MAGIC = b"PLVL"
+VERSION = 2
+
+COMPILED_DIRECTORY = "resources/levels"
+SOURCE_DIRECTORIES = ["resources/tilemaps", "resources/tmx_maps"]
+
+# magic, version, width, height, tile width, tile height, background color,
+# string count, tile count, layer count, data section offset
+HEADER = struct.Struct("<4sHxxIIHH4BIIII")
+STRING_LENGTH = struct.Struct("<H")
+# gid, image, x, y, width, height, hit box points, properties, animation frames
+TILE = struct.Struct("<IIHHHHHHH2x")
+HIT_BOX_POINT = struct.Struct("<ff")
+# gid, duration in milliseconds
+FRAME = struct.Struct("<II")
+# name, type, value
+PROPERTY = struct.Struct("<IB3x8s")
+# kind, visible, GID size in bytes, name, opacity, parallax x, parallax y, then
+# for tile layers the data offset and GID count, for object layers the object count,
+# then the size of the largest tile in the layer
+LAYER = struct.Struct("<BBBxIfffIIHH")
+# gid, x, y, width, height, rotation, name, type, properties
+OBJECT = struct.Struct("<IfffffIIH2x")
+
+TILE_LAYER = 0
+OBJECT_LAYER = 1
+
+PROPERTY_STRING = 0
+PROPERTY_INT = 1
+PROPERTY_FLOAT = 2
+PROPERTY_BOOL = 3
+
+_FLIPPED_HORIZONTALLY_FLAG = 0x80000000
+_FLIPPED_VERTICALLY_FLAG = 0x40000000
+_FLIPPED_DIAGONALLY_FLAG = 0x20000000
+_GID_MASK = 0x1FFFFFFF
+
+
+def compiled_level_path(map_name):
+    """ Where the compiled version of a map is written """
+    return os.path.join(COMPILED_DIRECTORY, f"{map_name}.lvl")
+
+
+def source_level_path(map_name):
+    """ Tiled file a map is compiled from, None if there is none """
+    for directory in SOURCE_DIRECTORIES:
+        path = os.path.join(directory, map_name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def is_compiled(map_name):
+    """ True if the map has a compiled version that is not older than its source """
+    compiled = compiled_level_path(map_name)
+    if not os.path.exists(compiled):
+        return False
+    source = source_level_path(map_name)
+    return source is None or os.path.getmtime(compiled) >= os.path.getmtime(source)
+
+
+# --- Reading Tiled files ---
+# Both readers return the same plain structure:
+#   {"width", "height", "tile_width", "tile_height", "background_color",
+#    "tilesets": [(firstgid, tileset)], "layers": [layer]}
+
+
+def _color(value):
+    """ Tiled #AARRGGBB or #RRGGBB to an RGBA tuple """
+    if not value:
+        return None
+    value = value.lstrip("#")
+    if len(value) == 8:
+        return int(value[2:4], 16), int(value[4:6], 16), int(value[6:8], 16), int(value[0:2], 16)
+    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16), 255
+
+
+def _property_value(property_type, value):
+    if property_type == "int":
+        return int(value)
+    if property_type == "float":
+        return float(value)
+    if property_type == "bool":
+        return value in (True, "true")
+    return str(value)
+
+
+def _json_properties(raw):
+    if isinstance(raw, dict):
+        return dict(raw)
+    return {prop["name"]: _property_value(prop.get("type", "string"), prop["value"]) for prop in raw or []}
+
+
+def _json_hit_box_objects(raw_tile):
+    objects = []
+    for obj in raw_tile.get("objectgroup", {}).get("objects", []):
+        points = obj.get("polygon") or obj.get("polyline")
+        objects.append({
+            "x": obj["x"],
+            "y": obj["y"],
+            "width": obj.get("width", 0),
+            "height": obj.get("height", 0),
+            "ellipse": obj.get("ellipse", False),
+            "points": [(point["x"], point["y"]) for point in points] if points else None,
+        })
+    return objects
+
+
+def _json_tileset(raw, directory):
+    tileset = {
+        "image": os.path.normpath(os.path.join(directory, raw["image"])) if raw.get("image") else None,
+        "columns": raw.get("columns", 0),
+        "tile_width": raw["tilewidth"],
+        "tile_height": raw["tileheight"],
+        "margin": raw.get("margin", 0),
+        "spacing": raw.get("spacing", 0),
+        "tiles": {},
+    }
+    for raw_tile in raw.get("tiles", []):
+        tileset["tiles"][raw_tile["id"]] = {
+            "image": os.path.normpath(os.path.join(directory, raw_tile["image"])) if raw_tile.get("image") else None,
+            "width": raw_tile.get("imagewidth", 0),
+            "height": raw_tile.get("imageheight", 0),
+            "properties": _json_properties(raw_tile.get("properties")),
+            "objects": _json_hit_box_objects(raw_tile),
+            "animation": [(frame["tileid"], frame["duration"]) for frame in raw_tile.get("animation", [])],
+        }
+    return tileset
+
+
+def _json_layers(raw_layers):
+    layers = []
+    for raw in raw_layers:
+        if raw["type"] == "group":
+            layers.extend(_json_layers(raw["layers"]))
+            continue
+        layer = {
+            "name": raw["name"],
+            "visible": raw.get("visible", True),
+            "opacity": raw.get("opacity", 1),
+            "parallax": (raw.get("parallaxx", 1), raw.get("parallaxy", 1)),
+        }
+        if raw["type"] == "tilelayer":
+            layer["kind"] = TILE_LAYER
+            layer["data"] = raw["data"]
+        elif raw["type"] == "objectgroup":
+            layer["kind"] = OBJECT_LAYER
+            layer["objects"] = [{
+                "gid": obj["gid"],
+                "x": obj["x"],
+                "y": obj["y"],
+                "width": obj.get("width", 0),
+                "height": obj.get("height", 0),
+                "rotation": obj.get("rotation", 0),
+                "name": obj.get("name", ""),
+                "type": obj.get("type", ""),
+                "properties": _json_properties(obj.get("properties")),
+            } for obj in raw["objects"] if "gid" in obj]
+        else:
+            continue
+        layers.append(layer)
+    return layers
+
+
+def read_json_map(file_name):
+    """ Read a Tiled JSON map """
+    directory = os.path.dirname(file_name)
+    with open(file_name) as f:
+        raw = json.load(f)
+
+    tilesets = []
+    for raw_tileset in raw["tilesets"]:
+        tileset_directory = directory
+        if "source" in raw_tileset:
+            tileset_file = os.path.join(directory, raw_tileset["source"])
+            tileset_directory = os.path.dirname(tileset_file)
+            with open(tileset_file) as f:
+                tileset_data = json.load(f)
+        else:
+            tileset_data = raw_tileset
+        tilesets.append((raw_tileset["firstgid"], _json_tileset(tileset_data, tileset_directory)))
+
+    return {
+        "width": raw["width"],
+        "height": raw["height"],
+        "tile_width": raw["tilewidth"],
+        "tile_height": raw["tileheight"],
+        "background_color": _color(raw.get("backgroundcolor")),
+        "tilesets": tilesets,
+        "layers": _json_layers(raw["layers"]),
+    }
+
+
+def _tmx_properties(element):
+    properties = {}
+    for prop in element.findall("./properties/property"):
+        value = prop.get("value")
+        if value is None:
+            value = prop.text or ""
+        properties[prop.get("name")] = _property_value(prop.get("type", "string"), value)
+    return properties
+
+
+def _tmx_tileset(element, directory):
+    image = element.find("image")
+    tileset = {
+        "image": os.path.normpath(os.path.join(directory, image.get("source"))) if image is not None else None,
+        "columns": int(element.get("columns", 0)),
+        "tile_width": int(element.get("tilewidth")),
+        "tile_height": int(element.get("tileheight")),
+        "margin": int(element.get("margin", 0)),
+        "spacing": int(element.get("spacing", 0)),
+        "tiles": {},
+    }
+    for tile in element.findall("tile"):
+        tile_image = tile.find("image")
+        objects = []
+        for obj in tile.findall("./objectgroup/object"):
+            points = obj.find("polygon")
+            if points is None:
+                points = obj.find("polyline")
+            objects.append({
+                "x": float(obj.get("x", 0)),
+                "y": float(obj.get("y", 0)),
+                "width": float(obj.get("width", 0)),
+                "height": float(obj.get("height", 0)),
+                "ellipse": obj.find("ellipse") is not None,
+                "points": [tuple(float(v) for v in point.split(",")) for point in points.get("points").split()]
+                if points is not None else None,
+            })
+        tileset["tiles"][int(tile.get("id"))] = {
+            "image": os.path.normpath(os.path.join(directory, tile_image.get("source")))
+            if tile_image is not None else None,
+            "width": int(tile_image.get("width", 0)) if tile_image is not None else 0,
+            "height": int(tile_image.get("height", 0)) if tile_image is not None else 0,
+            "properties": _tmx_properties(tile),
+            "objects": objects,
+            "animation": [(int(frame.get("tileid")), int(frame.get("duration")))
+                          for frame in tile.findall("./animation/frame")],
+        }
+    return tileset
+
+
+def _tmx_tile_data(data):
+    encoding = data.get("encoding")
+    if encoding == "csv":
+        return [int(gid) for gid in data.text.replace("\n", "").split(",") if gid.strip()]
+    if encoding == "base64":
+        raw = base64.b64decode(data.text.strip())
+        compression = data.get("compression")
+        if compression in ("zlib", "gzip"):
+            raw = zlib.decompress(raw, 47)
+        elif compression:
+            raise ValueError(f"Unsupported TMX compression '{compression}'.")
+        gids = array("I", raw)
+        if sys.byteorder == "big":
+            gids.byteswap()
+        return list(gids)
+    return [int(tile.get("gid", 0)) for tile in data.findall("tile")]
+
+
+def _tmx_layers(element):
+    layers = []
+    for child in element:
+        if child.tag == "group":
+            layers.extend(_tmx_layers(child))
+            continue
+        if child.tag not in ("layer", "objectgroup"):
+            continue
+        layer = {
+            "name": child.get("name"),
+            "visible": child.get("visible", "1") == "1",
+            "opacity": float(child.get("opacity", 1)),
+            "parallax": (float(child.get("parallaxx", 1)), float(child.get("parallaxy", 1))),
+        }
+        if child.tag == "layer":
+            layer["kind"] = TILE_LAYER
+            layer["data"] = _tmx_tile_data(child.find("data"))
+        else:
+            layer["kind"] = OBJECT_LAYER
+            layer["objects"] = [{
+                "gid": int(obj.get("gid")),
+                "x": float(obj.get("x", 0)),
+                "y": float(obj.get("y", 0)),
+                "width": float(obj.get("width", 0)),
+                "height": float(obj.get("height", 0)),
+                "rotation": float(obj.get("rotation", 0)),
+                "name": obj.get("name", ""),
+                "type": obj.get("type", ""),
+                "properties": _tmx_properties(obj),
+            } for obj in child.findall("object") if obj.get("gid")]
+        layers.append(layer)
+    return layers
+
+
+def read_tmx_map(file_name):
+    """ Read a Tiled TMX map """
+    directory = os.path.dirname(file_name)
+    root = ElementTree.parse(file_name).getroot()
+
+    tilesets = []
+    for element in root.findall("tileset"):
+        tileset_directory = directory
+        if element.get("source"):
+            tileset_file = os.path.join(directory, element.get("source"))
+            tileset_directory = os.path.dirname(tileset_file)
+            tileset_element = ElementTree.parse(tileset_file).getroot()
+        else:
+            tileset_element = element
+        tilesets.append((int(element.get("firstgid")), _tmx_tileset(tileset_element, tileset_directory)))
+
+    return {
+        "width": int(root.get("width")),
+        "height": int(root.get("height")),
+        "tile_width": int(root.get("tilewidth")),
+        "tile_height": int(root.get("tileheight")),
+        "background_color": _color(root.get("backgroundcolor")),
+        "tilesets": tilesets,
+        "layers": _tmx_layers(root),
+    }
+
+
+def read_map(file_name):
+    """ Read a Tiled map in either format """
+    if file_name.endswith(".tmx"):
+        return read_tmx_map(file_name)
+    return read_json_map(file_name)
+
+
+# --- Compiling ---
+
+
+def _hit_box(objects, width, height):
+    """ Tiled collision shapes of a tile to hit box points around the tile's center """
+    if not objects:
+        return []
+    obj = objects[0]
+    if obj["points"]:
+        points = [(x + obj["x"] - width / 2, -(y + obj["y"] - height / 2)) for x, y in obj["points"]]
+        if points[0] == points[-1]:
+            points.pop()
+        return points
+    if obj["ellipse"]:
+        hw = obj["width"] / 2
+        hh = obj["height"] / 2
+        cx = obj["x"] + hw - width / 2
+        cy = obj["y"] + hh - height / 2
+        angles = [step / 8 * 2 * math.pi for step in range(8)]
+        return [(hw * math.cos(angle) + cx, -(hh * math.sin(angle) + cy)) for angle in angles]
+    sx = obj["x"] - width / 2
+    sy = -(obj["y"] - height / 2)
+    ex = obj["x"] + obj["width"] - width / 2
+    ey = -(obj["y"] + obj["height"] - height / 2)
+    return [(sx, sy), (ex, sy), (ex, ey), (sx, ey)]
+
+
+def _tile_info(tilesets, gid):
+    """ Image, rectangle, hit box, properties and animation of the tile for a gid """
+    for firstgid, tileset in sorted(tilesets, key=lambda item: item[0], reverse=True):
+        if gid < firstgid:
+            continue
+        tile_id = gid - firstgid
+        tile = tileset["tiles"].get(tile_id, {})
+        if tileset["image"]:
+            width = tileset["tile_width"]
+            height = tileset["tile_height"]
+            image = tileset["image"]
+            x = tileset["margin"] + tile_id % tileset["columns"] * (width + tileset["spacing"])
+            y = tileset["margin"] + tile_id // tileset["columns"] * (height + tileset["spacing"])
+            rect = (x, y, width, height)
+        elif tile:
+            # Whole image, an empty rectangle
+            image = tile["image"]
+            width = tile["width"]
+            height = tile["height"]
+            rect = (0, 0, 0, 0)
+        else:
+            return None
+        return {
+            "image": image,
+            "rect": rect,
+            "size": (width, height),
+            "hit_box": _hit_box(tile.get("objects"), width, height),
+            "properties": tile.get("properties", {}),
+            "animation": [(firstgid + frame_id, duration) for frame_id, duration in tile.get("animation", [])],
+        }
+    return None
+
+
+class _Writer:
+    """ Collects the sections of a compiled level """
+
+    def __init__(self):
+        self.strings = {}
+        self.tiles = bytearray()
+        self.layers = bytearray()
+        self.data = bytearray()
+
+    def string(self, value):
+        if value not in self.strings:
+            self.strings[value] = len(self.strings)
+        return self.strings[value]
+
+    def properties(self, properties):
+        records = bytearray()
+        for key, value in properties.items():
+            if isinstance(value, bool):
+                packed = PROPERTY.pack(self.string(key), PROPERTY_BOOL, struct.pack("<q", value))
+            elif isinstance(value, int):
+                packed = PROPERTY.pack(self.string(key), PROPERTY_INT, struct.pack("<q", value))
+            elif isinstance(value, float):
+                packed = PROPERTY.pack(self.string(key), PROPERTY_FLOAT, struct.pack("<d", value))
+            else:
+                packed = PROPERTY.pack(self.string(key), PROPERTY_STRING, struct.pack("<q", self.string(str(value))))
+            records += packed
+        return records
+
+
+def compile_map(file_name):
+    """ Compile a Tiled JSON or TMX map into the binary level format """
+    tiled_map = read_map(file_name)
+    writer = _Writer()
+
+    # Every gid used, without flip flags, plus the frames of animated tiles
+    gids = set()
+    for layer in tiled_map["layers"]:
+        if layer["kind"] == TILE_LAYER:
+            gids.update(gid & _GID_MASK for gid in layer["data"])
+        else:
+            gids.update(obj["gid"] & _GID_MASK for obj in layer["objects"])
+    gids.discard(0)
+
+    tiles = {}
+    pending = sorted(gids)
+    while pending:
+        gid = pending.pop()
+        if gid in tiles:
+            continue
+        info = _tile_info(tiled_map["tilesets"], gid)
+        if info is None:
+            raise ValueError(f"Couldn't find tile for gid {gid} in '{file_name}'.")
+        tiles[gid] = info
+        pending.extend(frame_gid for frame_gid, _ in info["animation"])
+
+    for gid, info in sorted(tiles.items()):
+        image = os.path.relpath(info["image"]).replace(os.sep, "/")
+        writer.tiles += TILE.pack(gid, writer.string(image), *info["rect"],
+                                  len(info["hit_box"]), len(info["properties"]), len(info["animation"]))
+        for point in info["hit_box"]:
+            writer.tiles += HIT_BOX_POINT.pack(*point)
+        writer.tiles += writer.properties(info["properties"])
+        for frame in info["animation"]:
+            writer.tiles += FRAME.pack(*frame)
+
+    for layer in tiled_map["layers"]:
+        name = writer.string(layer["name"])
+        parallax_x, parallax_y = layer["parallax"]
+        if layer["kind"] == TILE_LAYER:
+            # Layers without flipped tiles or large GIDs fit in 16 bits
+            typecode = "H" if max(layer["data"], default=0) <= 0xFFFF else "I"
+            gid_array = array(typecode, layer["data"])
+            if sys.byteorder == "big":
+                gid_array.byteswap()
+            writer.data += bytes(-len(writer.data) % gid_array.itemsize)
+            offset = len(writer.data)
+            writer.data += gid_array.tobytes()
+            # Streaming needs to know how far a tile can reach out of its cell
+            sizes = [tiles[gid & _GID_MASK]["size"][::-1 if gid & _FLIPPED_DIAGONALLY_FLAG else 1]
+                     for gid in set(layer["data"]) if gid & _GID_MASK]
+            max_width = max((width for width, height in sizes), default=0)
+            max_height = max((height for width, height in sizes), default=0)
+            writer.layers += LAYER.pack(TILE_LAYER, layer["visible"], gid_array.itemsize, name, layer["opacity"],
+                                        parallax_x, parallax_y, offset, len(layer["data"]), max_width, max_height)
+        else:
+            writer.layers += LAYER.pack(OBJECT_LAYER, layer["visible"], 0, name, layer["opacity"],
+                                        parallax_x, parallax_y, len(layer["objects"]), 0, 0, 0)
+            for obj in layer["objects"]:
+                writer.layers += OBJECT.pack(obj["gid"], obj["x"], obj["y"], obj["width"], obj["height"],
+                                             obj["rotation"], writer.string(obj["name"] or ""),
+                                             writer.string(obj["type"] or ""), len(obj["properties"]))
+                writer.layers += writer.properties(obj["properties"])
+
+    string_table = bytearray()
+    for value in writer.strings:
+        encoded = value.encode("utf-8")
+        string_table += STRING_LENGTH.pack(len(encoded)) + encoded
+
+    # The GID arrays start on a 4 byte boundary so they can be cast in place
+    data_offset = HEADER.size + len(string_table) + len(writer.tiles) + len(writer.layers)
+    padding = -data_offset % 4
+    data_offset += padding
+
+    header = HEADER.pack(MAGIC, VERSION, tiled_map["width"], tiled_map["height"],
+                         tiled_map["tile_width"], tiled_map["tile_height"],
+                         *(tiled_map["background_color"] or (0, 0, 0, 0)),
+                         len(writer.strings), len(tiles), len(tiled_map["layers"]), data_offset)
+    return b"".join([header, string_table, writer.tiles, writer.layers, bytes(padding), writer.data])
+
+
+def write_compiled_map(file_name, output_file=None):
+    """ Compile a map and write it next to the other compiled levels """
+    if output_file is None:
+        output_file = compiled_level_path(os.path.basename(file_name))
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    data = compile_map(file_name)
+    with open(output_file, "wb") as f:
+        f.write(data)
+    return output_file
+
+
+# --- Loading ---
+
+
+class _Reader:
+    """ Walks the records of a memory-mapped level """
+
+    def __init__(self, view):
+        self.view = view
+        self.offset = 0
+
+    def read(self, record):
+        values = record.unpack_from(self.view, self.offset)
+        self.offset += record.size
+        return values
+
+    def string(self):
+        length, = self.read(STRING_LENGTH)
+        value = str(self.view[self.offset:self.offset + length], "utf-8")
+        self.offset += length
+        return value
+
+    def properties(self, count, strings):
+        properties = {}
+        for i in range(count):
+            key, kind, value = self.read(PROPERTY)
+            if kind == PROPERTY_FLOAT:
+                properties[strings[key]] = struct.unpack("<d", value)[0]
+            else:
+                number = struct.unpack("<q", value)[0]
+                if kind == PROPERTY_STRING:
+                    properties[strings[key]] = strings[number]
+                elif kind == PROPERTY_BOOL:
+                    properties[strings[key]] = bool(number)
+                else:
+                    properties[strings[key]] = number
+        return properties
+
+
+class StreamedLayer:
+    """
+    A tile layer of a CompiledMap whose sprites are not created up front.
+
+    gids is a view into the memory-mapped file, valid until the map is closed.
+    """
+
+    def __init__(self, name, gids, opacity, max_tile_width, max_tile_height):
+        self.name = name
+        self.gids = gids
+        self.opacity = opacity
+        self.max_tile_width = max_tile_width
+        self.max_tile_height = max_tile_height
+
+
+class CompiledMap:
+    """
+    A map loaded from the compiled binary format.
+
+    Has the attributes of arcade.tilemap.TileMap the game uses: width, height,
+    tile_width, tile_height, background_color and sprite_lists, plus the
+    parallax factor of each layer in parallax_factors.
+
+    Tile layers named in stream_layers get an empty sprite list and are kept
+    in streamed_layers instead, for a ChunkStreamer to fill in. The file then
+    stays mapped until close() is called.
+
+    :param str file_name: Compiled level file
+    :param float scaling: Global scaling to apply to all Sprites
+    :param Dict[str, Dict[str, Any]] layer_options: Extra parameters for each layer
+    :param Iterable[str] stream_layers: Tile layers to leave to streaming
+    :param bool lazy: Leave creating the OpenGL resources of the sprite lists to
+        SpriteList.initialize(), so the map can be read in a thread without a context
+    """
+
+    def __init__(self, file_name, scaling=1.0, layer_options=None, stream_layers=(), lazy=False):
+        self.file_name = file_name
+        self.scaling = scaling
+        self.lazy = lazy
+        self.sprite_lists = OrderedDict()
+        self.parallax_factors = {}
+        self.streamed_layers = OrderedDict()
+        self._layer_options = layer_options or {}
+        self._stream_layers = set(stream_layers)
+
+        with open(file_name, "rb") as f:
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mapped)
+        try:
+            self._load(self._view)
+        finally:
+            if not self.streamed_layers:
+                self.close()
+
+    def close(self):
+        """ Unmap the file. The streamed layers can't be read after this. """
+        for layer in self.streamed_layers.values():
+            if isinstance(layer.gids, memoryview):
+                layer.gids.release()
+        if self._view is not None:
+            self._view.release()
+            self._mapped.close()
+            self._view = self._mapped = None
+
+    def _load(self, view):
+        reader = _Reader(view)
+        (magic, version, self.width, self.height, self.tile_width, self.tile_height, r, g, b, a,
+         string_count, tile_count, layer_count, data_offset) = reader.read(HEADER)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"'{self.file_name}' is not a version {VERSION} compiled level.")
+        self.background_color = (r, g, b, a) if a else None
+
+        strings = [reader.string() for i in range(string_count)]
+
+        self._tiles = {}
+        for i in range(tile_count):
+            gid, image, x, y, width, height, point_count, property_count, frame_count = reader.read(TILE)
+            hit_box = [reader.read(HIT_BOX_POINT) for j in range(point_count)]
+            properties = reader.properties(property_count, strings)
+            frames = [reader.read(FRAME) for j in range(frame_count)]
+            self._tiles[gid] = (strings[image], (x, y, width, height), hit_box, properties, frames)
+
+        for i in range(layer_count):
+            (kind, visible, gid_size, name, opacity, parallax_x, parallax_y, a, b,
+             max_tile_width, max_tile_height) = reader.read(LAYER)
+            name = strings[name]
+            self.parallax_factors[name] = (parallax_x, parallax_y)
+            options = self._layer_options.get(name, {})
+            sprite_list = arcade.SpriteList(use_spatial_hash=options.get("use_spatial_hash"), lazy=self.lazy)
+            sprite_list.visible = bool(visible)
+
+            if kind == TILE_LAYER:
+                typecode = "H" if gid_size == 2 else "I"
+                start = data_offset + a
+                gids = view[start:start + b * gid_size].cast(typecode)
+                if sys.byteorder == "big":
+                    gids = array(typecode, gids)
+                    gids.byteswap()
+                if name in self._stream_layers:
+                    self.streamed_layers[name] = StreamedLayer(name, gids, opacity,
+                                                               max_tile_width * self.scaling,
+                                                               max_tile_height * self.scaling)
+                else:
+                    self._add_tile_layer(sprite_list, gids, opacity)
+                    if isinstance(gids, memoryview):
+                        gids.release()
+            else:
+                for j in range(a):
+                    gid, x, y, width, height, rotation, obj_name, obj_type, property_count = reader.read(OBJECT)
+                    properties = reader.properties(property_count, strings)
+                    sprite = self._create_object_sprite(gid, x, y, width, height, rotation, properties)
+                    if strings[obj_type]:
+                        sprite.properties["type"] = strings[obj_type]
+                    if strings[obj_name]:
+                        sprite.properties["name"] = strings[obj_name]
+                    if opacity:
+                        sprite.alpha = int(opacity * 255)
+                    sprite_list.append(sprite)
+
+            self.sprite_lists[name] = sprite_list
+
+    def _create_sprite(self, gid):
+        """ Create the sprite for a gid, flip flags included """
+        image, (x, y, width, height), hit_box, properties, frames = self._tiles[gid & _GID_MASK]
+        flipped_horizontally = bool(gid & _FLIPPED_HORIZONTALLY_FLAG)
+        flipped_vertically = bool(gid & _FLIPPED_VERTICALLY_FLAG)
+        flipped_diagonally = bool(gid & _FLIPPED_DIAGONALLY_FLAG)
+        atlas = get_atlas()
+
+        if frames:
+            sprite = arcade.AnimatedTimeBasedSprite(scale=self.scaling)
+            for frame_gid, duration in frames:
+                frame_image, frame_rect = self._tiles[frame_gid][:2]
+                texture = atlas.load_texture(frame_image, *frame_rect)
+                sprite.frames.append(arcade.AnimationKeyframe(frame_gid, duration, texture))
+            sprite.texture = sprite.frames[0].texture
+        else:
+            # Put the texture in arcade's cache from the atlas, then let the
+            # sprite load it from there
+            atlas.load_texture(image, x, y, width, height,
+                               flipped_horizontally=flipped_horizontally,
+                               flipped_vertically=flipped_vertically,
+                               flipped_diagonally=flipped_diagonally)
+            sprite = arcade.Sprite(image, self.scaling, x, y, width, height,
+                                   flipped_horizontally=flipped_horizontally,
+                                   flipped_vertically=flipped_vertically,
+                                   flipped_diagonally=flipped_diagonally)
+
+        if properties:
+            sprite.properties.update(properties)
+
+        if hit_box:
+            points = [[px, py] for px, py in hit_box]
+            if flipped_vertically:
+                for point in points:
+                    point[1] *= -1
+            if flipped_horizontally:
+                for point in points:
+                    point[0] *= -1
+            if flipped_diagonally:
+                for point in points:
+                    point[0], point[1] = point[1], point[0]
+            sprite.hit_box = points
+
+        return sprite
+
+    def create_tile_sprite(self, gid, index, opacity=1.0):
+        """ Create the sprite of a tile layer cell, index counting row by row from the top left """
+        row, column = divmod(index, self.width)
+        sprite = self._create_sprite(gid)
+        sprite.center_x = column * self.tile_width * self.scaling + sprite.width / 2
+        sprite.center_y = (self.height - row - 1) * self.tile_height * self.scaling + sprite.height / 2
+        if opacity:
+            sprite.alpha = int(opacity * 255)
+        return sprite
+
+    def _add_tile_layer(self, sprite_list, gids, opacity):
+        for index, gid in enumerate(gids):
+            if gid != 0:
+                sprite_list.append(self.create_tile_sprite(gid, index, opacity))
+
+    def _create_object_sprite(self, gid, x, y, width, height, rotation, properties):
+        sprite = self._create_sprite(gid)
+
+        x = x * self.scaling
+        y = (self.height * self.tile_height - y) * self.scaling
+        sprite.width = width = width * self.scaling
+        sprite.height = height = height * self.scaling
+
+        angle_degrees = -rotation
+        rotated_center_x, rotated_center_y = rotate_point(width / 2, height / 2, 0, 0, angle_degrees)
+        sprite.position = (x + rotated_center_x, y + rotated_center_y)
+        sprite.angle = angle_degrees
+
+        # Moving platforms
+        for name in ("change_x", "change_y", "boundary_left", "boundary_right", "boundary_top", "boundary_bottom"):
+            if name in properties:
+                setattr(sprite, name, float(properties[name]))
+
+        sprite.properties.update(properties)
+        return sprite
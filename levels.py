@@ -0,0 +1,481 @@
+"""
+Level loading and caching.
+
+A Level holds a parsed Tiled map together with the sprite lists the game
+builds from it. Levels are kept in a LevelCache so that respawning or walking
+through a door into a level we have already visited only resets the mutable
+state instead of parsing the map and rebuilding every sprite again.
+
+Simulations that play the same level side by side use a LevelInstance per
+player, which shares the tiles and collision grid of one Level.
+"""
+import copy
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import arcade
+from arcade.tilemap.tilemap import _get_image_info_from_tileset, _get_image_source
+
+from atlas import get_atlas
+from level_format import CompiledMap, compiled_level_path, is_compiled, source_level_path, write_compiled_map
+from moving_platforms import MovingPlatforms
+from streaming import ChunkStreamer
+from tile_animation import TileAnimations
+from tile_physics import FULL, ONE_WAY, CollisionGrid
+from triggers import TriggerGrid
+
+# Options for the layers of the map, keyed by layer name
+LAYER_OPTIONS = {
+    "Platforms": {
+        "use_spatial_hash": True,
+    },
+    "Passable Platforms": {
+        "use_spatial_hash": True,
+    },
+    "Moving Platforms": {
+        "use_spatial_hash": False,
+    },
+    "Ladders": {
+        "use_spatial_hash": True,
+    },
+    # Coins are found through the level's TriggerGrid
+    "Coins": {
+        "use_spatial_hash": False,
+    },
+}
+
+# Default collision shape of the tiles of each layer in the collision grid
+COLLISION_SHAPES = {
+    "Platforms": FULL,
+    "Passable Platforms": ONE_WAY,
+}
+
+# Layers whose animated tiles are advanced when the scenery is animated
+SCENERY_LAYERS = [f"Background{i}" for i in range(1, 4)] + [f"Foreground{i}" for i in range(1, 4)]
+
+# Tile layers whose sprites are streamed in chunks when streaming is on
+STREAMED_LAYERS = ["Platforms", "Passable Platforms", "Ladders", "Coins"] + \
+                  [f"Background{i}" for i in range(4)] + [f"Foreground{i}" for i in range(4)]
+
+
+class AtlasTileMap(arcade.tilemap.TileMap):
+    """
+    TileMap that reads tile images from the pre-built atlas.
+
+    The textures of a tile are put in arcade's texture cache from the atlas
+    pages just before arcade creates the sprite, so arcade never opens the
+    tileset image files for tiles that have been packed.
+    """
+
+    def __init__(self, map_file, scaling=1.0, layer_options=None):
+        super().__init__(map_file, scaling, layer_options)
+
+        # Same as CompiledMap.parallax_factors
+        self.parallax_factors = {layer.name: (layer.parallax_factor.x, layer.parallax_factor.y)
+                                 for layer in self.tiled_map.layers}
+
+    def _create_sprite_from_tile(self, tile, scaling=1.0, hit_box_algorithm="Simple",
+                                 hit_box_detail=4.5, custom_class=None, custom_class_args={}):
+        atlas = get_atlas()
+        map_directory = os.path.dirname(self.tiled_map.map_file)
+        image_file = _get_image_source(tile, map_directory)
+
+        if image_file and tile.animation:
+            atlas.load_texture(image_file)
+            for frame in tile.animation:
+                frame_tile = self._get_tile_by_id(tile.tileset, frame.tile_id)
+                frame_file = frame_tile and _get_image_source(frame_tile, map_directory)
+                if frame_tile and frame_tile.image and frame_file:
+                    atlas.load_texture(frame_file)
+                elif frame_file:
+                    atlas.load_texture(frame_file, *_get_image_info_from_tileset(frame_tile))
+        elif image_file:
+            atlas.load_texture(image_file, *_get_image_info_from_tileset(tile),
+                               flipped_horizontally=tile.flipped_horizontally,
+                               flipped_vertically=tile.flipped_vertically,
+                               flipped_diagonally=tile.flipped_diagonally,
+                               hit_box_algorithm=hit_box_algorithm,
+                               hit_box_detail=hit_box_detail)
+
+        return super()._create_sprite_from_tile(tile, scaling, hit_box_algorithm, hit_box_detail,
+                                                custom_class, custom_class_args)
+
+
+class Level:
+    """
+    A loaded map and the sprite lists built from it.
+
+    A pristine copy of the state the game mutates while playing (collected
+    coins, moving platform positions and the parallax layer offsets) is kept so the level can be put back in place by reset().
+
+    With streaming on, the tile layers start out empty and are filled around
+    the camera by a ChunkStreamer, see stream(). parallax_by_projection tells
+    it that the parallax layers are drawn with their own projection rather
+    than moved.
+
+    A lazy level creates no OpenGL resources, so it can be loaded in another
+    thread. Its sprite lists are initialized on the main thread later, see
+    sprite_lists(), or when they are first drawn.
+    """
+
+    def __init__(self, map_name, scaling=1.0, streaming=False, parallax_by_projection=False, lazy=False):
+        self.map_name = map_name
+        self.streamer = None
+
+        # Read in the compiled level if it is up to date, otherwise the tiled
+        # map. Streaming needs the compiled level, so compile it now if needed.
+        # So do lazy levels, arcade's TileMap can't make lazy sprite lists.
+        if (streaming or lazy) and not is_compiled(map_name):
+            write_compiled_map(source_level_path(map_name), compiled_level_path(map_name))
+        if is_compiled(map_name):
+            stream_layers = STREAMED_LAYERS if streaming else ()
+            self.my_map = CompiledMap(compiled_level_path(map_name), scaling, LAYER_OPTIONS, stream_layers, lazy)
+        else:
+            self.my_map = AtlasTileMap(f"./resources/tilemaps/{map_name}", scaling, LAYER_OPTIONS)
+
+        # Parallax
+        self.background_parallax_list = [(1,1) for i in range(4)]
+        self.foreground_parallax_list = [(1,1) for i in range(4)]
+        for name, parallax_factor in self.my_map.parallax_factors.items():
+            if not name[-1].isdigit():
+                continue
+            if "Background" in name:
+                self.background_parallax_list[int(name[-1])] = parallax_factor
+            if "Foreground" in name:
+                self.foreground_parallax_list[int(name[-1])] = parallax_factor
+
+        # Calculate the right edge of the my_map in pixels
+        self.map_width = self.my_map.width * self.my_map.tile_width * scaling
+        self.map_height = self.my_map.height * self.my_map.tile_height * scaling
+
+        self.background_color = self.my_map.background_color
+
+        # -- Collision grid of the static tile layers, for TileGridPhysicsEngine
+        self.collision_grid = CollisionGrid(self.my_map.width, self.my_map.height,
+                                            self.my_map.tile_width * scaling, self.my_map.tile_height * scaling)
+        for name, shape in COLLISION_SHAPES.items():
+            self.collision_grid.add_sprites(self.my_map.sprite_lists.get(name, ()), shape)
+        self.collision_grid.add_ladders(self.my_map.sprite_lists.get("Ladders", ()))
+
+        # -- Platforms
+        self.wall_list = self.my_map.sprite_lists.get("Platforms", arcade.SpriteList(lazy=lazy))
+
+        # -- Passable Platforms, one-way platforms kept apart from the walls
+        self.passable_wall_list = self.my_map.sprite_lists.get("Passable Platforms", arcade.SpriteList(lazy=lazy))
+
+        # -- Moving Platforms
+        self.moving_platforms_list = self.my_map.sprite_lists.get("Moving Platforms", arcade.SpriteList(lazy=lazy))
+        self.moving_platforms = MovingPlatforms(self.moving_platforms_list)
+
+        # -- Background objects
+        self.background_list = [self.my_map.sprite_lists.get(f"Background{i}", arcade.SpriteList(lazy=lazy)) for i in range(4)]
+
+        # -- Foreground objects
+        self.foreground_list = [self.my_map.sprite_lists.get(f"Foreground{i}", arcade.SpriteList(lazy=lazy)) for i in range(4)]
+
+        # -- Ladders
+        self.ladder_list = self.my_map.sprite_lists.get("Ladders", arcade.SpriteList(lazy=lazy))
+
+        # -- Coins
+        self.coin_list = self.my_map.sprite_lists.get("Coins", arcade.SpriteList(lazy=lazy))
+
+        # -- Door positions
+        self.door_list = self.my_map.sprite_lists.get("Doors", arcade.SpriteList(lazy=lazy))
+
+        # -- Coins and doors the player can walk into, by tile
+        cell_width = self.my_map.tile_width * scaling
+        cell_height = self.my_map.tile_height * scaling
+        self.coin_triggers = TriggerGrid(cell_width, cell_height, self.coin_list, "Points")
+        self.door_triggers = TriggerGrid(cell_width, cell_height, self.door_list)
+
+        # -- Animated tiles, the coins are always animated, the scenery only when drawn
+        self.coin_animations = TileAnimations([self.coin_list])
+        self.scenery_animations = TileAnimations(self.my_map.sprite_lists.get(name, ()) for name in SCENERY_LAYERS)
+
+        # GPU resources the game window builds from the sprite lists, like
+        # baking.BakedLayer, kept here so they live as long as the level
+        self.render_cache = {}
+
+        # --- Pristine state, used by reset()
+        self.coins = list(self.coin_list)
+
+        # Parallax layers are moved as a whole, so one sprite per layer is
+        # enough to know how far the layer has drifted.
+        self.parallax_layers = [(sprite_list, sprite_list[0].position)
+                                for sprite_list in self.background_list[1:] + self.foreground_list[1:]
+                                if len(sprite_list) > 0]
+
+        # -- Streaming
+        if getattr(self.my_map, "streamed_layers", None):
+            sprite_lists = {name: self.my_map.sprite_lists[name] for name in self.my_map.streamed_layers}
+            self.streamer = ChunkStreamer(self.my_map, sprite_lists,
+                                          on_load=self._on_chunk_load, on_unload=self._on_chunk_unload,
+                                          parallax_by_projection=parallax_by_projection)
+
+    def sprite_lists(self):
+        """ Every sprite list of the level """
+        return ([self.wall_list, self.passable_wall_list, self.moving_platforms_list, self.ladder_list,
+                 self.coin_list, self.door_list] + self.background_list + self.foreground_list)
+
+    def layer_changed(self, sprite_list, added=(), removed=()):
+        """ Tell what the window drew sprite_list with that sprites were added to or removed from it """
+        layer = self.render_cache.get(id(sprite_list))
+        if layer is not None:
+            layer.remove(removed)
+            layer.add(added)
+
+    def _on_chunk_load(self, layer_name, sprites):
+        self.layer_changed(self.streamer.sprite_lists[layer_name], added=sprites)
+        if layer_name in COLLISION_SHAPES:
+            self.collision_grid.add_sprites(sprites, COLLISION_SHAPES[layer_name])
+        elif layer_name == "Ladders":
+            self.collision_grid.add_ladders(sprites)
+        elif layer_name == "Coins":
+            self.coin_triggers.add(sprites)
+            self.coin_animations.add(sprites)
+        elif layer_name in SCENERY_LAYERS:
+            self.scenery_animations.add(sprites)
+
+    def _on_chunk_unload(self, layer_name, sprites):
+        self.layer_changed(self.streamer.sprite_lists[layer_name], removed=sprites)
+        if layer_name in COLLISION_SHAPES:
+            self.collision_grid.remove_sprites(sprites)
+        elif layer_name == "Ladders":
+            self.collision_grid.add_ladders(sprites, False)
+        elif layer_name == "Coins":
+            self.coin_triggers.remove(sprites)
+            self.coin_animations.remove(sprites)
+        elif layer_name in SCENERY_LAYERS:
+            self.scenery_animations.remove(sprites)
+
+    def stream(self, view_left, view_bottom, width, height, parallax_left=None, parallax_bottom=None):
+        """ Load the chunks around the view, see ChunkStreamer.update(). Does nothing without streaming. """
+        if self.streamer:
+            self.streamer.update(view_left, view_bottom, width, height, parallax_left, parallax_bottom)
+
+    def close(self):
+        """ Release the streaming worker, the mapped level file and the render cache. """
+        self.render_cache.clear()
+        if self.streamer:
+            self.streamer.close()
+            self.streamer = None
+
+    def reset(self):
+        """ Put the mutable state of the level back to how it was loaded. """
+
+        # Streamed chunks are dropped and come back as they were loaded
+        if self.streamer:
+            self.streamer.reset()
+
+        # Coins that were collected
+        collected = [coin for coin in self.coins if not coin.sprite_lists]
+        self.coin_list.extend(collected)
+        self.coin_triggers.add(collected)
+        self.layer_changed(self.coin_list, added=collected)
+
+        # Moving platforms
+        self.moving_platforms.reset()
+
+        # Animated tiles
+        self.coin_animations.reset()
+        self.scenery_animations.reset()
+
+        # Parallax layers
+        for sprite_list, (x, y) in self.parallax_layers:
+            reference = sprite_list[0]
+            sprite_list.move(x - reference.center_x, y - reference.center_y)
+
+
+class LevelCache:
+    """
+    Least recently used cache of loaded levels.
+
+    Levels the player may go to next can be loaded ahead of time in a worker
+    thread with prefetch(). They are loaded lazy, see Level, and added to the
+    cache once they are done.
+
+    :param int max_size: How many levels to keep loaded at most
+    :param float scaling: Scaling passed on to the tile maps
+    :param bool streaming: Stream the tile layers in chunks
+    :param bool parallax_by_projection: Parallax layers are drawn with their own projection
+    """
+
+    def __init__(self, max_size=4, scaling=1.0, streaming=False, parallax_by_projection=False):
+        self.max_size = max_size
+        self.scaling = scaling
+        self.streaming = streaming
+        self.parallax_by_projection = parallax_by_projection
+        self.levels = OrderedDict()
+
+        # Map name: future of a level being prefetched
+        self.pending = OrderedDict()
+        self._executor = None
+        self._current = None
+
+    def get(self, map_name):
+        """
+        Return the level for map_name, ready to be played from the start.
+        Loads the map if it is not in the cache yet, or waits for it if it
+        is being prefetched.
+        """
+        self.collect()
+        self._current = map_name
+        level = self.levels.get(map_name)
+        if level is not None:
+            self.levels.move_to_end(map_name)
+            level.reset()
+            return level
+
+        # Wait for a level still being prefetched rather than load it twice
+        future = self.pending.pop(map_name, None)
+        if future is not None and future.exception() is None:
+            level = future.result()
+        else:
+            level = Level(map_name, self.scaling, self.streaming, self.parallax_by_projection)
+        self._add(map_name, level)
+        return level
+
+    def _add(self, map_name, level):
+        self.levels[map_name] = level
+        # Prefetched levels don't push out the level being played
+        if self._current in self.levels:
+            self.levels.move_to_end(self._current)
+        while len(self.levels) > self.max_size:
+            self.levels.popitem(last=False)[1].close()
+
+    def prefetch(self, map_names):
+        """
+        Start loading levels in the background, in the given order.
+
+        Only as many as fit in the cache next to the level being played are
+        loaded, the first ones given. A level that fails to load is left for
+        get() to load again and report.
+
+        :param Iterable[str] map_names: Levels to load, most wanted first
+        """
+        self.collect()
+        wanted = list(OrderedDict.fromkeys(map_names))[:self.max_size - 1]
+        for map_name in wanted:
+            if map_name in self.levels or map_name in self.pending:
+                continue
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-prefetch")
+            self.pending[map_name] = self._executor.submit(Level, map_name, self.scaling, self.streaming,
+                                                           self.parallax_by_projection, lazy=True)
+
+    def collect(self):
+        """ Add the levels that have finished prefetching to the cache """
+        for map_name, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[map_name]
+            if future.exception() is None:
+                self._add(map_name, future.result())
+
+    def clear(self):
+        """ Drop every cached level and stop prefetching. """
+        for future in self.pending.values():
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for future in self.pending.values():
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+        self.pending.clear()
+        for level in self.levels.values():
+            level.close()
+        self.levels.clear()
+
+
+def copy_sprite(sprite):
+    """ Sprite like the given one, in no sprite list, sharing its texture, hit box and properties """
+    sprite_copy = copy.copy(sprite)
+    sprite_copy.sprite_lists = []
+    sprite_copy.physics_engines = []
+    sprite_copy._sprite_list = None
+    sprite_copy.velocity = list(sprite.velocity)
+    sprite_copy.force = list(sprite.force)
+    return sprite_copy
+
+
+class LevelInstance:
+    """
+    One player's copy of a Level.
+
+    The parts of a level the game changes, the coins and the moving platforms,
+    are copied. Everything else, the tile layers, doors and collision grid, is
+    the shared level's own, so any number of instances cost little more than
+    the level itself. The shared level can't be streamed.
+
+    :param Level level: Level to share
+    """
+
+    def __init__(self, level):
+        if level.streamer:
+            raise ValueError(f"Level {level.map_name} is streamed and can't be shared between instances")
+        self.level = level
+
+        # -- Coins
+        self.coins = [copy_sprite(coin) for coin in level.coins]
+        self.coin_list = arcade.SpriteList(use_spatial_hash=LAYER_OPTIONS["Coins"]["use_spatial_hash"])
+        self.coin_list.extend(self.coins)
+        self.coin_triggers = TriggerGrid(level.coin_triggers.cell_width, level.coin_triggers.cell_height,
+                                         self.coins, "Points")
+        self.coin_animations = TileAnimations([self.coin_list])
+
+        # -- Moving Platforms, placed where they start
+        self.moving_platforms_list = arcade.SpriteList(use_spatial_hash=False)
+        self.moving_platforms_list.extend(copy_sprite(sprite) for sprite in level.moving_platforms.sprites)
+        self.moving_platforms = MovingPlatforms(self.moving_platforms_list)
+        self.moving_platforms.start_position[:] = level.moving_platforms.start_position
+        self.moving_platforms.start_velocity[:] = level.moving_platforms.start_velocity
+        self.moving_platforms.reset()
+
+    def __getattr__(self, name):
+        # Everything that isn't copied comes from the shared level
+        return getattr(self.level, name)
+
+    def reset(self):
+        """ Put the coins and moving platforms back to how the level was loaded. """
+        collected = [coin for coin in self.coins if not coin.sprite_lists]
+        self.coin_list.extend(collected)
+        self.coin_triggers.add(collected)
+        self.layer_changed(self.coin_list, added=collected)
+        self.moving_platforms.reset()
+        self.coin_animations.reset()
+
+    def close(self):
+        """ Nothing to release, the shared level owns the resources. """
+
+
+class LevelInstanceCache:
+    """
+    Hands out LevelInstances of the levels of a shared LevelCache, one per
+    map, so a GameEngine can use it in place of a LevelCache.
+
+    :param LevelCache shared_cache: Cache the levels are shared from, big enough to hold every map played
+    """
+
+    def __init__(self, shared_cache):
+        self.shared_cache = shared_cache
+        self.instances = {}
+
+    def get(self, map_name):
+        """ Return this cache's instance of map_name, ready to be played from the start. """
+        instance = self.instances.get(map_name)
+        if instance is not None:
+            instance.reset()
+            return instance
+
+        instance = self.instances[map_name] = LevelInstance(self.shared_cache.get(map_name))
+        return instance
+
+    def prefetch(self, map_names):
+        """ Start loading levels in the shared cache, see LevelCache.prefetch() """
+        self.shared_cache.prefetch(name for name in map_names if name not in self.instances)
+
+    def clear(self):
+        """ Drop every instance, the shared levels stay cached. """
+        self.instances.clear()
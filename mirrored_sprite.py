@@ -0,0 +1,71 @@
+"""
+Sprites that face left by being drawn mirrored.
+
+Characters keep one texture per animation frame, drawn as is when facing
+right. Facing left, the sprite is given a negative width, which the sprite
+list shader draws as a horizontally flipped quad, and its hit box is
+mirrored to match. So no flipped copy of any texture is loaded or put in the
+atlas.
+"""
+import arcade
+
+from constants import LEFT_FACING, RIGHT_FACING
+
+
+def _mirror(points):
+    return [(-x, y) for x, y in points]
+
+
+class MirroredSprite(arcade.Sprite):
+    """
+    Sprite with a character_face_direction, RIGHT_FACING or LEFT_FACING.
+
+    Hit boxes given to set_hit_box() are for the sprite facing right.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._face_direction = RIGHT_FACING
+        super().__init__(*args, **kwargs)
+
+    def _get_face_direction(self):
+        return self._face_direction
+
+    def _set_face_direction(self, direction):
+        if direction == self._face_direction:
+            return
+        self._face_direction = direction
+        if self._points is not None or self._texture is not None:
+            arcade.Sprite.set_hit_box(self, _mirror(self.get_hit_box()))
+        self._update_mirroring()
+
+    character_face_direction = property(_get_face_direction, _set_face_direction)
+
+    def _update_mirroring(self):
+        """ Give the width the sign of the direction, arcade resets it to positive on texture and scale changes """
+        width = abs(self._width)
+        if self._face_direction == LEFT_FACING:
+            width = -width
+        if width != self._width:
+            self._width = width
+            for sprite_list in self.sprite_lists:
+                sprite_list.update_size(self)
+
+    def _set_texture2(self, texture):
+        super()._set_texture2(texture)
+        self._update_mirroring()
+
+    texture = property(arcade.Sprite._get_texture, _set_texture2)
+
+    def _set_scale(self, new_value):
+        super()._set_scale(new_value)
+        self._update_mirroring()
+
+    scale = property(arcade.Sprite._get_scale, _set_scale)
+
+    def set_hit_box(self, points):
+        """ Set the hit box of the sprite facing right """
+        if self._face_direction == LEFT_FACING:
+            points = _mirror(points)
+        super().set_hit_box(points)
+
+    hit_box = property(arcade.Sprite.get_hit_box, set_hit_box)
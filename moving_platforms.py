@@ -0,0 +1,108 @@
+"""
+Moving platforms.
+
+The platforms of the "Moving Platforms" object layer are moved as a batch:
+their positions, velocities and bounds live in NumPy arrays, a frame of
+movement is a handful of array operations, and only the platforms that moved
+get their sprite written back. Static walls are never touched.
+
+A frame moves a platform twice by its change_x and change_y, as the game
+always has: once the way arcade.PhysicsEnginePlatformer moves platforms, and
+once more the way the walls were updated after it, by Sprite.update() and a
+check that turns the platforms that went past a boundary around.
+"""
+import math
+
+import numpy as np
+
+
+class MovingPlatforms:
+    """
+    Moves the sprites of moving platforms between their boundary_* limits,
+    twice a frame, see the module.
+
+    :param Iterable[Sprite] sprites: Platforms with change_x/change_y and boundary_* set
+    """
+
+    def __init__(self, sprites):
+        self.sprites = list(sprites)
+        count = len(self.sprites)
+
+        self.half_size = np.array([(sprite.width / 2, sprite.height / 2) for sprite in self.sprites],
+                                  dtype=float).reshape(count, 2)
+
+        # Limits of the centre of each platform, NaN where it has none. Like
+        # arcade, a left or right boundary of 0 counts as no boundary.
+        self.lower = np.array([(sprite.boundary_left or math.nan,
+                                math.nan if sprite.boundary_bottom is None else sprite.boundary_bottom)
+                               for sprite in self.sprites], dtype=float).reshape(count, 2) + self.half_size
+        self.upper = np.array([(sprite.boundary_right or math.nan,
+                                math.nan if sprite.boundary_top is None else sprite.boundary_top)
+                               for sprite in self.sprites], dtype=float).reshape(count, 2) - self.half_size
+
+        # Limits of the second move, past which a platform only turns around.
+        # There a boundary of 0 counts as no boundary on every side.
+        self.turn_lower = np.array([(sprite.boundary_left or math.nan, sprite.boundary_bottom or math.nan)
+                                    for sprite in self.sprites], dtype=float).reshape(count, 2) + self.half_size
+        self.turn_upper = np.array([(sprite.boundary_right or math.nan, sprite.boundary_top or math.nan)
+                                    for sprite in self.sprites], dtype=float).reshape(count, 2) - self.half_size
+
+        # Where the platforms start, used by reset()
+        self.start_position = np.array([sprite.position for sprite in self.sprites],
+                                       dtype=float).reshape(count, 2)
+        self.start_velocity = np.array([(sprite.change_x, sprite.change_y) for sprite in self.sprites],
+                                       dtype=float).reshape(count, 2)
+
+        self.position = self.start_position.copy()
+        self.velocity = self.start_velocity.copy()
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def update(self):
+        """ Move every platform one frame, turning around at the boundaries. """
+        if not self.sprites:
+            return
+        position = self.position
+        velocity = self.velocity
+
+        moving = (velocity != 0).any(axis=1)
+        with np.errstate(invalid="ignore"):
+            # Comparisons with NaN are False, so missing boundaries never hit
+            below = (position <= self.lower) & moving[:, None]
+            above = (position >= self.upper) & moving[:, None]
+        np.copyto(position, self.lower, where=below)
+        np.copyto(position, self.upper, where=above)
+
+        turned = (below & (velocity < 0)) | (above & (velocity > 0))
+        velocity[turned] *= -1
+        position += velocity
+
+        # Second move, turning around once past a boundary without stopping at it
+        position += velocity
+        with np.errstate(invalid="ignore"):
+            past = ((position < self.turn_lower) & (velocity < 0)) | ((position > self.turn_upper) & (velocity > 0))
+        velocity[past] *= -1
+
+        self._write_back(np.flatnonzero(moving), np.flatnonzero((turned | past).any(axis=1)))
+
+    def reset(self):
+        """ Put every platform back where it started. """
+        self.restore(self.start_position, self.start_velocity)
+
+    def restore(self, position, velocity):
+        """ Put every platform at the given positions, moving at the given velocities. """
+        self.position[:] = position
+        self.velocity[:] = velocity
+        everything = np.arange(len(self.sprites))
+        self._write_back(everything, everything)
+
+    def _write_back(self, moved, turned):
+        """ Copy positions and velocities of the given platforms to their sprites """
+        sprites = self.sprites
+        positions = self.position.tolist()
+        for i in moved.tolist():
+            sprites[i].position = tuple(positions[i])
+        velocities = self.velocity.tolist()
+        for i in turned.tolist():
+            sprites[i].change_x, sprites[i].change_y = velocities[i]
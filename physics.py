@@ -0,0 +1,80 @@
+"""
+Platformer physics with one-way platforms.
+
+One-way platforms can be jumped through from below and walked along, and
+the player lands on them when falling onto their top edge. Holding Down
+drops through them. They are kept in a sprite list of their own with a
+spatial hash that never changes, so only the platforms around the player
+are looked at, however many a level has.
+"""
+import arcade
+
+# How far the player can be below the top of a one-way platform, in pixels,
+# and still land on it
+ONE_WAY_TOLERANCE = 10
+
+
+class PlatformerPhysicsEngine(arcade.PhysicsEnginePlatformer):
+    """
+    arcade.PhysicsEnginePlatformer with one-way platforms.
+
+    :param Sprite player_sprite: The moving sprite
+    :param SpriteList platforms: Sprites the player can't move through
+    :param float gravity_constant: Downward acceleration per frame
+    :param SpriteList ladders: Ladders the user can climb on
+    :param SpriteList walls: Static sprites the player can't move through
+    :param SpriteList one_way_platforms: Platforms only solid from above, best with a spatial hash
+    """
+
+    def __init__(self, player_sprite, platforms=None, gravity_constant=0.5, ladders=None, walls=None,
+                 one_way_platforms=None):
+        super().__init__(player_sprite, platforms, gravity_constant, ladders, walls)
+        self.one_way_platforms = one_way_platforms
+
+        # Set while the player wants to fall through the one-way platforms
+        self.drop_through = False
+
+    def _one_way_floor(self, feet):
+        """
+        Top of the highest one-way platform the player overlaps and could
+        stand on with its feet at the given height, None if there is none.
+        """
+        if self.drop_through or not self.one_way_platforms:
+            return None
+        floor = None
+        for platform in arcade.check_for_collision_with_list(self.player_sprite, self.one_way_platforms):
+            if platform.top - ONE_WAY_TOLERANCE <= feet and (floor is None or platform.top > floor):
+                floor = platform.top
+        return floor
+
+    def can_jump(self, y_distance=5):
+        if super().can_jump(y_distance):
+            return True
+
+        player = self.player_sprite
+        feet = player.bottom
+        player.center_y -= y_distance
+        on_platform = self._one_way_floor(feet) is not None
+        player.center_y += y_distance
+
+        if on_platform:
+            self.jumps_since_ground = 0
+        return on_platform
+
+    def update(self):
+        """
+        Move everything and resolve collisions, then land on any one-way
+        platform the player fell onto.
+
+        :Returns: SpriteList with all sprites contacted. Empty list if no sprites.
+        """
+        player = self.player_sprite
+        feet = player.bottom
+        hit_list = super().update()
+
+        if player.change_y <= 0:
+            floor = self._one_way_floor(feet)
+            if floor is not None:
+                player.center_y += floor - player.bottom
+                player.change_y = 0
+        return hit_list
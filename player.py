@@ -0,0 +1,113 @@
+"""
+Player character
+"""
+from animation_states import (AIRBORNE, FALLING, FINISHED, LADDER, MOTION_CLOCK, MOVING_X, QUEUE, QUEUED, RISING,
+                              STATE_CLOCK, State, StateMachine, Transition)
+from animations import get_animations
+from constants import CHARACTER_SCALING, PLAYER_CHARACTER, RIGHT_FACING
+from mirrored_sprite import MirroredSprite
+
+GROUND_ATTACKS = ["attack1", "attack2", "attack3"]
+
+# Animation states of the player
+PLAYER_STATES = {
+    # Walking, jumping and standing around
+    "move": State([("jump", RISING, 0), ("fall", FALLING, 0), ("idle", 0, MOVING_X), ("walk", 0, 0)]),
+    # Only moves on when the player does
+    "climb": State("climb", MOTION_CLOCK),
+    # Attacks are paused on ladders and carry on once off them
+    "jump_attack": State("jump_attack", STATE_CLOCK, paused_by=("climb", LADDER)),
+    # Landing during an air attack stops the player for an update, on the
+    # frame of attack3 the air attack had got to
+    "attack_landing": State("attack3", STATE_CLOCK, ["freeze_x"], duration=1),
+    # Leaving the ground ends a ground attack, its image stays for an update
+    "attack_cancelled": State(None, duration=1),
+    # The player stands still while attacking on the ground
+    "attack1": State("attack1", STATE_CLOCK, ["freeze_x"], paused_by=("climb", LADDER)),
+    "attack2": State("attack2", STATE_CLOCK, ["freeze_x"], paused_by=("climb", LADDER)),
+    "attack3": State("attack3", STATE_CLOCK, ["freeze_x"], paused_by=("climb", LADDER)),
+}
+
+PLAYER_TRANSITIONS = [
+    Transition(None, "climb", LADDER),
+    Transition(["climb"], "move"),
+    Transition(["jump_attack"], "move", FINISHED),
+    Transition(["jump_attack"], "attack_landing", forbidden=AIRBORNE, restart=False),
+    Transition(["attack_landing", "attack_cancelled"], "move", FINISHED),
+    # Jumping or walking off a ledge ends a ground attack
+    Transition(GROUND_ATTACKS, "attack_cancelled", AIRBORNE),
+    # Attacking again during an attack carries on with the next of the combo
+    Transition(["attack1"], "attack2", FINISHED | QUEUED),
+    Transition(["attack2"], "attack3", FINISHED | QUEUED),
+    Transition(GROUND_ATTACKS, "move", FINISHED),
+]
+
+PLAYER_EVENTS = {
+    "attack": [
+        Transition(None, None, LADDER),
+        Transition(["attack3"], None),
+        # In the air the player lunges forward, a ground attack carries on as an air attack
+        Transition(GROUND_ATTACKS, "jump_attack", AIRBORNE, effects=["lunge"], restart=False),
+        Transition(None, "jump_attack", AIRBORNE, effects=["lunge"]),
+        Transition(["move"], "attack1"),
+        # Just landed, the attack carries on on the ground
+        Transition(["jump_attack"], "attack1", restart=False),
+        Transition(["attack1", "attack2"], QUEUE),
+    ],
+}
+
+PLAYER_MACHINE = StateMachine(PLAYER_STATES, PLAYER_TRANSITIONS, PLAYER_EVENTS, "move")
+
+
+class PlayerCharacter(MirroredSprite):
+    """ Player Sprite"""
+
+    def __init__(self, character=PLAYER_CHARACTER):
+
+        # Set up parent class
+        super().__init__()
+
+        # Default to face-right
+        self.character_face_direction = RIGHT_FACING
+
+        # Used for flipping between image sequences
+        self.scale = CHARACTER_SCALING
+
+        # Track our state
+        self.is_on_ladder = False
+
+        # Jump
+        self.can_jump = False
+        self.jump_frame = 0
+
+        # --- Load Textures ---
+        # Shared between every sprite of the same character set
+        self.animations = get_animations(character)
+
+        # Animation state, see PLAYER_STATES
+        self.controller = PLAYER_MACHINE.controller(self.animations)
+        self.controller.reset(self)
+
+        # Set the initial texture
+        self.texture = self.animations["idle"].texture(0)
+
+        # Hit box will be set based on the first image used. If you want to specify
+        # a different hit box, you can do it like the code below.
+        #self.set_hit_box([[-22, -64], [22, -64], [22, 28], [-22, 28]])
+        #self.set_hit_box([[-22, -56], [-10, -56], [-10, -64], [10, -64], [10, -56], [22, -56], [22, 28], [-22, 28]])
+        self.set_hit_box([[-27, -40], [-3, -64], [3, -64], [27, -40], [27, 28], [-27, 28]])
+        #self.set_hit_box(self.texture.hit_box_points)
+
+    def update(self):
+        pass
+
+    def attack(self):
+        """
+        Start an attack, or the next one of the combo.
+
+        :Returns: False if the player can't attack now
+        """
+        return self.controller.trigger(self, "attack")
+
+    def update_animation(self, delta_time: float = 1/60):
+        self.controller.update(self)
@@ -0,0 +1,73 @@
+"""
+OpenGL side of level prefetching.
+
+LevelCache.prefetch() loads the levels behind the doors in a worker thread,
+without touching OpenGL. The textures of their sprites still have to be
+written to the texture atlas and their sprite lists need buffers, which can
+only be done on the main thread. LevelUploader does that a little every
+frame, within a time budget, so the level is ready to draw by the time the
+player walks through the door.
+"""
+import time
+import weakref
+
+# Seconds a frame may spend on uploads
+UPLOAD_TIME_BUDGET = 0.002
+
+
+class LevelUploader:
+    """
+    Uploads the cached levels that aren't played yet to the GPU, a slice at
+    a time.
+
+    :param ArcadeContext ctx: Context of the window, its default atlas is the one sprite lists use
+    :param LevelCache level_cache: Levels to upload
+    :param float budget: Seconds update() may take, give or take one texture or sprite list
+    """
+
+    def __init__(self, ctx, level_cache, budget=UPLOAD_TIME_BUDGET):
+        self.ctx = ctx
+        self.level_cache = level_cache
+        self.budget = budget
+        self.uploaded = weakref.WeakSet()
+        self._level = None
+        self._uploads = None
+
+    def update(self, current_level=None):
+        """
+        Upload until the time budget is spent.
+
+        :param Level current_level: Level being played, it is uploaded when drawn anyway
+        """
+        self.level_cache.collect()
+        # Levels that started being played or were dropped from the cache halfway are left alone
+        if self._level is not None and (self._level is current_level or
+                                        self._level not in self.level_cache.levels.values()):
+            self._level = self._uploads = None
+
+        deadline = time.perf_counter() + self.budget
+        while time.perf_counter() < deadline:
+            if self._uploads is None:
+                self._level = next((level for level in self.level_cache.levels.values()
+                                    if level is not current_level and level not in self.uploaded), None)
+                if self._level is None:
+                    return
+                self._uploads = self.upload_steps(self._level)
+            if next(self._uploads, None) is None:
+                self.uploaded.add(self._level)
+                self._level = self._uploads = None
+
+    def upload_steps(self, level):
+        """ Generator doing one upload per step, a texture or the buffers of a sprite list """
+        atlas = self.ctx.default_atlas
+        for sprite_list in level.sprite_lists():
+            for sprite in sprite_list:
+                textures = [sprite.texture] + (sprite.textures or [])
+                textures += [frame.texture for frame in getattr(sprite, "frames", ())]
+                for texture in textures:
+                    if texture is not None and not atlas.has_texture(texture):
+                        atlas.add(texture)
+                        yield True
+            # The textures are in the atlas, so this only creates the buffers
+            sprite_list.initialize()
+            yield True
@@ -0,0 +1,233 @@
+"""
+Frame-time profiler.
+
+The engine and the window mark the end of each phase of their work with
+lap(), which is a clock read and a few list writes. The time of every lap is
+kept in a ring buffer of events, and summed per phase into a ring buffer of
+frames. ProfilerHud shows percentiles of the last frames on screen, and the
+buffers can be saved as CSV, one row per frame, or as a Chrome trace
+(chrome://tracing or https://ui.perfetto.dev).
+
+Draw phases measure the CPU side of the draw calls, the GPU works on them
+later.
+"""
+import csv
+import json
+import os
+import time
+
+import arcade
+import numpy as np
+
+# Frames kept for percentiles and the CSV export
+FRAME_CAPACITY = 600
+
+# Laps kept for the Chrome trace
+EVENT_CAPACITY = FRAME_CAPACITY * 32
+
+# Columns of a frame, in the order phases are first seen
+MAX_PHASES = 64
+
+PROFILE_DIRECTORY = "profiles"
+
+# Percentiles shown by the HUD
+HUD_PERCENTILES = (50, 95, 99)
+
+# Seconds between HUD refreshes
+HUD_REFRESH_INTERVAL = 0.5
+
+
+class NullProfiler:
+    """ Profiler that records nothing, for when profiling is off """
+
+    def begin_frame(self):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+
+class Profiler:
+    """
+    Times phases of frames into ring buffers.
+
+    A frame goes from begin_frame() to end_frame(). Within it, start() starts
+    the clock and lap(phase) adds the time since start() or the previous lap
+    to the phase. A phase can be lapped several times in a frame, such as
+    when the engine steps more than once.
+
+    :param int frame_capacity: Frames to keep
+    :param int event_capacity: Laps to keep
+    """
+
+    def __init__(self, frame_capacity=FRAME_CAPACITY, event_capacity=EVENT_CAPACITY):
+        self.frame_capacity = frame_capacity
+        self.event_capacity = event_capacity
+
+        # Phase name: column
+        self.phases = {"frame": 0}
+
+        # Frame ring, seconds spent in each phase
+        self.frame_count = 0
+        self.frame_start = [0.0] * frame_capacity
+        self.frame_phases = np.zeros((frame_capacity, MAX_PHASES))
+        self._row = [0.0] * MAX_PHASES
+
+        # Event ring, every lap
+        self.event_count = 0
+        self.event_phase = [0] * event_capacity
+        self.event_start = [0.0] * event_capacity
+        self.event_duration = [0.0] * event_capacity
+
+        self._frame_start = None
+        self._last = time.perf_counter()
+
+    def begin_frame(self):
+        self._frame_start = self._last = time.perf_counter()
+        self._row = [0.0] * MAX_PHASES
+
+    def end_frame(self):
+        if self._frame_start is None:
+            return
+        now = time.perf_counter()
+        row = self._row
+        row[0] = now - self._frame_start
+
+        index = self.frame_count % self.frame_capacity
+        self.frame_start[index] = self._frame_start
+        self.frame_phases[index] = row
+        self.frame_count += 1
+        self._frame_start = None
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        column = self.phases.get(phase)
+        if column is None:
+            if len(self.phases) >= MAX_PHASES:
+                return
+            column = self.phases[phase] = len(self.phases)
+        duration = now - self._last
+        self._row[column] += duration
+
+        index = self.event_count % self.event_capacity
+        self.event_phase[index] = column
+        self.event_start[index] = self._last
+        self.event_duration[index] = duration
+        self.event_count += 1
+        self._last = now
+
+    def _frame_order(self):
+        """ Ring indices of the kept frames, oldest first """
+        count = min(self.frame_count, self.frame_capacity)
+        first = self.frame_count - count
+        return [(first + i) % self.frame_capacity for i in range(count)]
+
+    def percentiles(self, percentiles=HUD_PERCENTILES):
+        """
+        Percentiles of the time per frame of each phase, over the kept frames.
+
+        :Returns: Dict of phase name to a list of seconds, one per percentile
+        """
+        order = self._frame_order()
+        if not order:
+            return {}
+        columns = list(self.phases.values())
+        values = np.percentile(self.frame_phases[order][:, columns], percentiles, axis=0)
+        return {phase: values[:, i].tolist() for i, phase in enumerate(self.phases)}
+
+    def save_csv(self, file_name):
+        """ One row per kept frame, with the milliseconds of each phase """
+        _make_directory(file_name)
+        with open(file_name, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "start_ms"] + [f"{phase}_ms" for phase in self.phases])
+            first = self.frame_count - len(self._frame_order())
+            for i, index in enumerate(self._frame_order()):
+                row = self.frame_phases[index]
+                writer.writerow([first + i, f"{self.frame_start[index] * 1000:.3f}"] +
+                                [f"{row[column] * 1000:.4f}" for column in self.phases.values()])
+
+    def save_chrome_trace(self, file_name):
+        """ The kept frames and laps as complete events of the Chrome trace format """
+        names = {column: phase for phase, column in self.phases.items()}
+        events = []
+        for index in self._frame_order():
+            events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": self.frame_start[index] * 1e6,
+                           "dur": self.frame_phases[index, 0] * 1e6})
+        count = min(self.event_count, self.event_capacity)
+        for i in range(self.event_count - count, self.event_count):
+            index = i % self.event_capacity
+            events.append({"name": names[self.event_phase[index]], "ph": "X", "pid": 0, "tid": 1,
+                           "ts": self.event_start[index] * 1e6,
+                           "dur": self.event_duration[index] * 1e6})
+
+        _make_directory(file_name)
+        with open(file_name, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def save(self, directory=PROFILE_DIRECTORY):
+        """
+        Save both exports in directory, named after the current time.
+
+        :Returns: The CSV and trace file names
+        """
+        base_name = os.path.join(directory, time.strftime("%Y%m%d-%H%M%S"))
+        self.save_csv(base_name + ".csv")
+        self.save_chrome_trace(base_name + ".json")
+        return base_name + ".csv", base_name + ".json"
+
+
+def _make_directory(file_name):
+    directory = os.path.dirname(file_name)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+class ProfilerHud:
+    """
+    Percentiles of a profiler drawn as text in a corner of the screen,
+    refreshed every HUD_REFRESH_INTERVAL seconds.
+
+    :param Profiler profiler: Profiler to show
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.visible = False
+        self.texts = []
+        self._refreshed = 0.0
+
+    def _refresh(self):
+        header = "phase".ljust(24) + "".join(f"p{percentile}".rjust(9) for percentile in HUD_PERCENTILES)
+        lines = [header]
+        for phase, values in self.profiler.percentiles().items():
+            lines.append(phase[:24].ljust(24) + "".join(f"{value * 1000:8.2f}m" for value in values))
+
+        while len(self.texts) < len(lines):
+            self.texts.append(arcade.Text("", 0, 0, arcade.color.WHITE, 11, font_name="Courier New"))
+        del self.texts[len(lines):]
+        for text, line in zip(self.texts, lines):
+            text.value = line
+
+    def draw(self, left, top):
+        """ Draw the table with its top left corner at (left, top) in world coordinates """
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if now - self._refreshed > HUD_REFRESH_INTERVAL:
+            self._refreshed = now
+            self._refresh()
+        for i, text in enumerate(self.texts):
+            text.x = left
+            text.y = top - (i + 1) * 15
+            text.draw()
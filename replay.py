@@ -0,0 +1,226 @@
+"""
+Input recording and replay.
+
+A recording holds what a GameEngine needs to play a session again exactly:
+the map and door it started at, the engine settings that change how the
+game plays, and the INPUT_* flags of every step. Since the engine is
+deterministic, feeding the inputs back step by step gives the same game.
+
+Recordings are small little-endian files:
+
+    header                  magic, version, flags, to_id, step count
+    map name                length prefixed UTF-8
+    character               length prefixed UTF-8
+    inputs                  one byte per step, zlib compressed
+
+python replay.py recording.rpl [--window] [--fast]
+"""
+import argparse
+import os
+import struct
+import time
+import zlib
+
+from constants import FIXED_TIMESTEP, PLAYER_CHARACTER, TILE_GRID_COLLISION
+from engine import INPUT_ATTACK, GameEngine, GameObserver
+
+MAGIC = b"PRPL"
+VERSION = 1
+
+REPLAY_DIRECTORY = "replays"
+
+# magic, version, flags, to_id, step count
+HEADER = struct.Struct("<4sHHiI")
+STRING_LENGTH = struct.Struct("<H")
+
+# Header flags
+FLAG_TILE_GRID_COLLISION = 0x01
+
+
+class Recording:
+    """
+    Inputs of a session and where it started.
+
+    :param str map_name: Map the session started in
+    :param int to_id: Door the session started at
+    :param str character: Animation set of the player, it decides how long attacks last
+    :param bool tile_grid_collision: The engine collided with the tile grid
+    :param List[int] inputs: INPUT_* flags of each step
+    """
+
+    def __init__(self, map_name, to_id=0, character=PLAYER_CHARACTER, tile_grid_collision=TILE_GRID_COLLISION,
+                 inputs=None):
+        self.map_name = map_name
+        self.to_id = int(to_id)
+        self.character = character
+        self.tile_grid_collision = tile_grid_collision
+        self.inputs = inputs if inputs is not None else []
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def create_engine(self, **kwargs):
+        """ GameEngine set up the way the recorded session started, kwargs go to GameEngine """
+        engine = GameEngine(character=self.character, tile_grid_collision=self.tile_grid_collision, **kwargs)
+        engine.setup(self.map_name, self.to_id)
+        return engine
+
+    def save(self, file_name):
+        """ Write the recording to file_name, creating its directory if needed """
+        flags = FLAG_TILE_GRID_COLLISION if self.tile_grid_collision else 0
+        data = [HEADER.pack(MAGIC, VERSION, flags, self.to_id, len(self.inputs))]
+        for string in (self.map_name, self.character):
+            encoded = string.encode("utf-8")
+            data += [STRING_LENGTH.pack(len(encoded)), encoded]
+        data.append(zlib.compress(bytes(self.inputs)))
+
+        directory = os.path.dirname(file_name)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_name, "wb") as file:
+            file.write(b"".join(data))
+
+    @classmethod
+    def load(cls, file_name):
+        """ Read a recording written by save() """
+        with open(file_name, "rb") as file:
+            data = file.read()
+
+        magic, version, flags, to_id, step_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"'{file_name}' is not a version {VERSION} recording.")
+        offset = HEADER.size
+        strings = []
+        for i in range(2):
+            length, = STRING_LENGTH.unpack_from(data, offset)
+            offset += STRING_LENGTH.size
+            strings.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+        inputs = list(zlib.decompress(data[offset:]))
+        if len(inputs) != step_count:
+            raise ValueError(f"'{file_name}' is truncated, {len(inputs)} of {step_count} steps.")
+
+        map_name, character = strings
+        return cls(map_name, to_id, character, bool(flags & FLAG_TILE_GRID_COLLISION), inputs)
+
+
+class InputRecorder(GameObserver):
+    """
+    Records the inputs of every step of an engine from the state it is in
+    when the recorder is created, which should be right after setup().
+
+    :param GameEngine engine: Engine to record, the recorder adds itself as observer
+    """
+
+    def __init__(self, engine):
+        self.recording = Recording(engine.map_name, engine.to_id, engine.character, engine.tile_grid_collision)
+        engine.add_observer(self)
+
+    def on_step(self, engine):
+        self.recording.inputs.append(engine.inputs | (INPUT_ATTACK if engine.attack_pressed else 0))
+
+
+def recording_file_name():
+    """ New file in REPLAY_DIRECTORY named after the current time """
+    return os.path.join(REPLAY_DIRECTORY, time.strftime("%Y%m%d-%H%M%S") + ".rpl")
+
+
+def replay_headless(recording, real_time=False):
+    """
+    Play a recording without a window.
+
+    :param Recording recording: What to play
+    :param bool real_time: Take FIXED_TIMESTEP for each step instead of going as fast as possible
+    :Returns: The engine after the last step
+    """
+    engine = recording.create_engine(animate_scenery=False)
+    start_time = time.perf_counter()
+    for step, inputs in enumerate(recording.inputs):
+        if real_time:
+            delay = start_time + step * FIXED_TIMESTEP - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        engine.step(inputs)
+    return engine
+
+
+def replay_window(recording, fast=False):
+    """
+    Play a recording in the game window, closing it at the end.
+
+    :param Recording recording: What to play
+    :param bool fast: Run one step per frame with no frame limit instead of in real time
+    :Returns: The engine after the last step
+    """
+    import arcade
+    from main_window import MyGame
+
+    class ReplayWindow(MyGame):
+        """ Game window fed from a recording instead of the keyboard """
+
+        def __init__(self):
+            super().__init__(recording.create_engine())
+            # The engine was set up before the window could watch it
+            self.on_level_loaded(self.engine)
+            self.replay_step = 0
+            if fast:
+                # Every frame is a step, there is nothing to draw in between
+                self.interpolate = False
+                self.set_vsync(False)
+                self.set_update_rate(1 / 1000)
+
+        def next_inputs(self):
+            inputs = recording.inputs[self.replay_step]
+            self.replay_step += 1
+            return inputs
+
+        def on_update(self, delta_time):
+            self.profiler.begin_frame()
+            steps = 1 if fast else self.steps_due(delta_time)
+            for i in range(min(steps, len(recording) - self.replay_step)):
+                self.engine.step(self.next_inputs())
+            self.level_uploader.update(self.engine.level)
+            self.audio.flush()
+            self.scroll_viewport()
+            if self.replay_step >= len(recording):
+                self.close()
+
+        def on_key_press(self, key, modifiers):
+            if key == arcade.key.ESCAPE:
+                self.close()
+
+        def on_key_release(self, key, modifiers):
+            pass
+
+    window = ReplayWindow()
+    window.scroll_viewport()
+    arcade.run()
+    return window.engine
+
+
+def main():
+    """ Main method """
+    parser = argparse.ArgumentParser(description="Play a recorded session again.")
+    parser.add_argument("recording", help="Recording to play")
+    parser.add_argument("--window", action="store_true", help="Show the game while playing")
+    parser.add_argument("--fast", action="store_true", help="Go as fast as possible instead of in real time")
+    args = parser.parse_args()
+
+    recording = Recording.load(args.recording)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    start_time = time.perf_counter()
+    if args.window:
+        engine = replay_window(recording, args.fast)
+    else:
+        engine = replay_headless(recording, not args.fast)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"{engine.step_count} of {len(recording)} steps in {elapsed:.2f} s, "
+          f"{engine.step_count / elapsed:.0f} steps/s")
+    print(f"map {engine.map_name}, player at ({engine.player_sprite.center_x:.2f}, "
+          f"{engine.player_sprite.center_y:.2f}), score {engine.score}")
+
+
+if __name__ == "__main__":
+    main()
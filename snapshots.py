@@ -0,0 +1,117 @@
+"""
+Snapshots of the game state.
+
+A Snapshot holds what a GameEngine changes while a level is played: the
+player's movement and animation counters, which coins were collected as a
+bit set, the moving platforms, the one-way platform flags of the physics
+engine, the score and the camera. The level itself, its tiles and sprites,
+is not copied, so a snapshot takes a few hundred bytes plus a bit per coin,
+and restoring one only touches what differs from the current state.
+
+Streamed levels rebuild their coins with their chunks and can't be
+snapshotted.
+"""
+import numpy as np
+
+# Attributes of the player sprite kept in a snapshot
+PLAYER_FIELDS = ("center_x", "center_y", "change_x", "change_y", "character_face_direction",
+                 "can_jump", "is_on_ladder", "jump_frame",
+                 "animation_state", "animation_frame", "state_frame", "motion_frame", "animation_queued")
+
+# Attributes of the engine kept for the camera
+CAMERA_FIELDS = ("view_left", "view_bottom", "view_left_old", "view_bottom_old", "scroll_speed_x", "scroll_speed_y")
+
+
+class Snapshot:
+    """
+    The mutable state of a GameEngine between two steps, see take_snapshot().
+    step_count is when it was taken.
+    """
+
+    __slots__ = ("map_name", "to_id", "step_count", "score", "camera", "player", "texture", "physics",
+                 "platform_position", "platform_velocity", "coins", "parallax", "tile_times")
+
+    def __init__(self, map_name, to_id, step_count, score, camera, player, texture, physics,
+                 platform_position, platform_velocity, coins, parallax, tile_times):
+        self.map_name = map_name
+        self.to_id = to_id
+        self.step_count = step_count
+        self.score = score
+        self.camera = camera
+        self.player = player
+        self.texture = texture
+        self.physics = physics
+        self.platform_position = platform_position
+        self.platform_velocity = platform_velocity
+        # Packed bits, set for the collected coins of Level.coins
+        self.coins = coins
+        self.parallax = parallax
+        self.tile_times = tile_times
+
+
+def _collected(level):
+    return np.fromiter((not coin.sprite_lists for coin in level.coins), dtype=bool, count=len(level.coins))
+
+
+def take_snapshot(engine):
+    """ Snapshot of the engine's state """
+    level = engine.level
+    if level.streamer:
+        raise ValueError(f"Level {level.map_name} is streamed and can't be snapshotted")
+    player = engine.player_sprite
+    physics_engine = engine.physics_engine
+    return Snapshot(
+        engine.map_name, engine.to_id, engine.step_count, engine.score,
+        tuple(getattr(engine, name) for name in CAMERA_FIELDS),
+        tuple(getattr(player, name) for name in PLAYER_FIELDS),
+        player.texture,
+        (physics_engine.jumps_since_ground, physics_engine.drop_through),
+        level.moving_platforms.position.copy(),
+        level.moving_platforms.velocity.copy(),
+        np.packbits(_collected(level)).tobytes(),
+        tuple(sprite_list[0].position for sprite_list, start in level.parallax_layers),
+        (level.coin_animations.time, level.scenery_animations.time),
+    )
+
+
+def restore_snapshot(engine, snapshot):
+    """
+    Put the engine back in the state of a snapshot of its current level.
+    The controls held and the step count are left as they are.
+    """
+    level = engine.level
+    if snapshot.map_name != engine.map_name:
+        raise ValueError(f"Snapshot of {snapshot.map_name} can't be restored in {engine.map_name}")
+    engine.to_id = snapshot.to_id
+    engine.score = snapshot.score
+    for name, value in zip(CAMERA_FIELDS, snapshot.camera):
+        setattr(engine, name, value)
+
+    # Player
+    player = engine.player_sprite
+    for name, value in zip(PLAYER_FIELDS, snapshot.player):
+        setattr(player, name, value)
+    player.texture = snapshot.texture
+    engine.physics_engine.jumps_since_ground, engine.physics_engine.drop_through = snapshot.physics
+
+    # Coins, only the ones that changed since
+    collected = np.unpackbits(np.frombuffer(snapshot.coins, dtype=np.uint8),
+                              count=len(level.coins)).astype(bool)
+    changed = np.flatnonzero(collected != _collected(level)).tolist()
+    removed = [level.coins[i] for i in changed if collected[i]]
+    added = [level.coins[i] for i in changed if not collected[i]]
+    level.coin_triggers.remove(removed)
+    for coin in removed:
+        coin.remove_from_sprite_lists()
+    level.coin_list.extend(added)
+    level.coin_triggers.add(added)
+    level.layer_changed(level.coin_list, added, removed)
+
+    # Level
+    level.moving_platforms.restore(snapshot.platform_position, snapshot.platform_velocity)
+    for (sprite_list, start), (x, y) in zip(level.parallax_layers, snapshot.parallax):
+        reference = sprite_list[0]
+        sprite_list.move(x - reference.center_x, y - reference.center_y)
+    for animations, time in zip((level.coin_animations, level.scenery_animations), snapshot.tile_times):
+        animations.time = time
+        animations.update(0.0)
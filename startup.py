@@ -0,0 +1,201 @@
+"""
+Staged startup behind a loading screen.
+
+The window opens on a loading screen straight away, and what the first
+screen of the game needs is loaded behind it in stages:
+
+- textures: the images of the startup manifest, the player's animations,
+  decoded in a thread pool, one task per atlas page so each page is decoded
+  once
+- level: the first level, loaded in the level cache's worker thread at the
+  same time, see LevelCache.prefetch()
+- upload: the textures put in the GPU atlas and the level's sprite lists
+  created, on the main thread, a slice per frame
+- setup: the engine set up in the level, on the main thread
+
+Everything else waits until it is needed or loads in the background once
+the game runs: the sounds on the audio thread, the levels behind the doors
+through the level cache. When each stage began and ended, the time to the
+first frame and to the first frame of the game are printed once the game is
+drawn.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import arcade
+
+from animations import texture_files
+from atlas import get_atlas, load_texture
+from constants import SCREEN_HEIGHT, SCREEN_WIDTH
+
+# Taken when the game's modules are imported, close enough to the start of the process
+PROCESS_START = time.perf_counter()
+
+# Threads decoding the images of the manifest
+DECODE_WORKERS = 4
+
+# Seconds a frame of the loading screen may spend loading on the main thread
+STARTUP_TIME_BUDGET = 0.01
+
+# Share of the progress bar each stage fills
+STAGE_WEIGHTS = {
+    "textures": 0.4,
+    "level": 0.3,
+    "upload": 0.2,
+    "setup": 0.1,
+}
+
+
+# Returned by the exhausted stage generator, its steps yield None
+_DONE = object()
+
+
+def startup_manifest(character):
+    """ Image files the first screen needs """
+    return texture_files(character)
+
+
+def _load_textures(file_names):
+    return [load_texture(file_name) for file_name in file_names]
+
+
+class Startup:
+    """
+    Loads the game into a window a slice per frame, see the module.
+
+    :param MyGame window: Window to set up
+    :param str map_name: Map to start in
+    :param int to_id: Door to start at
+    :param float budget: Seconds update() may take, give or take one step
+    """
+
+    def __init__(self, window, map_name, to_id=0, budget=STARTUP_TIME_BUDGET):
+        self.window = window
+        self.map_name = map_name
+        self.to_id = to_id
+        self.budget = budget
+
+        # Stage name: [start, end] in seconds since PROCESS_START
+        self.timings = {"window": [0.0, self._now()]}
+        # Event name: seconds since PROCESS_START
+        self.events = {}
+
+        self.stage = None
+        self.progress = 0.0
+        self.finished = False
+
+        # The sounds started loading with the window's AudioManager
+        self.timings["sounds"] = [self.timings["window"][1], None]
+        window.audio.loading.add_done_callback(lambda future: self._end("sounds"))
+
+        self._steps = self._run()
+
+    def _now(self):
+        return time.perf_counter() - PROCESS_START
+
+    def _begin(self, stage):
+        self.stage = stage
+        self.timings[stage] = [self._now(), None]
+
+    def _end(self, stage):
+        """ Record the end of a stage, can be called from other threads """
+        self.timings[stage][1] = self._now()
+
+    def _advance(self, stage, fraction):
+        """ Move the progress bar for a stage that is fraction done """
+        done = sum(weight for name, weight in STAGE_WEIGHTS.items()
+                   if name != stage and name in self.timings and self.timings[name][1] is not None)
+        self.progress = done + STAGE_WEIGHTS[stage] * fraction
+
+    def update(self):
+        """ Load until the time budget is spent """
+        deadline = time.perf_counter() + self.budget
+        while not self.finished and time.perf_counter() < deadline:
+            if next(self._steps, _DONE) is _DONE:
+                self.finished = True
+
+    def _run(self):
+        """ Generator doing the stages, yielding whenever it waits on a thread or did some work """
+        window = self.window
+        engine = window.engine
+        level_cache = engine.level_cache
+
+        # The level loads in its own thread while the images are decoded
+        self._begin("level")
+        level_cache.prefetch([self.map_name])
+        future = level_cache.pending.get(self.map_name)
+        if future is None:
+            self._end("level")
+        else:
+            future.add_done_callback(lambda future: self._end("level"))
+
+        self._begin("textures")
+        atlas = get_atlas()
+        pages = {}
+        for file_name in startup_manifest(engine.character):
+            frame = atlas.find_frame(file_name)
+            # Images that aren't packed are decoded on their own
+            key = file_name if frame is None else frame["page"]
+            pages.setdefault(key, []).append(file_name)
+        with ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode") as executor:
+            futures = [executor.submit(_load_textures, file_names) for file_names in pages.values()]
+            while not all(future.done() for future in futures):
+                self._advance("textures", sum(future.done() for future in futures) / len(futures))
+                yield
+        textures = [texture for future in futures for texture in future.result()]
+        self._end("textures")
+
+        # A level that failed to load in the background is loaded again by setup()
+        while self.map_name in level_cache.pending:
+            level_cache.collect()
+            yield
+
+        self._begin("upload")
+        gpu_atlas = window.ctx.default_atlas
+        for i, texture in enumerate(textures):
+            if not gpu_atlas.has_texture(texture):
+                gpu_atlas.add(texture)
+                self._advance("upload", i / len(textures) / 2)
+                yield
+        level = level_cache.levels.get(self.map_name)
+        if level is not None:
+            for step in window.level_uploader.upload_steps(level):
+                yield
+            window.level_uploader.uploaded.add(level)
+        self._end("upload")
+
+        self._begin("setup")
+        self._advance("setup", 0.0)
+        yield
+        window.setup(self.map_name, self.to_id)
+        self._end("setup")
+        self.progress = 1.0
+
+    def draw(self):
+        """ Draw the loading screen """
+        if "first frame" not in self.events:
+            self.events["first frame"] = self._now()
+        arcade.start_render()
+        arcade.set_viewport(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT)
+        bar_width = SCREEN_WIDTH / 2
+        arcade.draw_xywh_rectangle_filled(SCREEN_WIDTH / 4, SCREEN_HEIGHT / 2 - 10,
+                                          bar_width * self.progress, 20, arcade.color.WHITE)
+        arcade.draw_xywh_rectangle_outline(SCREEN_WIDTH / 4, SCREEN_HEIGHT / 2 - 10,
+                                           bar_width, 20, arcade.color.WHITE, 2)
+        arcade.draw_text(f"Loading {self.stage or ''}", SCREEN_WIDTH / 4, SCREEN_HEIGHT / 2 + 20,
+                         arcade.color.WHITE, 16)
+
+    def game_drawn(self):
+        """ Call when the first frame of the game has been drawn, prints the timings """
+        self.events["first game frame"] = self._now()
+        print(self.report())
+
+    def report(self):
+        """ Timings of the stages and events, as text """
+        lines = ["Startup, seconds since start:"]
+        for stage, (start, end) in self.timings.items():
+            end = "still loading" if end is None else f"{end:.3f}"
+            lines.append(f"  {stage:<17}{start:.3f} - {end}")
+        for event, at in self.events.items():
+            lines.append(f"  {event:<17}{at:.3f}")
+        return "\n".join(lines)
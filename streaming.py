@@ -0,0 +1,220 @@
+"""
+Chunked level streaming.
+
+The tile layers of a large map are split into square chunks of tiles. Only
+the chunks around the camera exist as sprites; chunks coming into range are
+built on a worker thread and handed to the sprite lists on the main thread,
+and chunks that fall far enough behind are dropped again.
+"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+# Width and height of a chunk in tiles
+CHUNK_SIZE = 16
+
+# Chunks this far outside the view, in pixels, are built ahead of time
+PRELOAD_MARGIN = 512
+
+# Chunks are only dropped once they are this far outside the view, so
+# walking back and forth over a chunk border doesn't rebuild it every time
+EVICT_MARGIN = 1024
+
+# Chunks handed over to the sprite lists per update, at most. Chunks inside
+# the view are always added straight away.
+MAX_CHUNKS_PER_UPDATE = 2
+
+
+class ChunkStreamer:
+    """
+    Keeps the sprites of the streamed layers of a CompiledMap in step with the
+    camera.
+
+    Sprites removed from the game while their chunk was loaded, such as
+    collected coins, are remembered and not built again when the chunk comes
+    back. reset() forgets them.
+
+    :param CompiledMap my_map: Map with streamed_layers
+    :param Dict[str, SpriteList] sprite_lists: Sprite list to fill for each streamed layer
+    :param Callable on_load: Called as on_load(layer_name, sprites) before sprites are added
+    :param Callable on_unload: Called as on_unload(layer_name, sprites) before sprites are removed
+    :param int chunk_size: Width and height of a chunk in tiles
+    :param bool parallax_by_projection: Parallax layers are drawn with a projection of their
+        own instead of being moved, so their sprites stay where the map puts them
+    """
+
+    def __init__(self, my_map, sprite_lists, on_load=None, on_unload=None, chunk_size=CHUNK_SIZE,
+                 parallax_by_projection=False):
+        self.my_map = my_map
+        self.sprite_lists = sprite_lists
+        self.on_load = on_load
+        self.on_unload = on_unload
+        self.chunk_size = chunk_size
+        self.parallax_by_projection = parallax_by_projection
+
+        self.tile_width = my_map.tile_width * my_map.scaling
+        self.tile_height = my_map.tile_height * my_map.scaling
+        self.columns = math.ceil(my_map.width / chunk_size)
+        self.rows = math.ceil(my_map.height / chunk_size)
+
+        # (layer name, chunk column, chunk row): [(tile index, sprite)]
+        self.loaded = {}
+        # Same keys, chunks being built on the worker thread
+        self.pending = {}
+        # (layer name, tile index) of sprites taken out of the game
+        self.removed = set()
+        # Layer name: (x, y) the parallax layers have been moved by
+        self.offsets = {}
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chunks")
+
+    def _chunks_in(self, layer, left, bottom, right, top):
+        """ Chunks of a layer with tiles that reach into the given rectangle """
+        # A tile is drawn from the bottom left corner of its cell, and can be
+        # larger than the cell
+        first_column = math.floor((left - layer.max_tile_width) / self.tile_width) + 1
+        last_column = math.floor(right / self.tile_width)
+        first_row = math.floor((bottom - layer.max_tile_height) / self.tile_height) + 1
+        last_row = math.floor(top / self.tile_height)
+
+        first_column = max(first_column, 0) // self.chunk_size
+        last_column = min(last_column // self.chunk_size, self.columns - 1)
+        first_row = max(first_row, 0) // self.chunk_size
+        last_row = min(last_row // self.chunk_size, self.rows - 1)
+        return {(layer.name, column, row)
+                for column in range(first_column, last_column + 1)
+                for row in range(first_row, last_row + 1)}
+
+    def _build_chunk(self, key):
+        """ Create the sprites of a chunk, runs on the worker thread """
+        name, chunk_column, chunk_row = key
+        layer = self.my_map.streamed_layers[name]
+        width = self.my_map.width
+        height = self.my_map.height
+
+        sprites = []
+        # Chunk rows count up from the bottom of the map, tile rows down from the top
+        for row_from_bottom in range(chunk_row * self.chunk_size,
+                                     min((chunk_row + 1) * self.chunk_size, height)):
+            row_start = (height - row_from_bottom - 1) * width
+            for column in range(chunk_column * self.chunk_size,
+                                min((chunk_column + 1) * self.chunk_size, width)):
+                index = row_start + column
+                gid = layer.gids[index]
+                if gid == 0 or (name, index) in self.removed:
+                    continue
+                sprites.append((index, self.my_map.create_tile_sprite(gid, index, layer.opacity)))
+        return sprites
+
+    def _add_chunk(self, key, sprites):
+        name = key[0]
+        if self.on_load:
+            self.on_load(name, [sprite for index, sprite in sprites])
+        offset_x, offset_y = self.offsets.get(name, (0, 0))
+        sprite_list = self.sprite_lists[name]
+        for index, sprite in sprites:
+            if offset_x or offset_y:
+                sprite.center_x += offset_x
+                sprite.center_y += offset_y
+            sprite_list.append(sprite)
+        self.loaded[key] = sprites
+
+    def _evict_chunk(self, key):
+        name = key[0]
+        sprites = self.loaded.pop(key)
+        for index, sprite in sprites:
+            if not sprite.sprite_lists:
+                self.removed.add((name, index))
+        if self.on_unload:
+            self.on_unload(name, [sprite for index, sprite in sprites])
+        for index, sprite in sprites:
+            sprite.remove_from_sprite_lists()
+
+    def update(self, view_left, view_bottom, width, height, parallax_left=None, parallax_bottom=None):
+        """
+        Load and drop chunks for the current view.
+
+        Parallax layers are shifted by (1 - parallax factor) times the camera
+        position they were last moved to, which can lag the view by a frame.
+        New sprites of those layers are shifted the same way. With
+        parallax_by_projection the layers are seen through the view scaled by
+        their parallax factor instead, and parallax_left/bottom are not used.
+
+        :param float view_left: Left edge of the view
+        :param float view_bottom: Bottom edge of the view
+        :param float width: Width of the view
+        :param float height: Height of the view
+        :param float parallax_left: Camera x the parallax layers are placed for, view_left if None
+        :param float parallax_bottom: Camera y the parallax layers are placed for, view_bottom if None
+        """
+        if parallax_left is None:
+            parallax_left = view_left
+        if parallax_bottom is None:
+            parallax_bottom = view_bottom
+
+        visible = set()
+        wanted = set()
+        kept = set()
+        for name, layer in self.my_map.streamed_layers.items():
+            parallax_x, parallax_y = self.my_map.parallax_factors.get(name, (1, 1))
+            if self.parallax_by_projection:
+                left = view_left * parallax_x
+                bottom = view_bottom * parallax_y
+            else:
+                offset_x = parallax_left * (1 - parallax_x)
+                offset_y = parallax_bottom * (1 - parallax_y)
+                self.offsets[name] = (offset_x, offset_y)
+                left = view_left - offset_x
+                bottom = view_bottom - offset_y
+            right = left + width
+            top = bottom + height
+            visible |= self._chunks_in(layer, left, bottom, right, top)
+            wanted |= self._chunks_in(layer, left - PRELOAD_MARGIN, bottom - PRELOAD_MARGIN,
+                                      right + PRELOAD_MARGIN, top + PRELOAD_MARGIN)
+            kept |= self._chunks_in(layer, left - EVICT_MARGIN, bottom - EVICT_MARGIN,
+                                    right + EVICT_MARGIN, top + EVICT_MARGIN)
+
+        # Drop chunks that are far away, and forget builds nobody waits for
+        for key in [key for key in self.loaded if key not in kept]:
+            self._evict_chunk(key)
+        for key in [key for key in self.pending if key not in kept]:
+            self.pending.pop(key).cancel()
+
+        # Queue the chunks coming into range
+        for key in sorted(wanted - self.loaded.keys() - self.pending.keys()):
+            if key not in visible:
+                self.pending[key] = self._executor.submit(self._build_chunk, key)
+
+        # Chunks in view can't wait, build the missing ones here
+        for key in visible - self.loaded.keys():
+            future = self.pending.pop(key, None)
+            if future is not None and not future.cancel():
+                sprites = future.result()
+            else:
+                sprites = self._build_chunk(key)
+            self._add_chunk(key, sprites)
+
+        # Hand over finished chunks a few at a time
+        added = 0
+        for key, future in list(self.pending.items()):
+            if added >= MAX_CHUNKS_PER_UPDATE:
+                break
+            if future.done():
+                del self.pending[key]
+                self._add_chunk(key, future.result())
+                added += 1
+
+    def reset(self):
+        """ Drop every chunk and forget which sprites were removed. """
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        for key in list(self.loaded):
+            self._evict_chunk(key)
+        self.removed.clear()
+        self.offsets.clear()
+
+    def close(self):
+        """ Stop the worker thread and unmap the level file. """
+        self.reset()
+        self._executor.shutdown(wait=True)
+        self.my_map.close()
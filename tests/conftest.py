@@ -0,0 +1,16 @@
+"""
+The game reads its resources relative to the game directory, so the tests
+run from there with the game's modules importable.
+"""
+import os
+import sys
+
+import pytest
+
+GAME_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GAME_DIRECTORY)
+
+
+@pytest.fixture(autouse=True)
+def game_directory(monkeypatch):
+    monkeypatch.chdir(GAME_DIRECTORY)
@@ -0,0 +1,77 @@
+import pytest
+
+arcade = pytest.importorskip("arcade")
+
+from baking import BakedLayer  # noqa: E402
+
+
+class FakeContext:
+    """ Enough of a context to sort sprites into chunks, nothing is baked """
+
+    def program(self, **kwargs):
+        return None
+
+
+def make_tile(x, y):
+    tile = arcade.SpriteSolidColor(64, 64, arcade.color.RED)
+    tile.position = (x, y)
+    return tile
+
+
+def make_layer(positions):
+    sprite_list = arcade.SpriteList(lazy=True)
+    for x, y in positions:
+        sprite_list.append(make_tile(x, y))
+    layer = BakedLayer(FakeContext(), sprite_list, chunk_size=1024)
+    for chunk in layer.chunks.values():
+        chunk.dirty = False
+    return sprite_list, layer
+
+
+def test_swap_at_same_count_marks_both_chunks_dirty():
+    sprite_list, layer = make_layer([(100, 100), (1100, 100)])
+    removed = sprite_list[0]
+    added = make_tile(1200, 100)
+
+    removed.remove_from_sprite_lists()
+    sprite_list.append(added)
+    layer.remove([removed])
+    layer.add([added])
+
+    assert layer.chunks[(0, 0)].dirty
+    assert layer.chunks[(1, 0)].dirty
+    assert len(layer.chunks[(0, 0)].sprites) == 0
+    assert added in layer.chunks[(1, 0)].sprites
+
+
+def test_sync_picks_up_a_sprite_put_back():
+    sprite_list, layer = make_layer([(100, 100)])
+    coin = sprite_list[0]
+
+    layer.remove([coin])
+    coin.remove_from_sprite_lists()
+    sprite_list.append(coin)
+    layer.sync()
+
+    assert coin in layer.chunks[(0, 0)].sprites
+    assert layer.chunks[(0, 0)].dirty
+
+
+def test_invalidate_moves_a_sprite_to_its_new_chunk():
+    sprite_list, layer = make_layer([(100, 100), (1100, 100)])
+    tile = sprite_list[0]
+
+    tile.center_x = 1200
+    layer.invalidate([tile])
+
+    assert tile not in layer.chunks[(0, 0)].sprites
+    assert tile in layer.chunks[(1, 0)].sprites
+    assert layer.chunks[(0, 0)].dirty and layer.chunks[(1, 0)].dirty
+
+
+def test_invalidate_everything():
+    sprite_list, layer = make_layer([(100, 100), (1100, 100)])
+
+    layer.invalidate()
+
+    assert all(chunk.dirty for chunk in layer.chunks.values())
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("arcade")
+
+from engine import INPUT_ATTACK, INPUT_RIGHT, GameEngine  # noqa: E402
+from replay import InputRecorder  # noqa: E402
+
+
+def test_attack_in_adjacent_steps_attacks_twice(monkeypatch):
+    engine = GameEngine()
+    engine.setup("test2.json")
+    attacks = []
+    monkeypatch.setattr(engine, "attack", lambda: attacks.append(engine.step_count))
+
+    for inputs in [INPUT_ATTACK, INPUT_ATTACK | INPUT_RIGHT, INPUT_RIGHT, INPUT_ATTACK | INPUT_RIGHT]:
+        engine.step(inputs)
+
+    assert len(attacks) == 3
+    assert engine.inputs == INPUT_RIGHT
+
+
+def test_recording_keeps_attack_presses():
+    engine = GameEngine()
+    engine.setup("test2.json")
+    recorder = InputRecorder(engine)
+    inputs = [INPUT_ATTACK, INPUT_ATTACK | INPUT_RIGHT, INPUT_RIGHT, 0]
+
+    for value in inputs:
+        engine.step(value)
+
+    assert recorder.recording.inputs == inputs
@@ -0,0 +1,60 @@
+import pytest
+
+arcade = pytest.importorskip("arcade")
+
+from moving_platforms import MovingPlatforms  # noqa: E402
+
+# change_x, change_y, boundary_left, boundary_right, boundary_top, boundary_bottom, start
+PLATFORMS = [
+    (3, 0, 100, 420, None, None, (200, 300)),
+    (0, -2.5, None, None, 400, 0, (600, 200)),
+    (1.5, 1, 700, 900, 500, 150, (800, 300)),
+    (-4, 0, None, None, None, None, (1000, 100)),
+]
+
+STEPS = 600
+
+
+def make_platforms():
+    sprite_list = arcade.SpriteList(lazy=True)
+    for change_x, change_y, left, right, top, bottom, start in PLATFORMS:
+        sprite = arcade.SpriteSolidColor(64, 16, arcade.color.RED)
+        sprite.position = start
+        sprite.change_x, sprite.change_y = change_x, change_y
+        sprite.boundary_left, sprite.boundary_right = left, right
+        sprite.boundary_top, sprite.boundary_bottom = top, bottom
+        sprite_list.append(sprite)
+    return sprite_list
+
+
+def baseline_frame(physics_engine, wall_list):
+    """ How the game moved its walls each frame before MovingPlatforms """
+    physics_engine.update()
+    wall_list.update()
+    for wall in wall_list:
+        if wall.boundary_right and wall.right > wall.boundary_right and wall.change_x > 0:
+            wall.change_x *= -1
+        if wall.boundary_left and wall.left < wall.boundary_left and wall.change_x < 0:
+            wall.change_x *= -1
+        if wall.boundary_top and wall.top > wall.boundary_top and wall.change_y > 0:
+            wall.change_y *= -1
+        if wall.boundary_bottom and wall.bottom < wall.boundary_bottom and wall.change_y < 0:
+            wall.change_y *= -1
+
+
+def test_platforms_move_like_the_baseline():
+    wall_list = make_platforms()
+    # A player far from the platforms, only there for the physics engine
+    player = arcade.SpriteSolidColor(16, 16, arcade.color.BLUE)
+    player.position = (-10000, 10000)
+    physics_engine = arcade.PhysicsEnginePlatformer(player, wall_list, gravity_constant=0)
+
+    sprite_list = make_platforms()
+    platforms = MovingPlatforms(sprite_list)
+
+    for step in range(STEPS):
+        baseline_frame(physics_engine, wall_list)
+        platforms.update()
+        for expected, sprite in zip(wall_list, sprite_list):
+            assert sprite.position == pytest.approx(expected.position), f"step {step}"
+            assert (sprite.change_x, sprite.change_y) == (expected.change_x, expected.change_y), f"step {step}"
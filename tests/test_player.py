@@ -0,0 +1,59 @@
+"""
+The player's animation against recordings of the game before its state
+machine, made with the same inputs.
+"""
+import json
+import os
+
+import pytest
+
+pytest.importorskip("arcade")
+
+from player import PlayerCharacter  # noqa: E402
+from replay import Recording  # noqa: E402
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def load_data(file_name):
+    with open(os.path.join(DATA_DIRECTORY, file_name)) as file:
+        return json.load(file)
+
+
+def texture_name(sprite):
+    """ Image file of the texture, without the extension and the texture options """
+    return os.path.basename(sprite.texture.name.split(".png")[0])
+
+
+def test_recorded_game_shows_the_same_frames():
+    recording = Recording.load(os.path.join(DATA_DIRECTORY, "player_trajectory.rpl"))
+    expected = load_data("player_trajectory.json")
+    engine = recording.create_engine()
+    player = engine.player_sprite
+
+    for step, (inputs, (x, y, texture, direction)) in enumerate(zip(recording.inputs, expected["steps"])):
+        engine.step(inputs)
+        assert (player.center_x, player.center_y) == pytest.approx((x, y), abs=1e-3), f"step {step}"
+        assert texture_name(player) == expected["textures"][texture], f"step {step}"
+        assert player.character_face_direction == direction, f"step {step}"
+
+
+def test_scripted_situations_show_the_same_frames():
+    """ Situations the test map can't get the player in, like attacking next to a ladder """
+    expected = load_data("player_situations.json")
+    player = PlayerCharacter()
+    player.center_x, player.center_y = 0, 0
+
+    for step, ((attack, change_x, change_y, can_jump, is_on_ladder), (x, texture, direction, final_change_x)) \
+            in enumerate(expected["steps"]):
+        if attack:
+            player.can_jump = bool(can_jump)
+            player.attack()
+        player.change_x, player.change_y = change_x, change_y
+        player.can_jump = bool(can_jump)
+        player.is_on_ladder = bool(is_on_ladder)
+        player.update_animation()
+        assert player.center_x == x, f"step {step}"
+        assert texture_name(player) == expected["textures"][texture], f"step {step}"
+        assert player.character_face_direction == direction, f"step {step}"
+        assert player.change_x == final_change_x, f"step {step}"
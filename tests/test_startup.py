@@ -0,0 +1,57 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+import weakref
+
+import pytest
+
+pytest.importorskip("arcade")
+
+from engine import GameEngine  # noqa: E402
+from startup import Startup  # noqa: E402
+
+
+class FakeAtlas:
+    """ Stands in for the GPU texture atlas, there is no OpenGL context in the tests """
+
+    def __init__(self):
+        self.textures = set()
+
+    def has_texture(self, texture):
+        return texture in self.textures
+
+    def add(self, texture):
+        self.textures.add(texture)
+
+
+class FakeWindow:
+    """ The parts of MyGame a Startup uses """
+
+    def __init__(self):
+        self.engine = GameEngine()
+        self.ctx = SimpleNamespace(default_atlas=FakeAtlas())
+        self.level_uploader = SimpleNamespace(upload_steps=lambda level: iter([None, None]),
+                                              uploaded=weakref.WeakSet())
+        sounds = Future()
+        sounds.set_result(None)
+        self.audio = SimpleNamespace(loading=sounds)
+
+    def setup(self, map_name, to_id=0):
+        self.engine.setup(map_name, to_id)
+
+
+def test_update_sets_up_the_engine():
+    window = FakeWindow()
+    startup = Startup(window, "test2.json", budget=0.001)
+
+    updates = 0
+    while not startup.finished:
+        startup.update()
+        updates += 1
+        assert updates < 100000
+
+    assert window.engine.map_name == "test2.json"
+    assert window.engine.level is not None
+    assert window.engine.player_sprite is not None
+    assert startup.progress == 1.0
+    assert all(end is not None for stage, (start, end) in startup.timings.items())
+    assert window.ctx.default_atlas.textures
@@ -0,0 +1,105 @@
+"""
+Animated tiles on a shared clock.
+
+Tiled animations are the same for every tile of a kind, so instead of
+advancing each AnimatedTimeBasedSprite on its own, the tiles are grouped by
+their frames and one clock is kept for all of them. On each update a group
+works out its current frame from the clock, and only when it changes are the
+textures of its tiles set, all at once. Static tiles are never looked at, so
+the cost depends on how many tiles are animated rather than on the size of
+the map.
+"""
+from bisect import bisect_left
+
+
+class TileAnimation:
+    """
+    The tiles that share one animation.
+
+    :param Sequence[AnimationKeyframe] frames: Frames of the animation, durations in milliseconds
+    """
+
+    def __init__(self, frames):
+        self.textures = [frame.texture for frame in frames]
+        # End of each frame in seconds since the start of the animation
+        self.frame_ends = []
+        end = 0.0
+        for frame in frames:
+            end += frame.duration / 1000
+            self.frame_ends.append(end)
+        self.duration = end
+        self.frame = 0
+        # Used as an ordered set
+        self.sprites = {}
+
+    def frame_at(self, time):
+        """ Index of the frame shown time seconds after the animation started """
+        if self.duration <= 0:
+            return 0
+        return min(bisect_left(self.frame_ends, time % self.duration), len(self.textures) - 1)
+
+    def show(self, frame):
+        """ Set the textures of the tiles to frame """
+        self.frame = frame
+        texture = self.textures[frame]
+        for sprite in self.sprites:
+            sprite.texture = texture
+
+
+class TileAnimations:
+    """
+    The animated tiles of some sprite lists, grouped by animation.
+
+    :param Iterable[SpriteList] sprite_lists: Lists to take the animated tiles from
+    """
+
+    def __init__(self, sprite_lists=()):
+        self.time = 0.0
+        # Frames, as (texture name, duration) pairs: TileAnimation
+        self.animations = {}
+        for sprite_list in sprite_lists:
+            self.add(sprite_list)
+
+    def __len__(self):
+        return sum(len(animation.sprites) for animation in self.animations.values())
+
+    @staticmethod
+    def _key(sprite):
+        return tuple((frame.texture.name, frame.duration) for frame in sprite.frames)
+
+    def add(self, sprites):
+        """ Animate the animated tiles among sprites, the others are skipped """
+        for sprite in sprites:
+            if not getattr(sprite, "frames", None):
+                continue
+            key = self._key(sprite)
+            animation = self.animations.get(key)
+            if animation is None:
+                animation = self.animations[key] = TileAnimation(sprite.frames)
+                animation.frame = animation.frame_at(self.time)
+            animation.sprites[sprite] = None
+            sprite.texture = animation.textures[animation.frame]
+
+    def remove(self, sprites):
+        """ Stop animating the animated tiles among sprites """
+        for sprite in sprites:
+            if not getattr(sprite, "frames", None):
+                continue
+            animation = self.animations.get(self._key(sprite))
+            if animation is not None:
+                animation.sprites.pop(sprite, None)
+
+    def update(self, delta_time):
+        """ Advance the clock by delta_time seconds """
+        self.time += delta_time
+        for animation in self.animations.values():
+            frame = animation.frame_at(self.time)
+            if frame != animation.frame:
+                animation.show(frame)
+
+    def reset(self):
+        """ Start every animation again from its first frame """
+        self.time = 0.0
+        for animation in self.animations.values():
+            if animation.frame != 0:
+                animation.show(0)
@@ -0,0 +1,300 @@
+"""
+Tile grid collision.
+
+Static tile layers are turned into a CollisionGrid, one byte per cell, and
+the player is moved against that grid by TileGridPhysicsEngine. Finding the
+cells around the player is a couple of divisions, so the cost of a physics
+update no longer grows with the number of tiles in the level. Moving
+platforms are still sprites and are checked as sprites.
+
+The collision shape of a tile comes from its "collision" property in Tiled,
+see SHAPE_NAMES. Tiles without one get the default shape of their layer.
+"""
+import math
+
+import arcade
+
+from physics import ONE_WAY_TOLERANCE
+
+# Cell shapes, in the low bits of a cell
+EMPTY = 0
+FULL = 1
+ONE_WAY = 2
+# Floor rising from the bottom left to the top right of the cell
+SLOPE_UP = 3
+# Floor falling from the top left to the bottom right of the cell
+SLOPE_DOWN = 4
+SHAPE_MASK = 0x0F
+
+# Flag for cells with a ladder, on top of the shape
+LADDER = 0x10
+
+# Values of the "collision" tile property
+SHAPE_NAMES = {
+    "none": EMPTY,
+    "full": FULL,
+    "one_way": ONE_WAY,
+    "slope_up": SLOPE_UP,
+    "slope_down": SLOPE_DOWN,
+}
+
+# Highest step the player walks up without jumping, in cells
+STEP_HEIGHT = 0.5
+
+# Small enough to not matter, keeps touching edges from counting as overlap
+_EPSILON = 1e-6
+
+
+class CollisionGrid:
+    """
+    Collision shape of every cell of a map, row 0 at the bottom.
+
+    :param int width: Width of the map in cells
+    :param int height: Height of the map in cells
+    :param float cell_width: Width of a cell in pixels, after scaling
+    :param float cell_height: Height of a cell in pixels, after scaling
+    """
+
+    def __init__(self, width, height, cell_width, cell_height):
+        self.width = width
+        self.height = height
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cells = bytearray(width * height)
+
+    def cell_of(self, sprite):
+        """ Column and row of the cell a tile sprite was placed in """
+        column = round((sprite.center_x - sprite.width / 2) / self.cell_width)
+        row = round((sprite.center_y - sprite.height / 2) / self.cell_height)
+        return column, row
+
+    def get(self, column, row):
+        """ Cell value, EMPTY outside the map """
+        if 0 <= column < self.width and 0 <= row < self.height:
+            return self.cells[row * self.width + column]
+        return EMPTY
+
+    def set_shape(self, column, row, shape):
+        if 0 <= column < self.width and 0 <= row < self.height:
+            index = row * self.width + column
+            self.cells[index] = (self.cells[index] & ~SHAPE_MASK) | shape
+
+    def set_ladder(self, column, row, ladder=True):
+        if 0 <= column < self.width and 0 <= row < self.height:
+            index = row * self.width + column
+            if ladder:
+                self.cells[index] |= LADDER
+            else:
+                self.cells[index] &= ~LADDER
+
+    def add_sprites(self, sprites, default_shape):
+        """ Mark the cells of tile sprites, using their "collision" property if they have one """
+        for sprite in sprites:
+            shape = SHAPE_NAMES.get(sprite.properties.get("collision"), default_shape)
+            self.set_shape(*self.cell_of(sprite), shape)
+
+    def remove_sprites(self, sprites):
+        for sprite in sprites:
+            self.set_shape(*self.cell_of(sprite), EMPTY)
+
+    def add_ladders(self, sprites, ladder=True):
+        for sprite in sprites:
+            self.set_ladder(*self.cell_of(sprite), ladder)
+
+    def columns(self, left, right):
+        """ Columns overlapped by the span from left to right """
+        return range(max(math.floor(left / self.cell_width), 0),
+                     min(math.floor((right - _EPSILON) / self.cell_width), self.width - 1) + 1)
+
+    def rows(self, bottom, top):
+        """ Rows overlapped by the span from bottom to top """
+        return range(max(math.floor(bottom / self.cell_height), 0),
+                     min(math.floor((top - _EPSILON) / self.cell_height), self.height - 1) + 1)
+
+    def floor_height(self, column, row, x):
+        """ Height of the floor of a cell at x, None if the cell has no floor """
+        shape = self.get(column, row) & SHAPE_MASK
+        cell_bottom = row * self.cell_height
+        if shape == FULL or shape == ONE_WAY:
+            return cell_bottom + self.cell_height
+        if shape == SLOPE_UP or shape == SLOPE_DOWN:
+            fraction = min(max((x - column * self.cell_width) / self.cell_width, 0.0), 1.0)
+            if shape == SLOPE_DOWN:
+                fraction = 1.0 - fraction
+            return cell_bottom + fraction * self.cell_height
+        return None
+
+    def floor_between(self, left, right, x, low, high, feet=None, one_way=True):
+        """
+        Highest floor from low to high under the span from left to right,
+        None if there is none. Slopes only count at x, usually the middle of
+        the feet. One-way platforms only count when one_way is set and feet,
+        high if not given, are no more than ONE_WAY_TOLERANCE below their top.
+        """
+        if feet is None:
+            feet = high
+        columns = self.columns(left, right)
+        best = None
+        for row in range(max(math.floor(low / self.cell_height) - 1, 0),
+                         min(math.floor(high / self.cell_height), self.height - 1) + 1):
+            for column in columns:
+                shape = self.get(column, row) & SHAPE_MASK
+                if shape == EMPTY or shape == ONE_WAY and not one_way:
+                    continue
+                if shape == SLOPE_UP or shape == SLOPE_DOWN:
+                    if not column * self.cell_width <= x < (column + 1) * self.cell_width:
+                        continue
+                floor = self.floor_height(column, row, x)
+                if not low <= floor <= high:
+                    continue
+                if shape == ONE_WAY and feet < floor - ONE_WAY_TOLERANCE:
+                    continue
+                if best is None or floor > best:
+                    best = floor
+        return best
+
+    def is_solid(self, column, row):
+        """ True for cells that block movement from every side """
+        return self.get(column, row) & SHAPE_MASK == FULL
+
+    def has_ladder(self, left, bottom, right, top):
+        for row in self.rows(bottom, top):
+            for column in self.columns(left, right):
+                if self.get(column, row) & LADDER:
+                    return True
+        return False
+
+
+class TileGridPhysicsEngine(arcade.PhysicsEnginePlatformer):
+    """
+    Platformer physics against a CollisionGrid for the static level, and
+    against sprites for moving platforms.
+
+    Drop-in for arcade.PhysicsEnginePlatformer, the player is treated as the
+    box around its hit box.
+
+    :param Sprite player_sprite: The moving sprite
+    :param CollisionGrid grid: Static collision of the level
+    :param SpriteList platforms: Moving platforms, see moving_platforms.MovingPlatforms
+    :param float gravity_constant: Downward acceleration per frame
+    """
+
+    def __init__(self, player_sprite, grid, platforms=None, gravity_constant=0.5):
+        super().__init__(player_sprite, platforms, gravity_constant)
+        self.grid = grid
+
+        # Set while the player wants to fall through the one-way platforms
+        self.drop_through = False
+
+    def is_on_ladder(self):
+        player = self.player_sprite
+        return self.grid.has_ladder(player.left, player.bottom, player.right, player.top)
+
+    def can_jump(self, y_distance=5):
+        player = self.player_sprite
+        on_ground = self.grid.floor_between(player.left, player.right, player.center_x,
+                                            player.bottom - y_distance, player.bottom + 1,
+                                            one_way=not self.drop_through) is not None
+        if not on_ground and self.platforms:
+            player.center_y -= y_distance
+            on_ground = len(arcade.check_for_collision_with_lists(player, self.platforms)) > 0
+            player.center_y += y_distance
+
+        if on_ground:
+            self.jumps_since_ground = 0
+        return on_ground or self.allow_multi_jump and self.jumps_since_ground < self.allowed_jumps
+
+    def _move_y(self):
+        player = self.player_sprite
+        grid = self.grid
+        change_y = player.change_y
+        if change_y < 0:
+            floor = grid.floor_between(player.left, player.right, player.center_x,
+                                       player.bottom + change_y, player.bottom,
+                                       one_way=not self.drop_through)
+            if floor is not None:
+                player.center_y += floor - player.bottom
+                player.change_y = 0
+                return
+        elif change_y > 0:
+            top = player.top
+            for row in grid.rows(top, top + change_y):
+                if row * grid.cell_height < top - _EPSILON:
+                    continue
+                if any(grid.is_solid(column, row) for column in grid.columns(player.left, player.right)):
+                    player.center_y += row * grid.cell_height - top
+                    player.change_y = 0
+                    return
+        player.center_y += change_y
+
+    def _move_x(self):
+        player = self.player_sprite
+        grid = self.grid
+        change_x = player.change_x
+        if not change_x:
+            return
+        was_on_floor = grid.floor_between(player.left, player.right, player.center_x,
+                                          player.bottom - 1, player.bottom + 1,
+                                          one_way=not self.drop_through) is not None
+
+        # Walls, only the full cells beside the body. Slopes and one-way
+        # platforms never block sideways. On the floor, cells low enough to
+        # step onto don't block either, like at the top of a slope.
+        step = grid.cell_height * STEP_HEIGHT if was_on_floor else 0
+        rows = grid.rows(player.bottom + step, player.top)
+        if change_x > 0:
+            edge = player.right
+            for column in grid.columns(edge, edge + change_x):
+                wall = column * grid.cell_width
+                if wall >= edge - _EPSILON and any(grid.is_solid(column, row) for row in rows):
+                    change_x = wall - edge
+                    break
+        else:
+            edge = player.left
+            for column in reversed(grid.columns(edge + change_x, edge)):
+                wall = (column + 1) * grid.cell_width
+                if wall <= edge + _EPSILON and any(grid.is_solid(column, row) for row in rows):
+                    change_x = wall - edge
+                    break
+        player.center_x += change_x
+
+        # Follow slopes and steps up, and down while walking on the floor
+        step = max(step, abs(player.change_x) + 1)
+        floor = grid.floor_between(player.left, player.right, player.center_x,
+                                   player.bottom - step if was_on_floor else player.bottom,
+                                   player.bottom + step, feet=player.bottom,
+                                   one_way=not self.drop_through)
+        if floor is not None:
+            player.center_y += floor - player.bottom
+
+    def _move_with_platforms(self):
+        """ Push the player out of the moving platforms, riding them when standing on one """
+        player = self.player_sprite
+        for platform in arcade.check_for_collision_with_lists(player, self.platforms):
+            if player.change_y <= 0 and player.center_y > platform.center_y:
+                player.center_y += platform.top - player.bottom
+                player.center_x += platform.change_x
+                player.change_y = min(0.0, platform.change_y)
+            elif player.change_y > 0 and player.center_y < platform.center_y:
+                player.center_y += platform.bottom - player.top
+                player.change_y = 0
+            elif player.center_x < platform.center_x:
+                player.center_x += platform.left - player.right
+            else:
+                player.center_x += platform.right - player.left
+
+    def update(self):
+        """
+        Move the player.
+
+        :Returns: The moving platforms the player touched
+        """
+        if not self.is_on_ladder():
+            self.player_sprite.change_y -= self.gravity_constant
+
+        self._move_y()
+        self._move_x()
+        hit_list = arcade.check_for_collision_with_lists(self.player_sprite, self.platforms)
+        self._move_with_platforms()
+        self.player_sprite.center_y = round(self.player_sprite.center_y, 2)
+        return hit_list
@@ -0,0 +1,88 @@
+"""
+Trigger volumes on a tile grid.
+
+Sprites the player can walk into, like coins and doors, are put in a
+TriggerGrid when the level is loaded, under every tile cell their hit box
+covers. Finding what the player touches is then a look at the few cells
+under the player's hit box, followed by an exact hit box check of the
+sprites found there, so it costs the same in a level with ten coins or tens
+of thousands. Integer properties, like the Points of a coin, are parsed
+once when a sprite is added.
+"""
+import math
+
+import arcade
+
+
+class TriggerGrid:
+    """
+    Sprites by the tile cells their hit boxes cover.
+
+    :param float cell_width: Width of a cell in pixels, after scaling
+    :param float cell_height: Height of a cell in pixels, after scaling
+    :param Iterable[Sprite] sprites: Sprites to start with
+    :param str value_property: Integer property of the sprites to parse into values
+    """
+
+    def __init__(self, cell_width, cell_height, sprites=(), value_property=None):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.value_property = value_property
+
+        # (column, row): sprites in the cell, a dict used as an ordered set
+        self.cells = {}
+        # Sprite: keys of its cells
+        self._keys = {}
+        # Sprite: its value_property as an int, None if it has none
+        self.values = {}
+
+        self.add(sprites)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, sprite):
+        return sprite in self._keys
+
+    def _cells_under(self, left, bottom, right, top):
+        for row in range(math.floor(bottom / self.cell_height), math.floor(top / self.cell_height) + 1):
+            for column in range(math.floor(left / self.cell_width), math.floor(right / self.cell_width) + 1):
+                yield column, row
+
+    def add(self, sprites):
+        """ Add sprites, those already in the grid are left where they are """
+        for sprite in sprites:
+            if sprite in self._keys:
+                continue
+            keys = self._keys[sprite] = list(self._cells_under(sprite.left, sprite.bottom,
+                                                               sprite.right, sprite.top))
+            for key in keys:
+                cell = self.cells.get(key)
+                if cell is None:
+                    cell = self.cells[key] = {}
+                cell[sprite] = None
+            if self.value_property:
+                value = sprite.properties.get(self.value_property)
+                self.values[sprite] = None if value is None else int(value)
+
+    def remove(self, sprites):
+        """ Remove sprites, those not in the grid are skipped """
+        for sprite in sprites:
+            keys = self._keys.pop(sprite, None)
+            if keys is None:
+                continue
+            for key in keys:
+                cell = self.cells[key]
+                del cell[sprite]
+                if not cell:
+                    del self.cells[key]
+            self.values.pop(sprite, None)
+
+    def colliding(self, sprite):
+        """ Sprites of the grid whose hit boxes overlap the one of sprite """
+        found = {}
+        for key in self._cells_under(sprite.left, sprite.bottom, sprite.right, sprite.top):
+            cell = self.cells.get(key)
+            if cell:
+                found.update(cell)
+        return [other for other in found if arcade.check_for_collision(sprite, other)]